@@ -3,6 +3,8 @@ import sys
 
 from scapy.all import IP, TCP, Raw, sniff
 
+from reassembly import Reassembler
+
 
 def is_backspace(b: int) -> bool:
     return b in (0x08, 0x7f)
@@ -42,30 +44,13 @@ def main():
     in_sb = False
     in_sb_wait_se = False
     iac_command = None
-    seen_packets = set()  # Track processed TCP sequence numbers
 
-    def handle(pkt):
-        nonlocal cur_idx, done, in_iac_sequence, iac_bytes_to_skip, seen_packets, in_sb, in_sb_wait_se, iac_command
+    def handle_stream(key, data: bytes):
+        # In-order client->server bytes: retransmissions and overlaps already removed
+        nonlocal cur_idx, done, in_iac_sequence, iac_bytes_to_skip, in_sb, in_sb_wait_se, iac_command
 
-        if Raw not in pkt or TCP not in pkt or IP not in pkt:
-            return
-
-        # Create unique packet identifier using TCP sequence number and data
-        tcp_seq = pkt[TCP].seq
-        data: bytes = bytes(pkt[Raw].load)
-        packet_id = (tcp_seq, len(data), data[:8])  # seq + length + first 8 bytes
-        
-        # Skip if we've already processed this packet
-        if packet_id in seen_packets:
-            if args.debug:
-                print(f"[DEBUG] Duplicate packet detected, skipping (seq={tcp_seq})")
-            return
-        
-        seen_packets.add(packet_id)
-        
         if args.debug:
-            print(f"\n[DEBUG] Packet captured: {len(data)} bytes from {pkt[IP].src}:{pkt[TCP].sport} -> {pkt[IP].dst}:{pkt[TCP].dport} (seq={tcp_seq})")
-            print(f"[DEBUG] Raw bytes: {' '.join(f'{b:02x}' for b in data)}")
+            print(f"[DEBUG] Stream data: {len(data)} bytes {key.src}:{key.sport} -> {key.dst}:{key.dport}")
 
         # Telnet can put multiple chars in one TCP segment; process byte-by-byte
         for b in data:
@@ -191,6 +176,27 @@ def main():
             elif args.debug:
                 print(f"[DEBUG] Non-printable byte ignored")
 
+    def handle_gap(key, nbytes: int):
+        if args.debug:
+            print(f"[DEBUG] {nbytes} bytes never captured on {key.src}:{key.sport} -> {key.dst}:{key.dport}, skipping")
+
+    # Reorders segments and drops retransmissions per flow, in bounded memory
+    reasm = Reassembler(on_data=handle_stream, on_gap=handle_gap)
+
+    def handle(pkt):
+        if done or TCP not in pkt or IP not in pkt:
+            return
+
+        tcp = pkt[TCP]
+        data: bytes = bytes(pkt[Raw].load) if Raw in pkt else b""
+
+        if args.debug and data:
+            print(f"\n[DEBUG] Packet captured: {len(data)} bytes from {pkt[IP].src}:{tcp.sport} -> {pkt[IP].dst}:{tcp.dport} (seq={tcp.seq})")
+            print(f"[DEBUG] Raw bytes: {' '.join(f'{b:02x}' for b in data)}")
+
+        # SYN/FIN/RST carry no data but still matter for sequence tracking
+        reasm.add(pkt[IP].src, tcp.sport, pkt[IP].dst, tcp.dport, tcp.seq, int(tcp.flags), data, float(pkt.time))
+
     sniff_kwargs = dict(filter=bpf, prn=handle, store=False)
     if args.iface:
         sniff_kwargs["iface"] = args.iface
@@ -0,0 +1,310 @@
+"""TCP stream reassembly for sniffed traffic, in bounded memory.
+
+    reasm = Reassembler(on_data=lambda key, data: print(key, data))
+    sniff(filter="tcp port 23", store=False,
+          prn=lambda p: reasm.add(p[IP].src, p[TCP].sport, p[IP].dst, p[TCP].dport,
+                                  p[TCP].seq, int(p[TCP].flags), bytes(p[Raw].load) if Raw in p else b"",
+                                  float(p.time)))
+
+Each flow (5-tuple) holds one stream per direction. Data is passed to
+on_data(key, data) in sequence order, exactly once: retransmissions and
+overlaps are trimmed (the first copy of a byte wins), and segments that
+arrive early wait in a sorted list of non-overlapping intervals until the
+hole before them fills. `key` is the direction, (src, sport, dst, dport).
+
+Memory stays bounded on long captures:
+
+    max_stream_bytes   out-of-order data held per direction; beyond it the
+                       oldest hole is given up on (see below)
+    max_total_bytes    the same, over all flows, least recently active
+                       flows first (down to 3/4 of the cap)
+    max_flows          least recently active flows are dropped beyond this
+    idle_timeout       flows without packets for this long are dropped
+                       (capture time, so offline traces work too)
+
+A sniffer can miss a segment for good, so rather than waiting forever a
+stream over its cap skips its first hole: on_gap(key, nbytes) is called
+and the data after the hole is delivered. Closed flows (FIN in both
+directions, or in the only direction captured; RST; eviction) first
+deliver what they hold the same way, then call on_close(key) for each
+direction seen. A finished flow is kept, empty, until it goes idle, so
+late retransmissions are dropped rather than read as a new stream.
+
+A stream starts at the SYN if it was captured, otherwise at the first
+segment seen; data before that is not recovered.
+"""
+
+import bisect
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+FIN, SYN, RST = 0x01, 0x02, 0x04
+PROTO_TCP = 6
+
+_SEQ_MASK = 0xFFFFFFFF
+
+
+class StreamKey(NamedTuple):
+    src: str
+    sport: int
+    dst: str
+    dport: int
+
+
+def _unwrap(wire: int, ref: int) -> int:
+    """Absolute sequence number nearest `ref` whose low 32 bits are `wire`."""
+    return ref + ((wire - ref + 0x80000000) & _SEQ_MASK) - 0x80000000
+
+
+class Stream:
+    """One direction of a flow: the next expected sequence number and the
+    segments held beyond it, as sorted non-overlapping (start, data) intervals.
+    """
+
+    __slots__ = ("key", "next_seq", "starts", "chunks", "buffered", "fin_seq", "closed")
+
+    def __init__(self, key: StreamKey):
+        self.key = key
+        self.next_seq: Optional[int] = None  # unwrapped; None until the first segment
+        self.starts: List[int] = []
+        self.chunks: List[bytes] = []
+        self.buffered = 0
+        self.fin_seq: Optional[int] = None
+        self.closed = False
+
+    def insert(self, start: int, data: bytes) -> int:
+        """Hold `data` at `start`, keeping only the bytes no interval already
+        covers. Returns the number of bytes added.
+        """
+        starts, chunks = self.starts, self.chunks
+        end = start + len(data)
+        i = bisect.bisect_right(starts, start) - 1
+        if i >= 0:
+            prev_end = starts[i] + len(chunks[i])
+            if prev_end >= end:
+                return 0
+            if prev_end > start:
+                data = data[prev_end - start:]
+                start = prev_end
+        i += 1
+        added = 0
+        while data and i < len(starts) and starts[i] < end:
+            if starts[i] > start:  # the gap before interval i
+                n = starts[i] - start
+                starts.insert(i, start)
+                chunks.insert(i, data[:n])
+                added += n
+                data = data[n:]
+                start += n
+                i += 1
+            cut = starts[i] + len(chunks[i]) - start  # the part interval i already has
+            data = data[cut:]
+            start += cut
+            i += 1
+        if data:
+            starts.insert(i, start)
+            chunks.insert(i, data)
+            added += len(data)
+        self.buffered += added
+        return added
+
+    def pop_ready(self) -> List[bytes]:
+        """Remove and return the held data that now continues at next_seq."""
+        out = []
+        starts, chunks = self.starts, self.chunks
+        n = 0
+        while n < len(starts) and starts[n] <= self.next_seq:
+            chunk = chunks[n]
+            skip = self.next_seq - starts[n]
+            if skip < len(chunk):
+                out.append(chunk[skip:] if skip else chunk)
+                self.next_seq = starts[n] + len(chunk)
+            self.buffered -= len(chunk)
+            n += 1
+        if n:
+            del starts[:n]
+            del chunks[:n]
+        return out
+
+
+class Flow:
+    """Both directions of one connection. Finished flows stay behind, empty,
+    until they go idle, so late retransmissions are recognized as such.
+    """
+
+    __slots__ = ("streams", "last", "closed")
+
+    def __init__(self, last: float):
+        self.streams: Dict[StreamKey, Stream] = {}
+        self.last = last
+        self.closed = False
+
+
+class Reassembler:
+    """Reassembles the TCP flows passed to add(); see the module docstring."""
+
+    def __init__(self, on_data: Callable[[StreamKey, bytes], None],
+                 on_gap: Optional[Callable[[StreamKey, int], None]] = None,
+                 on_close: Optional[Callable[[StreamKey], None]] = None,
+                 max_stream_bytes: int = 1 << 20, max_total_bytes: int = 64 << 20,
+                 max_flows: int = 65536, idle_timeout: float = 300.0):
+        self.on_data = on_data
+        self.on_gap = on_gap
+        self.on_close = on_close
+        self.max_stream_bytes = max_stream_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        # 5-tuple -> Flow, least recently active first
+        self._flows: "OrderedDict[Tuple, Flow]" = OrderedDict()
+        self._last_sweep: Optional[float] = None
+        self.buffered = 0      # out-of-order bytes held over all flows
+        self.delivered = 0     # bytes passed to on_data
+        self.gap_bytes = 0     # bytes given up on at holes
+        self.evicted = 0       # open flows closed for idleness or the flow cap
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    @staticmethod
+    def flow_key(src: str, sport: int, dst: str, dport: int) -> Tuple:
+        """The 5-tuple shared by both directions of a connection."""
+        a, b = (src, sport), (dst, dport)
+        return (PROTO_TCP,) + (a + b if a <= b else b + a)
+
+    def add(self, src: str, sport: int, dst: str, dport: int, seq: int, flags: int,
+            payload: bytes = b"", ts: Optional[float] = None) -> None:
+        """Feed one captured segment; `ts` is its capture time (default: now)."""
+        if ts is None:
+            ts = time.time()
+        fkey = self.flow_key(src, sport, dst, dport)
+        flow = self._flows.get(fkey)
+        if flow is None:
+            if flags & RST:
+                return
+            if len(self._flows) >= self.max_flows:
+                self._remove(next(iter(self._flows)))
+            flow = self._flows[fkey] = Flow(ts)
+        else:
+            self._flows.move_to_end(fkey)
+            flow.last = ts
+            if flow.closed:
+                if not flags & SYN or flags & RST:
+                    return  # straggler from the finished connection
+                flow.closed = False  # the 5-tuple is reused
+
+        key = StreamKey(src, sport, dst, dport)
+        stream = flow.streams.get(key)
+        if stream is None:
+            stream = flow.streams[key] = Stream(key)
+        if flags & RST:
+            self._finish(flow)
+        else:
+            self._segment(stream, seq, flags, payload)
+            # Both directions finished (or the only one captured, with a one-way filter)
+            if stream.closed and all(s.closed for s in flow.streams.values()):
+                self._finish(flow)
+
+        if self.buffered > self.max_total_bytes:
+            self._shrink()
+        if self._last_sweep is None:
+            self._last_sweep = ts
+        elif ts - self._last_sweep >= min(self.idle_timeout / 4, 10.0):
+            self.expire(ts)
+
+    def _segment(self, stream: Stream, seq: int, flags: int, payload: bytes) -> None:
+        syn = 1 if flags & SYN else 0  # the SYN takes one sequence number
+        if stream.next_seq is None:
+            stream.next_seq = seq + syn
+        start = _unwrap(seq, stream.next_seq) + syn
+        if flags & FIN and stream.fin_seq is None:
+            stream.fin_seq = start + len(payload)
+        if payload and start + len(payload) > stream.next_seq:
+            if start < stream.next_seq:  # retransmission overlapping new data
+                payload = payload[stream.next_seq - start:]
+                start = stream.next_seq
+            if start == stream.next_seq:
+                stream.next_seq += len(payload)
+                self._deliver(stream, payload)
+                if stream.starts:
+                    self._flush_ready(stream)
+            else:
+                self.buffered += stream.insert(start, payload)
+                while stream.buffered > self.max_stream_bytes:
+                    self._skip_hole(stream)
+        if stream.fin_seq is not None and stream.next_seq >= stream.fin_seq:
+            stream.closed = True
+
+    def _deliver(self, stream: Stream, data: bytes) -> None:
+        self.delivered += len(data)
+        self.on_data(stream.key, data)
+
+    def _flush_ready(self, stream: Stream) -> None:
+        before = stream.buffered
+        chunks = stream.pop_ready()
+        self.buffered -= before - stream.buffered
+        for chunk in chunks:
+            self._deliver(stream, chunk)
+
+    def _skip_hole(self, stream: Stream) -> None:
+        """Give up on the bytes missing before the first held segment."""
+        missing = stream.starts[0] - stream.next_seq
+        if missing > 0:
+            self.gap_bytes += missing
+            if self.on_gap is not None:
+                self.on_gap(stream.key, missing)
+            stream.next_seq = stream.starts[0]
+        self._flush_ready(stream)
+
+    def _shrink(self) -> None:
+        """Flush the least recently active flows down to 3/4 of
+        max_total_bytes, so the scan is not repeated on every segment.
+        """
+        target = self.max_total_bytes * 3 // 4
+        for flow in list(self._flows.values()):
+            for stream in flow.streams.values():
+                while stream.starts:
+                    self._skip_hole(stream)
+            if self.buffered <= target:
+                return
+
+    def _finish(self, flow: Flow) -> None:
+        """Deliver what the flow holds, report it closed and empty it."""
+        for stream in flow.streams.values():
+            while stream.starts:
+                self._skip_hole(stream)
+        if self.on_close is not None:
+            for key in flow.streams:
+                self.on_close(key)
+        flow.streams = {}
+        flow.closed = True
+
+    def _remove(self, fkey: Tuple) -> None:
+        flow = self._flows.pop(fkey)
+        if not flow.closed:
+            self.evicted += 1
+            self._finish(flow)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop flows idle for longer than idle_timeout, closing any still
+        open; returns how many were dropped.
+        """
+        if now is None:
+            now = time.time()
+        self._last_sweep = now
+        count = 0
+        while self._flows:
+            fkey, flow = next(iter(self._flows.items()))
+            if now - flow.last < self.idle_timeout:
+                break
+            self._remove(fkey)
+            count += 1
+        return count
+
+    def flush(self) -> None:
+        """Close every flow, delivering what is held (end of a capture)."""
+        for flow in self._flows.values():
+            if not flow.closed:
+                self._finish(flow)
+        self._flows.clear()
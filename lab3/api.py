@@ -1,10 +1,37 @@
-import socket
-from typing import Optional
+import asyncio
+import select
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 from layers import DNS, ICMP, IP, TCP, UDP, Ether
-from utils import ip_to_bytes
+from layers.base import BaseLayer
+from net.ring import RingCapture
+from net.sockets import SocketPool, default_pool
+from net.transport import RawTransport, Transport
+from utils import bytes_to_ip, ip_to_bytes, stats
 
-# Public API: send, sendp, sr, sniff
+# Public API: send, sendp, send_many, sendp_many, sr, sr_many, sniff, sniff_iter,
+# async_send, async_sr, async_sniff, set_transport, get_transport
+# Per-stage counters and latencies: utils.stats (stats.enable(), stats.report())
+
+_clock = time.perf_counter
+
+# Where every function below sends and receives (net.transport)
+_transport: Transport = RawTransport(default_pool)
+
+
+def set_transport(transport: Transport) -> Transport:
+    """Route all sending and receiving through `transport` (raw sockets,
+    an in-memory link, a TAP device); returns the previous transport.
+    """
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
+
+
+def get_transport() -> Transport:
+    return _transport
 
 def _ensure_ip(pkt):
     # If starts at Ether, drop L2 and return IP for L3 send
@@ -29,153 +56,668 @@ def _src_of(pkt) -> str:
     return "?"
 
 
-def send(pkt):
+# A packet for the bulk senders: a layer stack, one buffer, or buffers to gather
+Packetish = Union[BaseLayer, bytes, bytearray, memoryview, Sequence[Union[bytes, bytearray, memoryview]]]
+
+
+def _iovec(item) -> Sequence:
+    if isinstance(item, (bytes, bytearray, memoryview)):
+        return (item,)
+    return item
+
+
+def _iov_dst(iov: Sequence) -> str:
+    """Destination address of a raw IPv4 packet split across `iov`."""
+    head = b""
+    for buf in iov:
+        head += bytes(buf[:20 - len(head)])
+        if len(head) >= 20:
+            return bytes_to_ip(head[16:20])
+    raise ValueError("packet shorter than an IPv4 header")
+
+
+class Sender:
+    """Sends through pooled raw sockets instead of opening one per packet.
+    `verbose=False` silences the per-packet "[+] Sent ..." lines; the module
+    functions `send`/`sendp` use a shared default sender. A sender given
+    neither `pool` nor `transport` follows set_transport().
+    """
+
+    def __init__(self, pool: Optional[SocketPool] = None, verbose: bool = True,
+                 transport: Optional[Transport] = None):
+        if transport is None and pool is not None:
+            transport = RawTransport(pool)
+        self._transport = transport
+        self.verbose = verbose
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport if self._transport is not None else _transport
+
+    def send(self, pkt, verbose: Optional[bool] = None) -> None:
+        ip = _ensure_ip(pkt)
+        if not isinstance(ip, IP):
+            raise ValueError("send() expects an IP packet or an Ether/IP stack")
+        dst = ip.dst_ip
+        if stats.ENABLED:
+            t0 = _clock()
+            b = ip.build()
+            t1 = _clock()
+            try:
+                self.transport.send(b, dst)
+            except OSError:
+                stats.incr("tx.errors")
+                raise
+            stats.observe("build", t1 - t0)
+            stats.observe("send.syscall", _clock() - t1)
+            stats.incr("tx.packets")
+        else:
+            self.transport.send(ip.build(), dst)
+        if self.verbose if verbose is None else verbose:
+            print(f"[+] Sent packet to {dst} (Layer 3)")
+
+    def sendp(self, pkt, interface: str, verbose: Optional[bool] = None) -> None:
+        """Send an Ether stack, or an already built frame as is, on `interface`."""
+        timed = stats.ENABLED
+        if timed:
+            t0 = _clock()
+        if isinstance(pkt, (bytes, bytearray, memoryview)):
+            frame = pkt
+        elif isinstance(pkt, Ether):
+            frame = pkt.build()
+        else:
+            raise ValueError("sendp() requires an Ether frame as the first layer")
+        if timed:
+            t1 = _clock()
+            try:
+                self.transport.sendp(frame, interface)
+            except OSError:
+                stats.incr("tx.errors")
+                raise
+            stats.observe("build", t1 - t0)
+            stats.observe("send.syscall", _clock() - t1)
+            stats.incr("tx.packets")
+        else:
+            self.transport.sendp(frame, interface)
+        if self.verbose if verbose is None else verbose:
+            print(f"[+] Sent packet on {interface} (Layer 2)")
+
+    def send_many(self, pkts: Iterable[Packetish], verbose: Optional[bool] = None) -> List[Optional[Exception]]:
+        """Send a batch at layer 3 through the pooled socket, one sendmsg() each.
+        Items are IP (or Ether/IP) stacks, built packets, or sequences of
+        buffers (e.g. a shared header and a per-packet payload) that are
+        gathered by the kernel instead of concatenated. Returns one entry per
+        packet: None if it went out, else the exception it raised.
+        """
+        transport = self.transport
+        timed = stats.ENABLED
+        errors: List[Optional[Exception]] = []
+        for pkt in pkts:
+            try:
+                if timed:
+                    t0 = _clock()
+                if isinstance(pkt, BaseLayer):
+                    ip = _ensure_ip(pkt)
+                    if not isinstance(ip, IP):
+                        raise ValueError("send_many() expects IP packets or Ether/IP stacks")
+                    iov, dst = [ip.build()], ip.dst_ip
+                else:
+                    iov = _iovec(pkt)
+                    dst = _iov_dst(iov)
+                if timed:
+                    t1 = _clock()
+                    stats.observe("build", t1 - t0)
+                transport.send(iov, dst)
+                if timed:
+                    stats.observe("send.syscall", _clock() - t1)
+                errors.append(None)
+            except (OSError, ValueError) as e:
+                errors.append(e)
+        self._report(errors, "(Layer 3)", verbose)
+        return errors
+
+    def sendp_many(self, frames: Iterable[Packetish], interface: str,
+                   verbose: Optional[bool] = None) -> List[Optional[Exception]]:
+        """Layer-2 counterpart of send_many(): Ether stacks, built frames or
+        buffer sequences, sent on `interface`.
+        """
+        transport = self.transport
+        timed = stats.ENABLED
+        errors: List[Optional[Exception]] = []
+        for frame in frames:
+            try:
+                if timed:
+                    t0 = _clock()
+                if isinstance(frame, BaseLayer):
+                    if not isinstance(frame, Ether):
+                        raise ValueError("sendp_many() requires Ether frames")
+                    iov = [frame.build()]
+                else:
+                    iov = _iovec(frame)
+                if timed:
+                    t1 = _clock()
+                    stats.observe("build", t1 - t0)
+                transport.sendp(iov, interface)
+                if timed:
+                    stats.observe("send.syscall", _clock() - t1)
+                errors.append(None)
+            except (OSError, ValueError) as e:
+                errors.append(e)
+        self._report(errors, f"on {interface} (Layer 2)", verbose)
+        return errors
+
+    def _report(self, errors: List[Optional[Exception]], where: str, verbose: Optional[bool]) -> None:
+        if stats.ENABLED:
+            failed = sum(e is not None for e in errors)
+            stats.incr("tx.packets", len(errors) - failed)
+            if failed:
+                stats.incr("tx.errors", failed)
+        if self.verbose if verbose is None else verbose:
+            failed = sum(e is not None for e in errors)
+            print(f"[+] Sent {len(errors) - failed}/{len(errors)} packets {where}")
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+default_sender = Sender()
+
+
+def send(pkt, verbose: Optional[bool] = None):
+    default_sender.send(pkt, verbose)
+
+
+def sendp(pkt, interface: str, verbose: Optional[bool] = None):
+    default_sender.sendp(pkt, interface, verbose)
+
+
+def send_many(pkts: Iterable[Packetish], verbose: Optional[bool] = None) -> List[Optional[Exception]]:
+    return default_sender.send_many(pkts, verbose)
+
+
+def sendp_many(frames: Iterable[Packetish], interface: str,
+               verbose: Optional[bool] = None) -> List[Optional[Exception]]:
+    return default_sender.sendp_many(frames, interface, verbose)
+
+
+def sr(pkt, interface: Optional[str] = None, timeout: float = 8.0, verbose: Optional[bool] = None):
+    """Send `pkt` at layer 3 and return the first frame that answers it, or
+    raise TimeoutError. `verbose` (default: the default sender's) controls
+    the "[+] Sent ..." lines.
+    """
+    verbose = default_sender.verbose if verbose is None else verbose
+
+    # Ensure proto is set before the request hash is taken
     ip = _ensure_ip(pkt)
     if not isinstance(ip, IP):
-        raise ValueError("send() expects an IP packet or an Ether/IP stack")
-    b = ip.build()
-    dst = ip.dst_ip
-    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
-    try:
-        sock.sendto(b, (dst, 0))
-        print(f"[+] Sent packet to {dst} (Layer 3)")
-    finally:
-        sock.close()
+        raise ValueError("sr() expects an IP packet or an Ether/IP stack")
+    ip._infer_proto()
+    # Replies are found by the layers themselves: same hashret(), then answers()
+    key = ip.hashret()
 
+    # Receive at L2 on specified interface; the kernel filter drops unrelated
+    # traffic. Listen before sending so a fast reply cannot be missed.
+    rx = default_sender.transport.open(interface, _reply_filter(pkt), outgoing=False)
+    deadline = time.monotonic() + timeout
 
-def sendp(pkt, interface: str):
-    if not isinstance(pkt, Ether):
-        raise ValueError("sendp() requires an Ether frame as the first layer")
-    frame = pkt.build()
-    af_packet = getattr(socket, "AF_PACKET", None)
-    if af_packet is None:
-        raise NotImplementedError("Layer-2 send requires Linux (AF_PACKET)")
-    sock = socket.socket(af_packet, socket.SOCK_RAW)
     try:
-        sock.bind((interface, 0))
-        sock.send(frame)
-        print(f"[+] Sent packet on {interface} (Layer 2)")
+        # Transmit at L3
+        send(pkt, verbose)
+        sent_at = time.monotonic()
+        if verbose:
+            print(f"[+] Sent packet to {_dst_of(pkt)}, waiting for reply on {interface or 'any'}...")
+        timed = stats.ENABLED
+        while True:
+            if timed:
+                t0 = _clock()
+            frame = rx.recv(max(deadline - time.monotonic(), 0.0))
+            if timed:
+                t1 = _clock()
+                stats.observe("recv.syscall", t1 - t0)  # includes waiting
+            if frame is None:
+                if timed:
+                    stats.incr("sr.timeouts")
+                raise TimeoutError("No reply before timeout")
+            try:
+                # Lazy decode: rejected frames only pay for the fields we compare
+                ether = Ether(raw=frame, lazy=True)
+                reply = ether.getlayer(IP)
+                if timed:
+                    t2 = _clock()
+                    stats.incr("rx.frames")
+                    stats.observe("parse", t2 - t1)
+                if reply is None:
+                    reason = "not_ip"
+                elif reply.hashret() != key:
+                    reason = "hashret"
+                elif not reply.answers(ip):
+                    reason = "answers"
+                else:
+                    if timed:
+                        stats.observe("match", _clock() - t2)
+                        stats.observe("sr.rtt", time.monotonic() - sent_at)
+                    return ether
+            except Exception:
+                reason = "error"
+            if timed:
+                stats.incr("reject." + reason)
     finally:
-        sock.close()
-
-
-def sr(pkt, interface: Optional[str] = None, timeout: float = 8.0):
-    print("SR is sending")
-    
-    # Ensure proto is set before expectations check
-    if isinstance(pkt, Ether) and pkt.payload and isinstance(pkt.payload, IP):
-        pkt.payload._infer_proto()
-    elif isinstance(pkt, IP):
-        pkt._infer_proto()
-    
-    # Transmit at L3
-    send(pkt)
-
-    # Determine expected protocol and ports from the outgoing packet
-    def _extract_expectations(p):
-        # Unwrap to IP layer
-        ip_layer = p.payload if isinstance(p, Ether) else p
-        l4 = getattr(ip_layer, "payload", None)
-        proto = getattr(ip_layer, "proto", 0)
-        src_ip = getattr(ip_layer, "src_ip", None)
-        exp = {"proto": proto, "src_ip": src_ip}
-        if l4 and l4.__class__.__name__ == "UDP":
-            exp.update({
-                "udp_sport": getattr(l4, "sport", None),
-                "udp_dport": getattr(l4, "dport", None),
-            })
-            # If proto not set on IP, infer UDP=17
-            if not proto:
-                exp["proto"] = 17
-        elif l4 and l4.__class__.__name__ == "TCP":
-            exp.update({
-                "tcp_sport": getattr(l4, "sport", None),
-                "tcp_dport": getattr(l4, "dport", None),
-            })
-            if not proto:
-                exp["proto"] = 6
-        elif l4 and l4.__class__.__name__ == "ICMP":
-            if not proto:
-                exp["proto"] = 1
-        return exp
-
-    exp = _extract_expectations(pkt)
-
-    # Receive at L2 on specified interface
-    af_packet = getattr(socket, "AF_PACKET", None)
-    if af_packet is None:
-        raise NotImplementedError("sr() sniff requires Linux (AF_PACKET)")
-    recv_sock = socket.socket(af_packet, socket.SOCK_RAW, socket.htons(0x0003))
-    if interface:
-        recv_sock.bind((interface, 0))
-    recv_sock.settimeout(timeout)
+        rx.close()
+
+
+class SRAnswer(NamedTuple):
+    sent: BaseLayer
+    received: Ether
+    rtt: float  # seconds from send to the reply being read
+
+
+def _reply_filter(pkt) -> str:
+    """BPF expression accepting frames that could answer `pkt`, including
+    ICMP errors about it.
+    """
+    ip = _ensure_ip(pkt)
+    l4 = ip.payload
+    if isinstance(l4, ICMP):
+        expr = "icmp"
+    elif isinstance(l4, (TCP, UDP)):
+        expr = f"({'tcp' if isinstance(l4, TCP) else 'udp'} and src port {l4.dport} and dst port {l4.sport} or icmp)"
+    else:
+        expr = "ip"
+    if ip.src_ip and ip.src_ip != "0.0.0.0":
+        expr += f" and dst host {ip.src_ip}"
+    return expr
+
 
+def sr_many(pkts: Iterable[BaseLayer], timeout: float = 8.0, inter: float = 0.0,
+            interface: Optional[str] = None, verbose: Optional[bool] = None,
+            sender: Optional[Sender] = None) -> Tuple[List[SRAnswer], List[BaseLayer]]:
+    """Send many probes at layer 3 and collect their replies in one pass.
+    Probes go out every `inter` seconds through one pooled socket while
+    replies are read from one listening socket and looked up in a dict of
+    outstanding probes keyed by hashret(), then confirmed with answers()
+    (so ICMP errors quoting a probe match it too). `timeout` is a single wall-clock
+    deadline for the whole call; probes not sent or answered by then are
+    returned as unanswered. Returns (answered, unanswered).
+    """
+    sender = sender if sender is not None else default_sender
+    pkts = list(pkts)
+    outstanding: Dict[bytes, List[Tuple[BaseLayer, IP, float]]] = {}
+    answered: List[SRAnswer] = []
+    unanswered: List[BaseLayer] = []
+    n_outstanding = 0
+
+    # One kernel filter for the batch: probe protocols to our own addresses
+    protos = set()
+    sources = set()
+    for pkt in pkts:
+        ip = _ensure_ip(pkt)
+        if isinstance(ip, IP):
+            l4 = ip.payload
+            protos.add("icmp" if isinstance(l4, ICMP) else "tcp" if isinstance(l4, TCP)
+                       else "udp" if isinstance(l4, UDP) else "ip")
+            protos.add("icmp")  # errors about any probe
+            sources.add(ip.src_ip)
+    expr = "ip" if "ip" in protos else " or ".join(sorted(protos))
+    if sources and "0.0.0.0" not in sources and len(sources) <= 16:
+        expr = f"({expr}) and ({' or '.join(f'dst host {src}' for src in sorted(sources))})"
+
+    deadline = time.monotonic() + timeout
+    transport = sender.transport
+    timed = stats.ENABLED
+    rx = transport.open(interface, expr if protos else None, outgoing=False)
     try:
-        print(f"[+] Sent packet to {_dst_of(pkt)}, waiting for reply on {interface or 'any'}...")
-        while True:
+        def drain(until: float, final: bool = False) -> None:
+            """Match whatever has arrived, waiting for more until `until`."""
+            nonlocal n_outstanding
+            while True:
+                while True:
+                    if timed:
+                        t0 = _clock()
+                    frame = rx.recv(0)
+                    if frame is None:
+                        break
+                    now = time.monotonic()
+                    if timed:
+                        t1 = _clock()
+                        stats.observe("recv.syscall", t1 - t0)
+                    try:
+                        reply = Ether(raw=frame, lazy=True).getlayer(IP)
+                        if timed:
+                            t2 = _clock()
+                            stats.incr("rx.frames")
+                            stats.observe("parse", t2 - t1)
+                        if reply is None:
+                            reason = "not_ip"
+                        else:
+                            key = reply.hashret()
+                            waiting = outstanding.get(key)
+                            reason = "hashret"
+                            if waiting:
+                                reason = "answers"
+                                for i, (probe, probe_ip, sent_at) in enumerate(waiting):
+                                    if reply.answers(probe_ip):
+                                        reason = None
+                                        break
+                    except Exception:
+                        reason = "error"
+                    if reason is not None:
+                        if timed:
+                            stats.incr("reject." + reason)
+                        continue
+                    if timed:
+                        stats.observe("match", _clock() - t2)
+                        stats.observe("sr.rtt", now - sent_at)
+                    del waiting[i]
+                    if not waiting:
+                        del outstanding[key]
+                    answered.append(SRAnswer(probe, Ether(raw=frame), now - sent_at))
+                    n_outstanding -= 1
+                if final and n_outstanding == 0:
+                    return
+                wait = until - time.monotonic()
+                if wait <= 0:
+                    return
+                select.select([rx], [], [], wait)
+
+        for i, pkt in enumerate(pkts):
+            if time.monotonic() >= deadline:
+                unanswered.extend(pkts[i:])
+                break
+            ip = _ensure_ip(pkt)
+            if not isinstance(ip, IP):
+                raise ValueError("sr_many() expects IP packets or Ether/IP stacks")
             try:
-                frame = recv_sock.recv(65535)
-            except socket.timeout:
-                raise TimeoutError("No reply before timeout")
-            if not frame:
+                if timed:
+                    t0 = _clock()
+                    b = ip.build()
+                    t1 = _clock()
+                    transport.send(b, ip.dst_ip)
+                    stats.observe("build", t1 - t0)
+                    stats.observe("send.syscall", _clock() - t1)
+                    stats.incr("tx.packets")
+                else:
+                    transport.send(ip.build(), ip.dst_ip)
+            except OSError:
+                if timed:
+                    stats.incr("tx.errors")
+                unanswered.append(pkt)
                 continue
+            outstanding.setdefault(ip.hashret(), []).append((pkt, ip, time.monotonic()))
+            n_outstanding += 1
+            drain(min(time.monotonic() + inter, deadline))
+        if n_outstanding:
+            drain(deadline, final=True)
+    finally:
+        rx.close()
+
+    for waiting in outstanding.values():
+        unanswered.extend(probe for probe, _, _ in waiting)
+    if timed and unanswered:
+        stats.incr("sr.timeouts", len(unanswered))
+    if sender.verbose if verbose is None else verbose:
+        print(f"[+] sr_many: {len(answered)} answered, {len(unanswered)} unanswered")
+    return answered, unanswered
+
+
+# --- asyncio -----------------------------------------------------------------
+
+async def async_send(pkt, verbose: Optional[bool] = None) -> None:
+    """Coroutine version of send(); raw sockets are non-blocking and pooled."""
+    ip = _ensure_ip(pkt)
+    if not isinstance(ip, IP):
+        raise ValueError("async_send() expects an IP packet or an Ether/IP stack")
+    await default_sender.transport.async_send(ip.build(), ip.dst_ip)
+    if stats.ENABLED:
+        stats.incr("tx.packets")
+    if default_sender.verbose if verbose is None else verbose:
+        print(f"[+] Sent packet to {ip.dst_ip} (Layer 3)")
+
+
+class _AsyncListener:
+    """One receiver per (event loop, transport, interface), read via
+    loop.add_reader and shared by every async_sr() waiter and async_sniff()
+    iterator on that loop. It is closed when the last user releases it.
+    """
+
+    _registry: Dict[Tuple[asyncio.AbstractEventLoop, Transport, Optional[str]], "_AsyncListener"] = {}
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, transport: Transport, interface: Optional[str]):
+        self.loop = loop
+        self.key = (loop, transport, interface)
+        self.waiting: Dict[bytes, List[Tuple[IP, asyncio.Future]]] = {}
+        self.queues: List[asyncio.Queue] = []
+        self.users = 0
+        self.rx = transport.open(interface)
+        loop.add_reader(self.rx.fileno(), self._on_readable)
+
+    @classmethod
+    def acquire(cls, interface: Optional[str]) -> "_AsyncListener":
+        loop = asyncio.get_running_loop()
+        transport = default_sender.transport
+        listener = cls._registry.get((loop, transport, interface))
+        if listener is None:
+            listener = cls._registry[(loop, transport, interface)] = cls(loop, transport, interface)
+        listener.users += 1
+        return listener
+
+    def release(self) -> None:
+        self.users -= 1
+        if self.users == 0:
+            del self._registry[self.key]
+            self.loop.remove_reader(self.rx.fileno())
+            self.rx.close()
+
+    def _on_readable(self) -> None:
+        timed = stats.ENABLED
+        for _ in range(256):  # bounded so one busy socket cannot starve the loop
+            frame = self.rx.recv(0)
+            if frame is None:
+                return
+            if timed:
+                stats.incr("rx.frames")
             try:
-                ether = Ether(raw=frame)
-                ip = ether.get_layer("IP")
-                if not ip:
-                    continue
-                if exp.get("src_ip") and getattr(ip, "dst_ip", None) != exp["src_ip"]:
-                    continue
-                # Protocol filter
-                proto = getattr(ip, "proto", None)
-                if exp.get("proto") and proto != exp["proto"]:
-                    continue
-                # UDP-specific port flip check (dns)
-                if proto == 17:
-                    udp = ether.get_layer("UDP")
-                    if not udp:
-                        continue
-                    udp_sport = getattr(udp, "sport", None)
-                    udp_dport = getattr(udp, "dport", None)
-                    if (exp.get("udp_dport") is not None and udp_sport != exp["udp_dport"]) or \
-                       (exp.get("udp_sport") is not None and udp_dport != exp["udp_sport"]):
-                        continue
-                # TCP-specific check (3whs)
-                if proto == 6:
-                    tcp = ether.get_layer("TCP")
-                    if not tcp:
-                        continue
-                    tcp_sport = getattr(tcp, "sport", None)
-                    tcp_dport = getattr(tcp, "dport", None)
-                    if (exp.get("tcp_dport") is not None and tcp_sport != exp["tcp_dport"]) or \
-                       (exp.get("tcp_sport") is not None and tcp_dport != exp["tcp_sport"]):
-                        continue
-                # ICMP: already filtered by proto+dst
-                return ether
+                pkt = Ether(raw=frame, lazy=True)
+                for queue in self.queues:
+                    if not queue.full():
+                        queue.put_nowait(pkt)
+                    elif timed:
+                        stats.incr("rx.queue_full")
+                if self.waiting:
+                    if timed:
+                        t0 = _clock()
+                    reason = self._match(pkt)
+                    if timed:
+                        if reason is None:
+                            stats.observe("match", _clock() - t0)
+                        else:
+                            stats.incr("reject." + reason)
             except Exception:
+                if timed:
+                    stats.incr("reject.error")
                 continue
+
+    def _match(self, pkt: Ether) -> Optional[str]:
+        """Complete the future the frame answers; otherwise return why not."""
+        reply = pkt.getlayer(IP)
+        if reply is None:
+            return "not_ip"
+        waiting = self.waiting.get(reply.hashret())
+        if not waiting:
+            return "hashret"
+        for probe, fut in waiting:
+            if not fut.done() and reply.answers(probe):
+                fut.set_result(pkt)  # async_sr() removes it from `waiting`
+                return None
+        return "answers"
+
+
+async def async_sr(pkt, timeout: float = 8.0, interface: Optional[str] = None,
+                   verbose: Optional[bool] = None) -> Ether:
+    """Coroutine version of sr(): send `pkt` and return the matching reply,
+    or raise TimeoutError. Concurrent calls share one receive socket; replies
+    are matched with hashret()/answers() like sr_many().
+    """
+    ip = _ensure_ip(pkt)
+    if not isinstance(ip, IP):
+        raise ValueError("async_sr() expects an IP packet or an Ether/IP stack")
+    ip.build()  # settles proto before computing the key
+    listener = _AsyncListener.acquire(interface)
+    fut = listener.loop.create_future()
+    key = ip.hashret()
+    entry = (ip, fut)
+    listener.waiting.setdefault(key, []).append(entry)
+    try:
+        await async_send(ip, verbose)
+        sent_at = time.monotonic()
+        reply = await asyncio.wait_for(fut, timeout)
+        if stats.ENABLED:
+            stats.observe("sr.rtt", time.monotonic() - sent_at)
+        return reply
+    except asyncio.TimeoutError:
+        if stats.ENABLED:
+            stats.incr("sr.timeouts")
+        raise TimeoutError("No reply before timeout") from None
     finally:
-        recv_sock.close()
+        waiting = listener.waiting.get(key)
+        if waiting is not None:
+            waiting.remove(entry)
+            if not waiting:
+                del listener.waiting[key]
+        listener.release()
+
+
+async def async_sniff(interface: Optional[str] = None, count: int = 0,
+                      timeout: Optional[float] = None,
+                      maxsize: int = 4096) -> AsyncIterator[Ether]:
+    """Async iterator over received frames (lazily decoded Ether stacks).
+    Stops after `count` frames (0 = no limit) or `timeout` seconds overall.
+    Frames arriving while `maxsize` are already queued are dropped.
+    """
+    listener = _AsyncListener.acquire(interface)
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    listener.queues.append(queue)
+    deadline = None if timeout is None else listener.loop.time() + timeout
+    try:
+        n = 0
+        while not count or n < count:
+            if deadline is None:
+                pkt = await queue.get()
+            else:
+                remaining = deadline - listener.loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    pkt = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return
+            n += 1
+            yield pkt
+    finally:
+        listener.queues.remove(queue)
+        listener.release()
+
+
+SNIFF_MODES = ("socket", "ring")
 
 
-def sniff_packet(interface: Optional[str] = None, timeout: float = 2.0):
-    af_packet = getattr(socket, "AF_PACKET", None)
-    if af_packet is None:
-        raise NotImplementedError("sniff requires Linux (AF_PACKET)")
-    sock = socket.socket(af_packet, socket.SOCK_RAW, socket.htons(0x0003))
-    if interface:
-        sock.bind((interface, 0))
-    sock.settimeout(timeout)
+def _capture(interface: Optional[str], filter: Optional[str], mode: str,
+             timeout: Optional[float]) -> Iterator[Tuple[float, Union[bytes, memoryview]]]:
+    """Yield (timestamp, frame) pairs from one long-lived capture until
+    `timeout` seconds have passed in total (None: forever). "socket" reads
+    one frame per recv(); "ring" reads blocks from a PACKET_MMAP ring.
+    Either way frames this host sends are captured too, like tcpdump does.
+    Ring frames are views into the ring, read in place: they are only valid
+    until the next frame is requested, so copy what has to outlive that.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+    transport = default_sender.transport
+    if mode == "ring":
+        if not isinstance(transport, RawTransport):
+            raise ValueError("ring mode needs the raw socket transport")
+        with RingCapture(interface, filter=filter) as ring:
+            while True:
+                frames = ring.next_block(remaining())
+                if frames is None:
+                    return
+                try:
+                    yield from frames  # the block is released after its last frame
+                finally:
+                    ring.release_block()
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+    if mode != "socket":
+        raise ValueError(f"unknown sniff mode {mode!r} (expected one of {SNIFF_MODES})")
+    rx = transport.open(interface, filter)
     try:
-        frame = sock.recv(65535)
+        while True:
+            frame = rx.recv(remaining())
+            if frame is None:
+                return
+            yield time.time(), frame
+    finally:
+        rx.close()
+
+
+def sniff_iter(interface: Optional[str] = None, count: int = 0, timeout: Optional[float] = None,
+               filter: Optional[str] = None, stop_filter: Optional[Callable[[Ether], bool]] = None,
+               mode: str = "socket", lazy: bool = False) -> Iterator[Ether]:
+    """Yield decoded frames from one capture socket (or ring) as they arrive.
+    Stops after `count` frames (0 = no limit), `timeout` seconds in total
+    (None = never), or right after a frame for which `stop_filter` is true.
+    """
+    n = 0
+    for _, frame in _capture(interface, filter, mode, timeout):
+        timed = stats.ENABLED
+        if timed:
+            stats.incr("rx.frames")
+            t0 = _clock()
+        try:
+            # An eager parse copies what it keeps; a lazy one keeps views of
+            # the frame, which must not point into the ring
+            pkt = Ether(raw=bytes(frame) if lazy and not isinstance(frame, bytes) else frame, lazy=lazy)
+        except Exception:
+            if timed:
+                stats.incr("reject.error")
+            continue  # runt or garbled frame
+        if timed:
+            stats.observe("parse", _clock() - t0)
+        yield pkt
+        n += 1
+        if (count and n >= count) or (stop_filter is not None and stop_filter(pkt)):
+            return
+
+
+def sniff(interface: Optional[str] = None, count: int = 0, timeout: Optional[float] = None,
+          filter: Optional[str] = None, prn: Optional[Callable[[Ether], object]] = None,
+          stop_filter: Optional[Callable[[Ether], bool]] = None, store: bool = True,
+          maxstore: Optional[int] = None, mode: str = "socket", lazy: bool = False) -> List[Ether]:
+    """Capture continuously and return the stored frames.
+    `prn` is called on every frame and its result printed unless None.
+    With `store=False` nothing is kept (constant memory for long runs);
+    `maxstore` bounds the result to the most recent frames.
+    """
+    stored: Deque[Ether] = deque(maxlen=maxstore)
+    for pkt in sniff_iter(interface, count, timeout, filter, stop_filter, mode, lazy):
+        if prn is not None:
+            result = prn(pkt)
+            if result is not None:
+                print(result)
+        if store:
+            stored.append(pkt)
+    return list(stored)
+
+
+def sniff_packet(interface: Optional[str] = None, timeout: float = 2.0, filter: Optional[str] = None,
+                 mode: str = "socket"):
+    for _, frame in _capture(interface, filter, mode, timeout):
         pkt = Ether(raw=frame)
         pkt.show()
         return pkt
-    finally:
-        sock.close()
-
-# Back-compat alias expected by assignment text
-sniff = sniff_packet
+    raise TimeoutError("No packet before timeout")
 
 
 def create_icmp_packet(src_mac, dst_mac, src_ip, dst_ip, seq=1):
@@ -201,4 +743,4 @@ def receive_packet():
     return sr(Ether(raw=b''), timeout=1)
 
 def sniff_packets(interface):
-    return sniff(interface=interface)
\ No newline at end of file
+    return sniff_packet(interface=interface)
\ No newline at end of file
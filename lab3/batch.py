@@ -0,0 +1,170 @@
+"""Columnar batch decoding of Ethernet/IPv4 frames into a NumPy structured array.
+
+Instead of building layer objects per frame, every header field is gathered for
+all frames at once with vectorized offset arithmetic, using the same header
+layouts (`_field_layout`) as the classes in `layers`.
+
+    arr = decode_batch(frames)                 # list of frames
+    arr = decode_batch(buf, offsets, lengths)  # one contiguous buffer
+    syns = arr[(arr["proto"] == 6) & (arr["tcp_flags"] & 0x02 != 0)]
+
+Addresses are unsigned integers in network order (IPv4 as uint32, MACs as
+uint64); `ip_str`/`mac_str` format single values. Fields of layers a frame does
+not carry are 0; the `has_*` columns tell which layers were decoded.
+
+NumPy is optional for the rest of the library and only needed here.
+"""
+
+import socket
+from typing import Optional, Sequence, Union
+
+from layers import ICMP, IP, TCP, UDP, Ether
+from layers.ether import ETH_P_IP
+from layers.ip import PROTO_ICMP, PROTO_TCP, PROTO_UDP
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+ETH_HLEN = 14
+
+BATCH_FIELDS = [
+    ("frame_len", "u4"),
+    ("dst_mac", "u8"),
+    ("src_mac", "u8"),
+    ("eth_type", "u2"),
+    ("has_ip", "?"),
+    ("ttl", "u1"),
+    ("proto", "u1"),
+    ("ip_len", "u2"),
+    ("src_ip", "u4"),
+    ("dst_ip", "u4"),
+    ("has_tcp", "?"),
+    ("has_udp", "?"),
+    ("has_icmp", "?"),
+    ("sport", "u2"),
+    ("dport", "u2"),
+    ("tcp_flags", "u1"),
+    ("tcp_seq", "u4"),
+    ("tcp_ack", "u4"),
+    ("tcp_window", "u2"),
+    ("icmp_type", "u1"),
+    ("icmp_code", "u1"),
+    ("payload_len", "u4"),
+]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("decode_batch() requires NumPy (pip install numpy)")
+
+
+def _off(layer, name: str) -> int:
+    return layer._field_layout[name][0]
+
+
+def decode_batch(frames: Union[Sequence[bytes], bytes, bytearray, memoryview],
+                 offsets: Optional[Sequence[int]] = None,
+                 lengths: Optional[Sequence[int]] = None):
+    """Decode many frames into a structured array with one row per frame.
+    `frames` is either a sequence of frames, or one contiguous buffer together
+    with the start `offsets` of each frame (and their `lengths`; by default each
+    frame runs to the next offset and the last one to the end of the buffer).
+    """
+    _require_numpy()
+    if offsets is None:
+        lens = np.fromiter((len(f) for f in frames), dtype=np.int64, count=len(frames))
+        starts = np.zeros(len(lens), dtype=np.int64)
+        np.cumsum(lens[:-1], out=starts[1:])
+        data = b"".join(frames)
+    else:
+        data = frames
+        starts = np.asarray(offsets, dtype=np.int64)
+        if lengths is None:
+            ends = np.append(starts[1:], len(data))
+            lens = ends - starts
+        else:
+            lens = np.asarray(lengths, dtype=np.int64)
+
+    n = len(starts)
+    out = np.zeros(n, dtype=BATCH_FIELDS)
+    if n == 0:
+        return out
+    # Zero padding lets masked-out gathers read past the last frame safely
+    buf = np.concatenate((np.frombuffer(data, dtype=np.uint8), np.zeros(8, dtype=np.uint8)))
+    ends = starts + lens
+
+    def gather(pos, size, mask):
+        """Big-endian unsigned `size`-byte values at `pos` where `mask`, else 0."""
+        pos = np.where(mask, pos, 0)
+        val = buf[pos].astype(np.uint64)
+        for k in range(1, size):
+            val = (val << np.uint64(8)) | buf[pos + k]
+        return np.where(mask, val, 0)
+
+    out["frame_len"] = lens
+
+    # Ethernet
+    eth = lens >= ETH_HLEN
+    out["dst_mac"] = gather(starts + _off(Ether, "dst_mac"), 6, eth)
+    out["src_mac"] = gather(starts + _off(Ether, "src_mac"), 6, eth)
+    eth_type = gather(starts + _off(Ether, "type"), 2, eth)
+    out["eth_type"] = eth_type
+
+    # IPv4 (variable header length from IHL)
+    ip = starts + ETH_HLEN
+    has_ip = eth & (eth_type == ETH_P_IP) & (lens >= ETH_HLEN + 20)
+    v_ihl = gather(ip, 1, has_ip)
+    ihl = (v_ihl & 0x0F).astype(np.int64) * 4
+    has_ip &= ((v_ihl >> 4) == 4) & (ihl >= 20) & (ip + ihl <= ends)
+    ip_len = gather(ip + 2, 2, has_ip).astype(np.int64)
+    frag = gather(ip + 6, 2, has_ip) & 0x1FFF
+    out["has_ip"] = has_ip
+    out["ip_len"] = ip_len
+    out["ttl"] = gather(ip + _off(IP, "ttl"), 1, has_ip)
+    proto = gather(ip + _off(IP, "proto"), 1, has_ip)
+    out["proto"] = proto
+    out["src_ip"] = gather(ip + _off(IP, "src_ip"), 4, has_ip)
+    out["dst_ip"] = gather(ip + _off(IP, "dst_ip"), 4, has_ip)
+
+    # L4 starts after the IP header; it ends at the IP total length (if sane)
+    l4 = ip + ihl
+    l4_end = np.where((ip_len > 0) & (ip + ip_len <= ends), ip + ip_len, ends)
+    first_frag = has_ip & (frag == 0)
+
+    has_tcp = first_frag & (proto == PROTO_TCP) & (l4 + 20 <= l4_end)
+    has_udp = first_frag & (proto == PROTO_UDP) & (l4 + 8 <= l4_end)
+    has_icmp = first_frag & (proto == PROTO_ICMP) & (l4 + 8 <= l4_end)
+    out["has_tcp"] = has_tcp
+    out["has_udp"] = has_udp
+    out["has_icmp"] = has_icmp
+
+    ports = has_tcp | has_udp
+    out["sport"] = gather(l4 + _off(TCP, "sport"), 2, ports)
+    out["dport"] = gather(l4 + _off(TCP, "dport"), 2, ports)
+    out["tcp_flags"] = gather(l4 + _off(TCP, "flags"), 1, has_tcp)
+    out["tcp_seq"] = gather(l4 + _off(TCP, "seq"), 4, has_tcp)
+    out["tcp_ack"] = gather(l4 + _off(TCP, "ack"), 4, has_tcp)
+    out["tcp_window"] = gather(l4 + _off(TCP, "window"), 2, has_tcp)
+    out["icmp_type"] = gather(l4 + _off(ICMP, "type"), 1, has_icmp)
+    out["icmp_code"] = gather(l4 + _off(ICMP, "code"), 1, has_icmp)
+
+    tcp_hlen = (gather(l4 + 12, 1, has_tcp) >> 4).astype(np.int64) * 4
+    udp_len = gather(l4 + _off(UDP, "length"), 2, has_udp).astype(np.int64)
+    payload_len = np.zeros(n, dtype=np.int64)
+    payload_len = np.where(has_tcp, l4_end - l4 - tcp_hlen, payload_len)
+    payload_len = np.where(has_udp, np.minimum(np.maximum(udp_len, 8), l4_end - l4) - 8, payload_len)
+    payload_len = np.where(has_icmp, l4_end - l4 - 8, payload_len)
+    out["payload_len"] = np.maximum(payload_len, 0)
+    return out
+
+
+def ip_str(value: int) -> str:
+    """Format a uint32 address column value as dotted-quad."""
+    return socket.inet_ntoa(int(value).to_bytes(4, "big"))
+
+
+def mac_str(value: int) -> str:
+    """Format a uint64 MAC column value as aa:bb:cc:dd:ee:ff."""
+    return ":".join(f"{b:02x}" for b in int(value).to_bytes(6, "big"))
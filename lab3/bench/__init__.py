@@ -0,0 +1,2 @@
+# Micro-benchmarks for the lab3 packet library.
+# Run from the lab3 directory, e.g. `python -m bench.checksum`.
@@ -0,0 +1,63 @@
+"""Throughput of the Internet checksum engine vs. the original word loop.
+
+Usage (from lab3/):  python -m bench.checksum
+"""
+
+import os
+import time
+
+from utils import checksum_ones_complement, checksum_update
+
+SIZES = (20, 64, 576, 1400, 9000)
+
+
+def checksum_loop(data: bytes) -> int:
+    """The original two-bytes-per-iteration implementation, kept as a baseline."""
+    if len(data) % 2 == 1:
+        data += b"\x00"
+    total = 0
+    for i in range(0, len(data), 2):
+        total += (data[i] << 8) + data[i + 1]
+        total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+def mb_per_s(func, data: bytes, min_time: float = 0.2) -> float:
+    n = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for _ in range(100):
+            func(data)
+        n += 100
+        elapsed = time.perf_counter() - start
+    return n * len(data) / elapsed / 1e6
+
+
+def updates_per_s(min_time: float = 0.2) -> float:
+    n = 0
+    csum = 0x1C46
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for seq in range(1000):
+            csum = checksum_update(csum, seq, seq + 1)
+        n += 1000
+        elapsed = time.perf_counter() - start
+    return n / elapsed
+
+
+def main():
+    print(f"{'bytes':>6} {'loop MB/s':>10} {'new MB/s':>10} {'speedup':>8}")
+    for size in SIZES:
+        data = os.urandom(size)
+        assert checksum_loop(data) == checksum_ones_complement(data)
+        old = mb_per_s(checksum_loop, data)
+        new = mb_per_s(checksum_ones_complement, data)
+        print(f"{size:>6} {old:>10.1f} {new:>10.1f} {new / old:>7.1f}x")
+    print(f"\nRFC 1624 incremental update: {updates_per_s() / 1e6:.2f} M updates/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Memory held per parsed packet (all layer objects, excluding the frame bytes).
+
+Usage (from lab3/):  python -m bench.memory [count]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from layers import DNS, ICMP, IP, TCP, UDP, Ether
+
+SRC_MAC = "00:0c:29:6f:00:f1"
+DST_MAC = "00:50:56:fb:73:ea"
+
+
+def sample_frames():
+    eth = lambda: Ether(src_mac=SRC_MAC, dst_mac=DST_MAC)
+    return {
+        "Ether/IP/ICMP": (eth() / IP(src_ip="10.0.0.1", dst_ip="8.8.8.8")
+                          / ICMP(id=1, seq=1, data=b"\x00" * 32)).build(),
+        "Ether/IP/UDP/DNS": (eth() / IP(src_ip="10.0.0.1", dst_ip="8.8.8.8")
+                             / UDP(sport=12345, dport=53) / DNS(qname="vibrantcloud.org")).build(),
+        "Ether/IP/TCP": (eth() / IP(src_ip="10.0.0.1", dst_ip="10.0.0.2")
+                         / TCP(sport=40000, dport=80, data=b"x" * 1460)).build(),
+    }
+
+
+def bytes_per_packet(frame: bytes, count: int, lazy: bool = False) -> float:
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    pkts = [Ether(raw=frame, lazy=lazy) for _ in range(count)]
+    if lazy:
+        for p in pkts:
+            p.getlayer(IP)  # what a filter touches: Ether + IP headers
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del pkts
+    return used / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'stack':<18} {'eager B/pkt':>12} {'lazy+IP B/pkt':>14}")
+    for name, frame in sample_frames().items():
+        eager = bytes_per_packet(frame, count)
+        lazy = bytes_per_packet(frame, count, lazy=True)
+        print(f"{name:<18} {eager:>12.0f} {lazy:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
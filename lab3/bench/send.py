@@ -0,0 +1,89 @@
+"""Packets per second: pooled raw sockets vs. opening a socket per packet,
+and batched send_many()/sendp_many() vs. a loop of pooled sends.
+
+Sends small ICMP echo requests to 127.0.0.1 (layer 3) and frames on "lo"
+(layer 2). Needs root (CAP_NET_RAW).
+
+Usage (from lab3/):  python -m bench.send [count]
+"""
+
+import socket
+import sys
+import time
+
+from api import Sender
+from layers import ICMP, IP, Ether
+from net.sockets import SocketPool
+
+IFACE = "lo"
+BATCH = 64
+
+
+def per_call_send(pkt) -> None:
+    """The original api.send: a fresh AF_INET raw socket for every packet."""
+    ip = pkt.payload
+    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+    try:
+        sock.sendto(ip.build(), (ip.dst_ip, 0))
+    finally:
+        sock.close()
+
+
+def per_call_sendp(pkt, interface: str) -> None:
+    """The original api.sendp: open, bind, send, close."""
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    try:
+        sock.bind((interface, 0))
+        sock.send(pkt.build())
+    finally:
+        sock.close()
+
+
+def pps(func, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    pkt = (Ether(src_mac="00:00:00:00:00:00", dst_mac="00:00:00:00:00:00")
+           / IP(src_ip="127.0.0.1", dst_ip="127.0.0.1") / ICMP(id=1, seq=1))
+    pkt.build()
+    with SocketPool() as pool:
+        sender = Sender(pool, verbose=False)
+        rows = [
+            ("send (L3)", lambda: per_call_send(pkt), lambda: sender.send(pkt)),
+            ("sendp (L2)", lambda: per_call_sendp(pkt, IFACE), lambda: sender.sendp(pkt, IFACE)),
+        ]
+        print(f"{count} packets each")
+        print(f"{'':>10} {'per-call pps':>13} {'pooled pps':>11} {'speedup':>8}")
+        for name, old, new in rows:
+            new()  # open the pooled socket outside the timing
+            old_pps = pps(old, count)
+            new_pps = pps(new, count)
+            print(f"{name:>10} {old_pps:>13.0f} {new_pps:>11.0f} {new_pps / old_pps:>7.1f}x")
+
+        # Batches of prebuilt packets; the L3 batch gathers header + body iovecs
+        l3 = pkt.payload.build()
+        frame = pkt.build()
+        l3_batch = [(l3[:20], l3[20:])] * BATCH
+        l2_batch = [frame] * BATCH
+        loops = max(count // BATCH, 1)
+        rows = [
+            ("send (L3)", lambda: [sender.send(pkt) for _ in range(BATCH)],
+             lambda: sender.send_many(l3_batch)),
+            ("sendp (L2)", lambda: [sender.sendp(pkt, IFACE) for _ in range(BATCH)],
+             lambda: sender.sendp_many(l2_batch, IFACE)),
+        ]
+        print(f"\nbatches of {BATCH}")
+        print(f"{'':>10} {'loop pps':>13} {'batch pps':>11} {'speedup':>8}")
+        for name, old, new in rows:
+            old_pps = pps(old, loops) * BATCH
+            new_pps = pps(new, loops) * BATCH
+            print(f"{name:>10} {old_pps:>13.0f} {new_pps:>11.0f} {new_pps / old_pps:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
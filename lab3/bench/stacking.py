@@ -0,0 +1,40 @@
+"""Packet construction rate: `/` stacking and clone().
+
+Usage (from lab3/):  python -m bench.stacking
+"""
+
+import copy
+import timeit
+
+from layers import DNS, ICMP, IP, UDP, Ether
+
+SRC_MAC = "00:0c:29:6f:00:f1"
+DST_MAC = "00:50:56:fb:73:ea"
+
+
+def stack_dns():
+    return (Ether(src_mac=SRC_MAC, dst_mac=DST_MAC) / IP(src_ip="10.0.0.1", dst_ip="8.8.8.8")
+            / UDP(sport=12345, dport=53) / DNS(qname="vibrantcloud.org"))
+
+
+def rate(func, number: int = 20000) -> float:
+    return number / min(timeit.repeat(func, number=number, repeat=3))
+
+
+def main():
+    pkt = stack_dns()
+    pkt.build()
+
+    def grow_chain():
+        head = IP(src_ip="10.0.0.1", dst_ip="10.0.0.2")
+        for _ in range(300):
+            head / ICMP()
+
+    print(f"Ether()/IP()/UDP()/DNS()   {rate(stack_dns) / 1e3:8.1f} k pkts/s")
+    print(f"clone() 4 layers           {rate(pkt.clone) / 1e3:8.1f} k/s")
+    print(f"copy.deepcopy 4 layers     {rate(lambda: copy.deepcopy(pkt)) / 1e3:8.1f} k/s")
+    print(f"300 x chain / ICMP()       {rate(grow_chain, 20) * 300 / 1e3:8.1f} k appends/s")
+
+
+if __name__ == "__main__":
+    main()
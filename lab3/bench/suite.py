@@ -0,0 +1,273 @@
+"""Build/parse benchmark suite with machine-readable results.
+
+Measures, for each layer and for the common stacks (Ether/IP/ICMP,
+Ether/IP/UDP/DNS, Ether/IP/TCP with 1460 bytes of data): construct+build
+and parse rates, plus checksum MB/s, `/` stacking cost and memory per
+parsed packet. Results are written as JSON so two commits can be compared:
+
+    python -m bench.suite -o before.json          # on the old commit
+    python -m bench.suite -o after.json --baseline before.json
+    python -m bench.suite --compare before.json after.json
+
+With a baseline, results that got worse by more than --threshold are
+listed and the exit status is 1; so it is when a lazy parse case is that
+much slower than the eager one it stands in for (parse_lazy_ip vs parse,
+filter_l4_lazy vs filter_l4). Rates are the best of several timed
+runs, which is the least noisy estimate on a busy machine.
+
+Usage (from lab3/):  python -m bench.suite [-o FILE] [--baseline FILE] [--quick] [-k SUBSTR]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from bench.checksum import mb_per_s
+from bench.memory import bytes_per_packet
+from layers import DNS, ICMP, IP, TCP, UDP, Ether
+from utils import checksum_ones_complement
+
+SRC_MAC = "00:0c:29:6f:00:f1"
+DST_MAC = "00:50:56:fb:73:ea"
+FORMAT = 1  # bump when result names or units change meaning
+
+
+class Case(NamedTuple):
+    name: str
+    unit: str           # "ops/s", "MB/s" or "B/pkt"
+    higher_is_better: bool
+    run: Callable[[float], float]  # min_time -> value
+
+
+def rate(func: Callable[[], object], min_time: float, repeat: int = 5) -> float:
+    """Calls per second: best of `repeat` runs of about `min_time` / `repeat` each."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    per_run = max(min_time / repeat, 1e-3)
+    number = max(1, int(number * per_run / elapsed))
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def _ether() -> Ether:
+    return Ether(src_mac=SRC_MAC, dst_mac=DST_MAC)
+
+
+LAYERS: Dict[str, Callable[[], object]] = {
+    "Ether": _ether,
+    "IP": lambda: IP(src_ip="10.0.0.1", dst_ip="10.0.0.2"),
+    "ICMP": lambda: ICMP(id=1, seq=1, data=b"\x00" * 32),
+    "UDP": lambda: UDP(sport=12345, dport=53, data=b"\x00" * 32),
+    "TCP": lambda: TCP(sport=40000, dport=80, seq=1, ack=1, flags=0x18),
+    "DNS": lambda: DNS(qname="vibrantcloud.org"),
+}
+
+STACKS: Dict[str, Callable[[], object]] = {
+    "Ether/IP/ICMP": lambda: (_ether() / IP(src_ip="10.0.0.1", dst_ip="8.8.8.8")
+                              / ICMP(id=1, seq=1, data=b"\x00" * 32)),
+    "Ether/IP/UDP/DNS": lambda: (_ether() / IP(src_ip="10.0.0.1", dst_ip="8.8.8.8")
+                                 / UDP(sport=12345, dport=53) / DNS(qname="vibrantcloud.org")),
+    "Ether/IP/TCP+1460": lambda: (_ether() / IP(src_ip="10.0.0.1", dst_ip="10.0.0.2")
+                                  / TCP(sport=40000, dport=80, seq=1, ack=1, flags=0x18, data=b"x" * 1460)),
+}
+
+CHECKSUM_SIZES = (20, 576, 1460, 9000)
+
+
+def _layer_cases(name: str, make: Callable[[], object]) -> List[Case]:
+    cls = type(make())
+    raw = make().build()
+    return [
+        Case(f"layer.{name}.build", "ops/s", True, lambda t: rate(lambda: make().build(), t)),
+        Case(f"layer.{name}.parse", "ops/s", True, lambda t: rate(lambda: cls(raw=raw), t)),
+    ]
+
+
+def _stack_cases(name: str, make: Callable[[], object]) -> List[Case]:
+    frame = make().build()
+    count = 5000
+    # A capture filter: read the first header field of the layer above IP
+    field = next(iter(make().payload.payload._field_layout))
+    return [
+        Case(f"stack.{name}.build", "ops/s", True, lambda t: rate(lambda: make().build(), t)),
+        Case(f"stack.{name}.parse", "ops/s", True, lambda t: rate(lambda: Ether(raw=frame), t)),
+        Case(f"stack.{name}.parse_lazy_ip", "ops/s", True,
+             lambda t: rate(lambda: Ether(raw=frame, lazy=True).getlayer(IP), t)),
+        Case(f"stack.{name}.filter_l4", "ops/s", True,
+             lambda t: rate(lambda: getattr(Ether(raw=frame).payload.payload, field), t)),
+        Case(f"stack.{name}.filter_l4_lazy", "ops/s", True,
+             lambda t: rate(lambda: getattr(Ether(raw=frame, lazy=True).payload.payload, field), t)),
+        Case(f"stack.{name}.memory", "B/pkt", False, lambda t: bytes_per_packet(frame, count)),
+        Case(f"stack.{name}.memory_lazy_ip", "B/pkt", False,
+             lambda t: bytes_per_packet(frame, count, lazy=True)),
+    ]
+
+
+def _stacking_cases() -> List[Case]:
+    make = STACKS["Ether/IP/UDP/DNS"]
+    layers = [_ether(), IP(src_ip="10.0.0.1", dst_ip="8.8.8.8"), UDP(sport=12345, dport=53),
+              DNS(qname="vibrantcloud.org")]
+
+    def construct_only():
+        _ether(), IP(src_ip="10.0.0.1", dst_ip="8.8.8.8"), UDP(sport=12345, dport=53), DNS(qname="vibrantcloud.org")
+
+    def append_chain():
+        head = IP(src_ip="10.0.0.1", dst_ip="10.0.0.2")
+        for _ in range(100):
+            head / ICMP()
+
+    def restack():
+        for layer in layers:
+            layer.payload = None
+        layers[0] / layers[1] / layers[2] / layers[3]
+
+    return [
+        Case("stacking.construct_4_layers", "ops/s", True, lambda t: rate(construct_only, t)),
+        Case("stacking.construct_and_stack_4_layers", "ops/s", True, lambda t: rate(make, t)),
+        Case("stacking.stack_4_existing_layers", "ops/s", True, lambda t: rate(restack, t)),
+        Case("stacking.append_100", "ops/s", True, lambda t: rate(append_chain, t) * 100),
+        Case("stacking.clone_4_layers", "ops/s", True, lambda t: rate(make().clone, t)),
+    ]
+
+
+def _checksum_cases() -> List[Case]:
+    cases = []
+    for size in CHECKSUM_SIZES:
+        data = os.urandom(size)
+        cases.append(Case(f"checksum.{size}B", "MB/s", True,
+                          lambda t, data=data: mb_per_s(checksum_ones_complement, data, t)))
+    return cases
+
+
+def all_cases() -> List[Case]:
+    cases: List[Case] = []
+    for name, make in LAYERS.items():
+        cases += _layer_cases(name, make)
+    for name, make in STACKS.items():
+        cases += _stack_cases(name, make)
+    cases += _stacking_cases()
+    cases += _checksum_cases()
+    return cases
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run(cases: List[Case], min_time: float, verbose: bool = True) -> Dict:
+    results = {}
+    for case in cases:
+        value = case.run(min_time)
+        results[case.name] = {"value": value, "unit": case.unit, "higher_is_better": case.higher_is_better}
+        if verbose:
+            print(f"{case.name:<44} {_fmt(value, case.unit):>16}", flush=True)
+    return {
+        "format": FORMAT,
+        "commit": _git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "min_time": min_time,
+        "results": results,
+    }
+
+
+def _fmt(value: float, unit: str) -> str:
+    if unit == "ops/s":
+        return f"{value / 1e3:,.1f} k/s"
+    if unit == "MB/s":
+        return f"{value:,.1f} MB/s"
+    return f"{value:,.0f} {unit}"
+
+
+#: lazy case -> the eager case it must not be slower than
+LAZY_PAIRS = {"parse_lazy_ip": "parse", "filter_l4_lazy": "filter_l4"}
+
+
+def lazy_slower(results: Dict, threshold: float) -> List[str]:
+    """Lazy parse cases slower than their eager counterpart by more than
+    `threshold`: lazy decoding only pays off if touching a few layers is cheap.
+    """
+    slower = []
+    for name, cur in results["results"].items():
+        stack, _, kind = name.rpartition(".")
+        eager = results["results"].get(f"{stack}.{LAZY_PAIRS.get(kind)}")
+        if eager is not None and cur["value"] < eager["value"] * (1 - threshold):
+            print(f"{name} is slower than {stack}.{LAZY_PAIRS[kind]}: "
+                  f"{_fmt(cur['value'], cur['unit'])} vs {_fmt(eager['value'], eager['unit'])}")
+            slower.append(name)
+    return slower
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    """Print old vs. new for every shared result; return the names that got
+    worse by more than `threshold` (a fraction).
+    """
+    print(f"\n{'':<44} {old.get('commit') or 'old':>16} {new.get('commit') or 'new':>16} {'change':>8}")
+    regressions = []
+    for name, cur in new["results"].items():
+        prev = old["results"].get(name)
+        if prev is None or prev["unit"] != cur["unit"] or not prev["value"]:
+            continue
+        change = cur["value"] / prev["value"] - 1
+        worse = -change if cur["higher_is_better"] else change
+        mark = ""
+        if worse > threshold:
+            regressions.append(name)
+            mark = "  <- slower" if cur["higher_is_better"] else "  <- larger"
+        print(f"{name:<44} {_fmt(prev['value'], prev['unit']):>16} {_fmt(cur['value'], cur['unit']):>16} "
+              f"{change:>+8.1%}{mark}")
+    if regressions:
+        print(f"\n{len(regressions)} result(s) worse than {threshold:.0%}")
+    return regressions
+
+
+def _load(path: str) -> Dict:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("format") != FORMAT:
+        raise SystemExit(f"{path}: result format {data.get('format')} != {FORMAT}")
+    return data
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="lab3 build/parse benchmark suite")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="only compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="fraction by which a result may get worse before it counts (default 0.10)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per timed case (default 0.5)")
+    parser.add_argument("--quick", action="store_true", help="short runs (min-time 0.1), for smoke tests")
+    parser.add_argument("-k", dest="select", help="only run cases whose name contains this")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(_load(args.compare[0]), _load(args.compare[1]), args.threshold) else 0
+
+    baseline = _load(args.baseline) if args.baseline else None
+    cases = [c for c in all_cases() if not args.select or args.select in c.name]
+    results = run(cases, 0.1 if args.quick else args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    failed = lazy_slower(results, args.threshold)
+    if baseline is not None and compare(baseline, results, args.threshold):
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,59 +1,614 @@
 from __future__ import annotations
 
-import copy
-from typing import Optional, TypeVar
+import itertools
+import struct
+from typing import Dict, List, Optional, Tuple, Type, TypeVar, Union
+
+from utils import stats
 
 T = TypeVar("T", bound="BaseLayer")
 
+# Source of chain versions: unique, so a cached version can only match the
+# chain it was read from
+_VERSIONS = itertools.count(1)
+
+# payload of an undecoded lazy layer not yet taken from the wire (or decoded)
+_UNSET = object()
+
+# getlayer() walks chains up to this many layers and indexes longer ones
+_WALK_DEPTH = 8
+# an index walk this deep is taken to be going round a cycle
+_MAX_DEPTH = 1024
+
+
+class _Chain:
+    """Version of the payload links of the layers sharing it, bumped whenever
+    one of them is reassigned; cached tails and layer indexes are only trusted
+    while the version they were computed at is current. Layers join the chain
+    of the layer whose cache first walks them, so changing one packet leaves
+    the caches of every other packet valid. Chains joined by stacking are
+    merged (union-find) and never split again: a layer moved to another
+    packet only makes both invalidate each other's caches more often.
+    """
+    __slots__ = ("version", "parent")
+
+    def __init__(self):
+        self.version = next(_VERSIONS)
+        self.parent: Optional[_Chain] = None
+
+
+def _root(chain: _Chain) -> _Chain:
+    """The chain `chain` was merged into (path compressed)."""
+    root = chain
+    while root.parent is not None:
+        root = root.parent
+    while chain.parent is not None and chain.parent is not root:
+        chain.parent, chain = root, chain.parent
+    return root
+
+
+def _current(cached: Optional[tuple]) -> bool:
+    """True if a (value, chain, version, ...) cache entry is still valid."""
+    return cached is not None and _root(cached[1]).version == cached[2]
+
+
+def _join(layer: "BaseLayer", chain: _Chain) -> None:
+    """Add `layer` (and the chain it is already part of) to root `chain`."""
+    mine = layer._chain
+    if mine is None:
+        layer._chain = chain
+        return
+    mine = _root(mine)
+    if mine is not chain:
+        mine.parent = chain
+        # caches over either part did not cover the whole merged chain
+        chain.version = next(_VERSIONS)
+
 
 class BaseLayer:
+    # Fields live in per-class __slots__ instead of a per-instance __dict__;
+    # subclasses list their own fields (including wired-in src_ip/dst_ip).
+    __slots__ = ("_payload", "_raw", "_lazy_data", "_built", "_tail", "_index", "_chain",
+                 "_parsed")
+
+    #: public field slots of the class and its bases, set by __init_subclass__
+    _field_slots: Tuple[str, ...] = ()
+    #: member descriptors of every slot, in MRO order (used by clone)
+    _slot_members: Tuple = ()
+    #: wire layout of fixed header fields: name -> (offset in header, struct format)
+    _field_layout: Dict[str, Tuple[int, str]] = {}
+    #: shortest header _decode() accepts; when set, the integer fields of
+    #: `_field_layout` are read straight from the wire while a lazily parsed
+    #: layer is undecoded
+    _min_len: int = 0
+    #: offset of this layer's checksum field in its header, if it has one
+    _csum_offset: Optional[int] = None
+    #: False for layers whose parser never attaches a payload layer
+    _parses_payload: bool = True
+    #: public fields that _decode() never sets (wired in by the layer below),
+    #: so using them leaves a lazily parsed layer undecoded
+    _wired_fields: Tuple[str, ...] = ()
+    #: classes a layer is indexed under: its own and its bases up to BaseLayer
+    _index_keys: Tuple[type, ...] = ()
+    #: the layer class itself, also for instances of its undecoded variant
+    _decoded_class: Type["BaseLayer"]
+    #: same-layout subclass that lazily parsed layers have until decoded
+    _undecoded_class: Type["BaseLayer"]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "_decoded_class" in cls.__dict__:
+            return  # an undecoded variant (below): everything is inherited
+        names = []
+        members = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                members.append(klass.__dict__[name])
+                if not name.startswith("_") and name not in names:
+                    names.append(name)
+        cls._field_slots = tuple(names)
+        cls._slot_members = tuple(members)
+        keys = []
+        for klass in cls.__mro__:
+            if klass is BaseLayer:
+                break
+            keys.append(klass)
+        cls._index_keys = tuple(keys)
+        cls._decoded_class = cls
+        # Same slots, so a lazily parsed layer can switch class in place, and
+        # the same name, so show(), stats and class-name checks see no
+        # difference. Its fields (payload included) are properties over the
+        # inherited slots that decode the layer on first use, so a read is a
+        # plain decode and an assignment can never be overwritten by one.
+        # Fixed integer header fields are a single struct read instead.
+        # Layers that can tell their payload from the wire bytes hand it out
+        # without decoding their own fields.
+        payload = (_wire_payload_property() if cls._wire_payload is not BaseLayer._wire_payload
+                   else _undecoded_property("payload"))
+        ns = {"__slots__": (), "__module__": cls.__module__, "__qualname__": cls.__qualname__,
+              "_decoded_class": cls, "payload": payload}
+        for name in cls._field_slots:
+            if name not in cls._wired_fields:
+                offset, fmt = cls._field_layout.get(name, (0, "s"))
+                wire = struct.Struct(fmt) if cls._min_len and not fmt.endswith("s") else None
+                ns[name] = _undecoded_property(name, offset, wire)
+        cls._undecoded_class = type(cls.__name__, (cls,), ns)
+
     def __init__(self, payload: Optional["BaseLayer"] = None):
-        self.payload: Optional[BaseLayer] = payload
+        self._payload: Optional[BaseLayer] = payload
+        # (tail layer, chain, version) cached by _last() so `/` does not walk the chain
+        self._tail: Optional[Tuple[BaseLayer, _Chain, int]] = None
+        # (layer class -> layers in stack order, chain, version, last layer
+        # indexed or None once complete, layers indexed) cached by _layer_index()
+        self._index: Optional[Tuple[Dict[type, List[BaseLayer]], _Chain, int,
+                                    Optional[BaseLayer], int]] = None
+        # Chain whose version covers this layer's payload link, once a cache
+        # depends on it (see _Chain)
+        self._chain: Optional[_Chain] = None
+        # Lazy decoding: the not yet decoded wire bytes of this layer (the
+        # frame itself or a view into it), and a view of its trailing data
+        # until `data` is first read.
+        self._raw: Optional[Union[bytes, memoryview]] = None
+        self._lazy_data: Optional[memoryview] = None
+        # Build cache: (field key, payload bytes, serialized bytes) of the last build()
+        self._built: Optional[Tuple[tuple, bytes, bytes]] = None
+        # Parsed from bytes rather than constructed from fields (see show())
+        self._parsed = False
+
+    @property
+    def payload(self) -> Optional["BaseLayer"]:
+        return self._payload
+
+    @payload.setter
+    def payload(self, value: Optional["BaseLayer"]) -> None:
+        self._payload = value
+        chain = self._chain
+        if chain is not None:
+            if chain.parent is not None:
+                chain = _root(chain)
+            chain.version = next(_VERSIONS)
+
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
+        """Decode header fields from `raw` and attach the next layer.
+        With `lazy` the next layer is created undecoded and trailing data is
+        kept as a view until it is first read. The next layer is stored in
+        `_payload` directly: decoding reveals the chain, it does not change it,
+        so cached tails and layer indexes stay valid.
+        """
+        raise NotImplementedError
+
+    def _wire_payload(self, raw: memoryview) -> Optional["BaseLayer"]:
+        """The (undecoded) layer after this header, read from the few wire
+        fields that select it. Used while the layer itself is undecoded, so
+        that reaching the next layer does not decode this one; it must raise
+        the same errors _decode() would for a header it cannot get past.
+        """
+        raise NotImplementedError
+
+    def _init_raw(self, raw: bytes, lazy: bool) -> None:
+        """Parse `raw` now, or remember it (a view of it unless it is immutable
+        bytes, which costs nothing to keep) for `lazy` decoding.
+        """
+        self._parsed = True
+        if lazy:
+            self._raw = raw if isinstance(raw, (bytes, memoryview)) else memoryview(raw)
+            self._payload = _UNSET  # decoded on first access, see _undecoded_class
+            self.__class__ = self._undecoded_class
+        else:
+            view = raw if isinstance(raw, memoryview) else memoryview(raw)
+            try:
+                self._decode(view, lazy=False)
+            except Exception as e:
+                if stats.ENABLED:
+                    self._count_parse_error(e)
+                raise
+
+    @classmethod
+    def _parse(cls: Type[T], raw: memoryview, lazy: bool) -> T:
+        """Create the next layer from _decode(). Undecoded lazy layers skip
+        __init__: they only need their wire view (and wired fields unset).
+        """
+        if not lazy:
+            return cls(raw=raw)
+        layer = object.__new__(cls._undecoded_class)
+        layer._raw = raw
+        layer._payload = _UNSET
+        layer._lazy_data = layer._built = layer._tail = layer._index = layer._chain = None
+        layer._parsed = True
+        for name in cls._wired_fields:
+            setattr(layer, name, None)
+        return layer
+
+    def _count_parse_error(self, exc: Exception) -> None:
+        # Enclosing layers see the same exception on its way out; count it once,
+        # for the layer whose bytes were bad
+        if not getattr(exc, "_stats_counted", False):
+            stats.incr(f"parse_error.{self.__class__.__name__}")
+            try:
+                exc._stats_counted = True
+            except AttributeError:
+                pass
+
+    def _set_data(self, view: memoryview, lazy: bool) -> None:
+        if lazy:
+            self._lazy_data = view
+        else:
+            self.data = bytes(view)
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes that are not set yet: trailing data of a
+        # lazily parsed layer, or a name that is not a field of an undecoded one
+        # (fields are properties of the undecoded variant, see __init_subclass__).
+        if name[0] != "_":
+            if self._raw is not None:
+                self._decode_pending()
+                return getattr(self, name)
+            if name == "data" and self._lazy_data is not None:
+                self.data = bytes(self._lazy_data)
+                self._lazy_data = None
+                return self.data
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}")
+
+    def _decode_pending(self) -> None:
+        """Decode a lazy layer. Nothing can have been assigned yet: the
+        undecoded variant decodes before its first field is used. A payload
+        already taken from the wire (see _wire_payload) is kept.
+        """
+        raw, self._raw = self._raw, None
+        payload = self._payload
+        object.__setattr__(self, "__class__", self._decoded_class)
+        try:
+            self._decode(raw if raw.__class__ is memoryview else memoryview(raw), lazy=True)
+        except Exception as e:
+            if stats.ENABLED:
+                self._count_parse_error(e)
+            raise
+        if payload is not _UNSET:
+            self._payload = payload
+
+    def _materialize(self) -> None:
+        """Finish decoding a lazily parsed layer chain (fields, data and payloads)."""
+        layer: Optional[BaseLayer] = self
+        while layer is not None:
+            if layer._raw is not None:
+                layer._decode_pending()
+            if layer._lazy_data is not None:
+                layer.data = bytes(layer._lazy_data)
+                layer._lazy_data = None
+            layer = layer.payload
 
     def build(self) -> bytes:
-        """Convert the layer (including its payload) to bytes."""
+        """Convert the layer (including its payload) to bytes.
+        The result is cached and reused until one of this layer's fields changes
+        or the layers below it serialize differently; since every layer returns
+        its cached bytes object when clean, a change deep in the stack only
+        rebuilds the layers above it.
+        """
+        payload = self._payload_bytes()
+        key = self._build_key()
+        built = self._built
+        if built is not None and built[0] == key:
+            prev = built[1]
+            if prev is payload or prev == payload:
+                return built[2]
+        out = self._build(payload)
+        self._built = (key, payload, out)
+        return out
+
+    def _payload_bytes(self) -> bytes:
+        """Bytes carried after this layer's header (by default the built payload)."""
+        return self.payload.build() if self.payload is not None else b""
+
+    def _build_key(self) -> tuple:
+        """Tuple of the fields `_build` reads; build() is redone when it changes."""
         raise NotImplementedError
 
-    def show(self, indent: int = 0) -> None:
-        """Pretty-print the layer and recursively its payload."""
+    def _build(self, payload: bytes) -> bytes:
+        """Serialize this layer's header in front of `payload`."""
         raise NotImplementedError
 
-    def clone(self: T) -> T:
-        """Deep copy this layer and its payload chain."""
-        return copy.deepcopy(self)
+    def show(self, indent: int = 0, dump: bool = False, build: Optional[bool] = None) -> Optional[str]:
+        """Pretty-print the layer and its payload chain as one string.
+        Fields are rendered as stored: parsed packets show their wire values.
+        The stack is built first only if `build` is set, or by default when it
+        has a layer constructed from fields that was never built (whose
+        lengths and checksums are not known yet).
+        With `dump` the text is returned instead of printed.
+        """
+        if build is None:
+            build = self._has_unbuilt_layer()
+        if build:
+            self.build()
+        lines = []
+        layer: Optional[BaseLayer] = self
+        while layer is not None:
+            pad = "  " * indent
+            lines.append(f"{pad}### {layer.__class__.__name__} ###")
+            for name, value in layer._show_fields():
+                lines.append(f"{pad}  {name}: {value}")
+            layer = layer.payload
+            indent += 1
+        text = "\n".join(lines)
+        if dump:
+            return text
+        print(text)
+        return None
 
-    def __truediv__(self: T, other: "BaseLayer") -> T:
-        """Stack layers like Scapy: append `other` to the tail payload of `self`.
-        Prevent cycles, and do it iteratively to avoid recursion issues.
-        If `other` (or its chain) already exists in `self`'s chain, clone it.
+    def _has_unbuilt_layer(self) -> bool:
+        layer: Optional[BaseLayer] = self
+        while layer is not None:
+            if not layer._parsed and layer._built is None:
+                return True
+            layer = layer.payload
+        return False
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        """(name, formatted value) pairs rendered by show()."""
+        raise NotImplementedError
+
+    def summary(self) -> str:
+        """One-line description of the stack, e.g. "IP 1.2.3.4 > 5.6.7.8 TCP 1234 > 80 S"."""
+        parts = []
+        layer: Optional[BaseLayer] = self
+        while layer is not None:
+            parts.append(layer._summary())
+            layer = layer.payload
+        return " ".join(parts)
+
+    def _summary(self) -> str:
+        """This layer's part of summary()."""
+        return self.__class__.__name__
+
+    def __repr__(self) -> str:
+        return f"<{self.summary()}>"
+
+    def clone(self: T) -> T:
+        """Copy this layer and its payload chain.
+        Each layer copies its own field slots; immutable values (str, int, bytes,
+        cached build output, the wire view of lazy layers) are shared, not copied.
         """
-        if other is self:
-            raise ValueError("Cannot set a layer as its own payload")
-        # Find tail of self and collect visited ids
+        head = new = self._copy()
+        layer = self
+        seen = {id(self)}
+        while True:
+            nxt = layer._payload
+            if nxt is _UNSET:
+                break  # undecoded lazy layer: the copy decodes its own shared view
+            if nxt is None:
+                break
+            if id(nxt) in seen:
+                raise ValueError("Cycle detected in layer chain")
+            seen.add(id(nxt))
+            new._payload = nxt._copy()
+            new = new._payload
+            layer = nxt
+        return head
+
+    def _copy(self: T) -> T:
+        """Shallow copy of this layer's slots (payload link included, chain caches reset)."""
+        cls = self.__class__
+        new = cls.__new__(cls)
+        for member in cls._slot_members:
+            try:
+                member.__set__(new, member.__get__(self, cls))
+            except AttributeError:
+                pass  # not decoded yet
+        new._tail = None
+        new._index = None
+        new._chain = None
+        return new
+
+    def _own_chain(self) -> _Chain:
+        """Root of the chain this layer is part of, started here if none."""
+        chain = self._chain
+        if chain is None:
+            chain = self._chain = _Chain()
+        elif chain.parent is not None:
+            chain = _root(chain)
+        return chain
+
+    def _last(self) -> "BaseLayer":
+        """Last layer of the chain starting here, from the cache when still valid."""
+        cached = self._tail
+        if cached is not None:
+            chain = cached[1]
+            if chain.parent is not None:
+                chain = _root(chain)
+            if chain.version == cached[2]:
+                return cached[0]
         node: BaseLayer = self
+        if node.payload is None:
+            return node  # single layer, nothing worth caching
+        # read before walking: a link changed meanwhile leaves the cache stale
+        chain = self._own_chain()
+        version = chain.version
         visited = {id(node)}
         while node.payload is not None:
             if id(node.payload) in visited:
                 raise ValueError("Cycle detected in layer chain")
             visited.add(id(node.payload))
             node = node.payload
-        # If `other` or any node in its chain is already in `self` chain, clone `other`
-        cur = other
-        needs_clone = id(cur) in visited
-        while cur is not None and not needs_clone:
-            cur = cur.payload
-            if cur is not None and id(cur) in visited:
-                needs_clone = True
-                break
-        if needs_clone:
+            _join(node, chain)
+        self._tail = (node, chain, version)
+        return node
+
+    def __truediv__(self: T, other: "BaseLayer") -> T:
+        """Stack layers like Scapy: append `other` to the tail payload of `self`.
+        Constant time with cached tails (amortized: merging chains is union-find),
+        which stay valid whatever happens to other packets. Two acyclic chains
+        share a layer exactly when they end in the same tail; then `other` is
+        cloned so no cycle forms.
+        """
+        if other is self:
+            raise ValueError("Cannot set a layer as its own payload")
+        tail = self._last()
+        other_tail = other._last()
+        if other_tail is tail:
             other = other.clone()
-        node.payload = other
+            other_tail = other._last()
+        # tail is in self's chain (it is self, or _last() walked it), so
+        # linking it is one version bump there, as in the payload setter
+        tail._payload = other
+        chain = self._chain
+        if chain is None:
+            chain = self._chain = _Chain()
+        elif chain.parent is not None:
+            chain = _root(chain)
+        if other._chain is None:
+            other._chain = chain
+        else:
+            _join(other, chain)  # other._last() put the rest of its chain in with it
+        version = chain.version = next(_VERSIONS)
+        self._tail = (other_tail, chain, version)
         return self
 
-    def get_layer(self, name: str) -> Optional["BaseLayer"]:
+    def _layer_index(self, key: Union[Type["BaseLayer"], str, None] = None,
+                     nb: int = 0) -> Dict[type, List["BaseLayer"]]:
+        """Map each layer class in the stack to its layers, built on lookup
+        and reused until a payload link changes. With `key` the walk stops
+        once `nb` layers match it, so a lookup on a lazily parsed packet
+        decodes no further than the layer it finds; later lookups carry on
+        from there.
+        """
+        cached = self._index
+        if _current(cached):
+            index, chain, version, last, depth = cached
+            if last is None:
+                return index  # complete
+            chain = _root(chain)
+        else:
+            chain = self._own_chain()
+            version = chain.version
+            index, last, depth = {}, self, 1
+            for k in self._index_keys:
+                index.setdefault(k, []).append(self)
+        while key is None or len(_lookup(index, key)) < nb:
+            if last._raw is not None and not last._parses_payload:
+                last = None  # undecoded lazy leaf: no need to decode it to know its payload is None
+                break
+            nxt = last.payload
+            if nxt is None:
+                last = None
+                break
+            depth += 1
+            if depth > _MAX_DEPTH:
+                raise ValueError("Cycle detected in layer chain")
+            _join(nxt, chain)
+            for k in nxt._index_keys:
+                index.setdefault(k, []).append(nxt)
+            last = nxt
+        self._index = (index, chain, version, last, depth)
+        return index
+
+    def getlayer(self, cls: Union[Type["BaseLayer"], str], nb: int = 1) -> Optional["BaseLayer"]:
+        """Return the `nb`-th (1-based) layer of type `cls` (class or class name), or None.
+        Short chains are walked and cache nothing; longer ones are indexed.
+        """
+        if nb < 1:
+            return None
+        if not _current(self._index):
+            layer: Optional[BaseLayer] = self
+            left = nb
+            for _ in range(_WALK_DEPTH):
+                if _matches(layer, cls):
+                    left -= 1
+                    if left == 0:
+                        return layer
+                if layer._raw is not None and not layer._parses_payload:
+                    return None  # undecoded lazy leaf
+                layer = layer.payload
+                if layer is None:
+                    return None
+        layers = _lookup(self._layer_index(cls, nb), cls)
+        return layers[nb - 1] if nb <= len(layers) else None
+
+    def get_layer(self, name: Union[Type["BaseLayer"], str]) -> Optional["BaseLayer"]:
         """Return the first layer in the stack matching class name `name`."""
-        if self.__class__.__name__ == name:
-            return self
-        if self.payload:
-            return self.payload.get_layer(name)
-        return None
\ No newline at end of file
+        return self.getlayer(name)
+
+    def __getitem__(self, cls: Union[Type["BaseLayer"], str]) -> "BaseLayer":
+        layer = self.getlayer(cls)
+        if layer is None:
+            name = cls if isinstance(cls, str) else cls.__name__
+            raise IndexError(f"Layer [{name}] not found")
+        return layer
+
+    def __contains__(self, cls: Union[Type["BaseLayer"], str]) -> bool:
+        return self.getlayer(cls) is not None
+
+    def hashret(self) -> bytes:
+        """Key that a request and its answers share, used by sr() to find
+        candidate replies with one dict lookup; answers() then decides. Each
+        layer adds what is the same in both directions (e.g. IP the XOR of
+        the two addresses) to its payload's key.
+        """
+        payload = self.payload
+        return payload.hashret() if payload is not None else b""
+
+    def answers(self, other: "BaseLayer") -> bool:
+        """True if this packet answers the request `other`. By default a
+        layer answers one of its own type whose payload it answers.
+        """
+        if other._decoded_class is not self._decoded_class:
+            return False
+        return self._payload_answers(other)
+
+    def _payload_answers(self, other: "BaseLayer") -> bool:
+        mine, theirs = self.payload, other.payload
+        if mine is None or theirs is None:
+            return True
+        return mine.answers(theirs)
+
+
+def _matches(layer: BaseLayer, key: Union[Type[BaseLayer], str]) -> bool:
+    """True if `layer` is indexed under `key` (a layer class or class name)."""
+    if isinstance(key, str):
+        return any(k.__name__ == key for k in layer._index_keys)
+    return key in layer._index_keys
+
+
+def _lookup(index: Dict[type, List[BaseLayer]], key: Union[Type[BaseLayer], str]) -> List[BaseLayer]:
+    """Layers of `index` under `key`; class names resolve through __name__."""
+    if isinstance(key, str):
+        for k, layers in index.items():
+            if k.__name__ == key:
+                return layers
+        return []
+    return index.get(key, [])
+
+
+def _wire_payload_property() -> property:
+    def fget(self: BaseLayer):
+        payload = self._payload
+        if payload is not _UNSET:
+            return payload
+        try:
+            raw = self._raw
+            if raw.__class__ is bytes:
+                raw = memoryview(raw)  # the frame itself: slices must not copy
+            payload = self._payload = self._wire_payload(raw)
+        except Exception as e:
+            if stats.ENABLED:
+                self._count_parse_error(e)
+            raise
+        return payload
+
+    def fset(self: BaseLayer, value) -> None:
+        self._decode_pending()
+        self.payload = value
+
+    return property(fget, fset)
+
+
+def _undecoded_property(name: str, offset: int = 0, wire: Optional[struct.Struct] = None) -> property:
+    def fget(self: BaseLayer):
+        if wire is not None and len(self._raw) >= self._min_len:
+            return wire.unpack_from(self._raw, offset)[0]
+        self._decode_pending()  # switches back to the decoded class
+        return self._payload if name == "payload" else getattr(self, name)
+
+    def fset(self: BaseLayer, value) -> None:
+        self._decode_pending()
+        setattr(self, name, value)
+
+    return property(fget, fset)
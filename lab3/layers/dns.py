@@ -1,81 +1,369 @@
 from __future__ import annotations
 
+import random
+import socket
 import struct
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 from .base import BaseLayer
 
+_DNS_HDR = struct.Struct("!HHHHHH")
+_QUESTION = struct.Struct("!HH")
+_RR_HDR = struct.Struct("!HHIH")
+_U16 = struct.Struct("!H")
+_SOA_TAIL = struct.Struct("!IIIII")
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_PTR = 12
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPE_AAAA = 28
+CLASS_IN = 1
+
+TYPE_NAMES = {TYPE_A: "A", TYPE_NS: "NS", TYPE_CNAME: "CNAME", TYPE_SOA: "SOA", TYPE_PTR: "PTR",
+              TYPE_MX: "MX", TYPE_TXT: "TXT", TYPE_AAAA: "AAAA"}
+
+_MAX_POINTER_JUMPS = 64  # far more than any sane message needs; stops pointer loops
+_MAX_NAME_LEN = 255
+
+
+class DNSQuestion(NamedTuple):
+    qname: str
+    qtype: int = TYPE_A
+    qclass: int = CLASS_IN
+
+
+class MX(NamedTuple):
+    preference: int
+    exchange: str
+
+
+class SOA(NamedTuple):
+    mname: str
+    rname: str
+    serial: int
+    refresh: int
+    retry: int
+    expire: int
+    minimum: int
+
+
+class DNSRR(NamedTuple):
+    """Resource record. `rdata` is typed by `type`: str for A/AAAA/CNAME/NS/PTR,
+    MX and SOA tuples, a tuple of bytes strings for TXT, raw bytes otherwise.
+    """
+    name: str
+    type: int
+    rdata: Union[str, MX, SOA, Tuple[bytes, ...], bytes]
+    ttl: int = 0
+    rclass: int = CLASS_IN
+
+
+@lru_cache(maxsize=2048)
+def _name_labels(name: str) -> Tuple[Tuple[str, bytes], ...]:
+    """Split `name` into (suffix, length-prefixed label) pairs.
+    Cached because query generators encode the same names over and over.
+    """
+    name = name.rstrip(".")
+    if not name:
+        return ()
+    labels = name.split(".")
+    out = []
+    for i, label in enumerate(labels):
+        b = label.encode()
+        if not 0 < len(b) < 64:
+            raise ValueError(f"Invalid DNS label in {name!r}")
+        out.append((".".join(labels[i:]), bytes([len(b)]) + b))
+    if sum(len(label) for _, label in out) + 1 > _MAX_NAME_LEN:
+        raise ValueError(f"DNS name too long: {name!r}")
+    return tuple(out)
+
+
+@lru_cache(maxsize=2048)
+def encode_name(name: str) -> bytes:
+    """Uncompressed wire encoding of `name` (cached)."""
+    return b"".join(label for _, label in _name_labels(name)) + b"\x00"
+
+
+def _write_name(out: bytearray, name: str, table: Dict[str, int]) -> None:
+    """Append `name` to `out`, pointing at an earlier copy of its longest known suffix.
+    Suffixes match with their case: a pointer decodes to the bytes it points
+    at, so "WWW.Example.com" must not point at "www.example.com".
+    """
+    for suffix, label in _name_labels(name):
+        ptr = table.get(suffix)
+        if ptr is not None:
+            out += _U16.pack(0xC000 | ptr)
+            return
+        if len(out) < 0x4000:  # pointers have 14 bits
+            table[suffix] = len(out)
+        out += label
+    out.append(0)
+
+
+def decode_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a possibly compressed name at `offset`; return it and the offset after it."""
+    labels = []
+    pos = offset
+    end = None  # where parsing resumes after the first pointer
+    jumps = 0
+    length = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("DNS name runs past end of message")
+        l = data[pos]
+        if l & 0xC0 == 0xC0:
+            if pos + 1 >= len(data):
+                raise ValueError("DNS name pointer truncated")
+            ptr = ((l & 0x3F) << 8) | data[pos + 1]
+            jumps += 1
+            if ptr >= pos or jumps > _MAX_POINTER_JUMPS:
+                raise ValueError("DNS name compression loop")
+            if end is None:
+                end = pos + 2
+            pos = ptr
+        elif l & 0xC0:
+            raise ValueError(f"Unsupported DNS label type 0x{l & 0xC0:02x}")
+        elif l == 0:
+            pos += 1
+            break
+        else:
+            length += l + 1
+            if length > _MAX_NAME_LEN or pos + 1 + l > len(data):
+                raise ValueError("Malformed DNS name")
+            labels.append(data[pos + 1:pos + 1 + l].decode("utf-8", "replace"))
+            pos += 1 + l
+    return ".".join(labels), (end if end is not None else pos)
+
+
+def _decode_rdata(data: bytes, off: int, rdlen: int, rtype: int):
+    rdata = data[off:off + rdlen]
+    if rtype == TYPE_A and rdlen == 4:
+        return socket.inet_ntoa(rdata)
+    if rtype == TYPE_AAAA and rdlen == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rtype in (TYPE_CNAME, TYPE_NS, TYPE_PTR):
+        return decode_name(data, off)[0]
+    if rtype == TYPE_MX and rdlen >= 3:
+        return MX(_U16.unpack_from(data, off)[0], decode_name(data, off + 2)[0])
+    if rtype == TYPE_TXT:
+        strings = []
+        i = 0
+        while i < rdlen:
+            strings.append(rdata[i + 1:i + 1 + rdata[i]])
+            i += 1 + rdata[i]
+        return tuple(strings)
+    if rtype == TYPE_SOA:
+        mname, pos = decode_name(data, off)
+        rname, pos = decode_name(data, pos)
+        if pos + _SOA_TAIL.size > off + rdlen:
+            raise ValueError("DNS SOA record truncated")
+        return SOA(mname, rname, *_SOA_TAIL.unpack_from(data, pos))
+    return rdata
+
+
+def _write_rdata(out: bytearray, rr: DNSRR, table: Dict[str, int]) -> None:
+    rtype, rdata = rr.type, rr.rdata
+    if isinstance(rdata, bytes):
+        out += rdata
+    elif rtype == TYPE_A:
+        out += socket.inet_aton(rdata)
+    elif rtype == TYPE_AAAA:
+        out += socket.inet_pton(socket.AF_INET6, rdata)
+    elif rtype in (TYPE_CNAME, TYPE_NS, TYPE_PTR):
+        _write_name(out, rdata, table)
+    elif rtype == TYPE_MX:
+        out += _U16.pack(rdata.preference)
+        _write_name(out, rdata.exchange, table)
+    elif rtype == TYPE_TXT:
+        for s in rdata:
+            s = s.encode() if isinstance(s, str) else s
+            out.append(len(s))
+            out += s
+    elif rtype == TYPE_SOA:
+        _write_name(out, rdata.mname, table)
+        _write_name(out, rdata.rname, table)
+        out += _SOA_TAIL.pack(rdata.serial, rdata.refresh, rdata.retry, rdata.expire, rdata.minimum)
+    else:
+        raise ValueError(f"Cannot encode rdata {rdata!r} for DNS type {rtype}")
+
 
 class DNS(BaseLayer):
-    def __init__(self, qname: Optional[str] = None, qtype: int = 1, qclass: int = 1,
-                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None):
+    __slots__ = ("id", "flags", "questions", "an", "ns", "ar")
+    _parses_payload = False
+    _field_layout = {"id": (0, "!H"), "flags": (2, "!H")}
+
+    def __init__(self, qname: Optional[str] = None, qtype: int = TYPE_A, qclass: int = CLASS_IN,
+                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None,
+                 lazy: bool = False, id: Optional[int] = None, flags: int = 0x0100,
+                 questions: Optional[Sequence[DNSQuestion]] = None,
+                 an: Sequence[DNSRR] = (), ns: Sequence[DNSRR] = (), ar: Sequence[DNSRR] = ()):
         super().__init__(payload=payload)
         if raw is not None:
-            self._parse(raw)
+            self._init_raw(raw, lazy)
+        else:
+            # default: random, so that concurrent queries for the same name
+            # (sr_many, async_sr) are told apart by answers()
+            self.id = random.getrandbits(16) if id is None else id
+            self.flags = flags  # default: RD set
+            if questions is None:
+                questions = [DNSQuestion(qname or "", qtype, qclass)]
+            self.questions: List[DNSQuestion] = [DNSQuestion(*q) for q in questions]
+            self.an: List[DNSRR] = list(an)
+            self.ns: List[DNSRR] = list(ns)
+            self.ar: List[DNSRR] = list(ar)
+
+    def _copy(self) -> "DNS":
+        new = super()._copy()
+        if self._raw is None:  # decoded: record lists are the only mutable fields
+            new.questions = list(self.questions)
+            new.an = list(self.an)
+            new.ns = list(self.ns)
+            new.ar = list(self.ar)
+        return new
+
+    def hashret(self) -> bytes:
+        # The id is checked in answers() only: an ICMP error may quote just
+        # the UDP header, and the key must match for those too
+        return b""
+
+    def answers(self, other: BaseLayer) -> bool:
+        if not isinstance(other, DNS) or not self.flags & 0x8000 or self.id != other.id:
+            return False
+        if self.questions and other.questions:
+            return self.questions[0].qname.lower() == other.questions[0].qname.lower()
+        return True
+
+    # First-question shortcuts (the common single-question query)
+    @property
+    def qname(self) -> str:
+        return self.questions[0].qname if self.questions else ""
+
+    @qname.setter
+    def qname(self, value: str) -> None:
+        self._set_question(qname=value)
+
+    @property
+    def qtype(self) -> int:
+        return self.questions[0].qtype if self.questions else 0
+
+    @qtype.setter
+    def qtype(self, value: int) -> None:
+        self._set_question(qtype=value)
+
+    @property
+    def qclass(self) -> int:
+        return self.questions[0].qclass if self.questions else 0
+
+    @qclass.setter
+    def qclass(self, value: int) -> None:
+        self._set_question(qclass=value)
+
+    def _set_question(self, **fields) -> None:
+        if self.questions:
+            self.questions[0] = self.questions[0]._replace(**fields)
         else:
-            self.id = 0
-            self.flags = 0x0100  # RD set
-            self.qdcount = 1
-            self.ancount = 0
-            self.nscount = 0
-            self.arcount = 0
-            self.qname = qname or ""
-            self.qtype = qtype
-            self.qclass = qclass
-            self.addr = None
-
-    def _encode_qname(self, name: str) -> bytes:
-        out = b""
-        for label in name.split('.'):
-            out += bytes([len(label)]) + label.encode()
-        return out + b"\x00"
-
-    def _decode_qname(self, data: bytes, offset: int) -> Tuple[str, int]:
-        labels = []
-        i = offset
-        while i < len(data):
-            l = data[i]
-            if l == 0:
-                i += 1
-                break
-            # handle simple labels only (no compression for this lab parse)
-            labels.append(data[i + 1:i + 1 + l].decode())
-            i += 1 + l
-        return ".".join(labels), i
-
-    def _parse(self, raw: bytes) -> None:
+            self.questions.append(DNSQuestion(**{"qname": "", **fields}))
+
+    @property
+    def qdcount(self) -> int:
+        return len(self.questions)
+
+    @property
+    def ancount(self) -> int:
+        return len(self.an)
+
+    @property
+    def nscount(self) -> int:
+        return len(self.ns)
+
+    @property
+    def arcount(self) -> int:
+        return len(self.ar)
+
+    @property
+    def addr(self) -> Optional[str]:
+        """Address of the first A record among the answers, if any."""
+        for rr in self.an:
+            if rr.type == TYPE_A and rr.rclass == CLASS_IN:
+                return rr.rdata
+        return None
+
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
         if len(raw) < 12:
             raise ValueError("DNS too short")
-        self.id, self.flags, self.qdcount, self.ancount, self.nscount, self.arcount = struct.unpack("!HHHHHH", raw[:12])
+        raw = bytes(raw)  # small; names are decoded from bytes slices
+        self._payload = None
+        self.id, self.flags, qdcount, ancount, nscount, arcount = _DNS_HDR.unpack_from(raw)
         off = 12
-        # Question
-        self.qname, off = self._decode_qname(raw, off)
-        self.qtype, self.qclass = struct.unpack("!HH", raw[off:off + 4])
-        off += 4
-        # Answers (only decode first A RR if present)
-        self.addr = None
-        for _ in range(self.ancount):
-            # name may be a pointer; skip by reading 2 bytes and checking pointer bit
-            name_ptr = raw[off:off + 2]
-            off += 2
-            rtype, rclass, ttl, rdlength = struct.unpack("!HHIH", raw[off:off + 10])
-            off += 10
-            rdata = raw[off:off + rdlength]
+        self.questions = []
+        for _ in range(qdcount):
+            qname, off = decode_name(raw, off)
+            if off + 4 > len(raw):
+                raise ValueError("DNS question truncated")
+            self.questions.append(DNSQuestion(qname, *_QUESTION.unpack_from(raw, off)))
+            off += 4
+        self.an, off = self._decode_rrs(raw, off, ancount)
+        self.ns, off = self._decode_rrs(raw, off, nscount)
+        self.ar, off = self._decode_rrs(raw, off, arcount)
+
+    @staticmethod
+    def _decode_rrs(raw: bytes, off: int, count: int) -> Tuple[List[DNSRR], int]:
+        rrs = []
+        for _ in range(count):
+            name, off = decode_name(raw, off)
+            if off + _RR_HDR.size > len(raw):
+                raise ValueError("DNS resource record truncated")
+            rtype, rclass, ttl, rdlength = _RR_HDR.unpack_from(raw, off)
+            off += _RR_HDR.size
+            if off + rdlength > len(raw):
+                raise ValueError("DNS rdata truncated")
+            rrs.append(DNSRR(name, rtype, _decode_rdata(raw, off, rdlength, rtype), ttl, rclass))
             off += rdlength
-            if rtype == 1 and rclass == 1 and rdlength == 4:
-                self.addr = f"{rdata[0]}.{rdata[1]}.{rdata[2]}.{rdata[3]}"
-                break
-
-    def build(self) -> bytes:
-        header = struct.pack("!HHHHHH", 0x030C, 0x0100, 1, 0, 0, 0)  # id random-ish, RD=1
-        q = self._encode_qname(self.qname) + struct.pack("!HH", self.qtype, self.qclass)
-        return header + q
-
-    def show(self, indent: int = 0) -> None:
-        pad = "  " * indent
-        print(f"{pad}### DNS ###")
-        if hasattr(self, "id"):
-            print(f"{pad}  id: {self.id:04x}")
-        print(f"{pad}  qname: {getattr(self, 'qname', '')}")
-        if getattr(self, "addr", None):
-            print(f"{pad}  addr: {self.addr}")
\ No newline at end of file
+        return rrs, off
+
+    def _payload_bytes(self) -> bytes:
+        return b""
+
+    def _build_key(self) -> tuple:
+        return (self.id, self.flags, tuple(self.questions), tuple(self.an), tuple(self.ns), tuple(self.ar))
+
+    def _build(self, payload: bytes) -> bytes:
+        header = _DNS_HDR.pack(self.id, self.flags, len(self.questions), len(self.an), len(self.ns), len(self.ar))
+        if len(self.questions) == 1 and not (self.an or self.ns or self.ar):
+            # Plain query: nothing to compress against, reuse the cached encoding
+            q = self.questions[0]
+            return header + encode_name(q.qname) + _QUESTION.pack(q.qtype, q.qclass)
+        out = bytearray(header)
+        table: Dict[str, int] = {}
+        for q in self.questions:
+            _write_name(out, q.qname, table)
+            out += _QUESTION.pack(q.qtype, q.qclass)
+        for rr in (*self.an, *self.ns, *self.ar):
+            _write_name(out, rr.name, table)
+            rd_start = len(out) + _RR_HDR.size
+            out += _RR_HDR.pack(rr.type, rr.rclass, rr.ttl, 0)
+            _write_rdata(out, rr, table)
+            _U16.pack_into(out, rd_start - 2, len(out) - rd_start)
+        return bytes(out)
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        fields: List[Tuple[str, object]] = [("id", f"{self.id:04x}"), ("flags", f"{self.flags:04x}")]
+        for q in self.questions:
+            fields.append(("qname", f"{q.qname} ({TYPE_NAMES.get(q.qtype, q.qtype)})"))
+        for section, rrs in (("an", self.an), ("ns", self.ns), ("ar", self.ar)):
+            for rr in rrs:
+                fields.append((section, f"{rr.name} {TYPE_NAMES.get(rr.type, rr.type)} ttl={rr.ttl} {rr.rdata}"))
+        if self.addr:
+            fields.append(("addr", self.addr))
+        return fields
+
+    def _summary(self) -> str:
+        if self.flags & 0x8000:  # QR: response
+            answer = f" {self.an[0].rdata}" if self.an else ""
+            return f"DNS Ans {self.qname}{answer}"
+        return f"DNS Qry {self.qname}"
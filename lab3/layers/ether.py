@@ -1,35 +1,30 @@
 from __future__ import annotations
 
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from utils import bytes_to_mac, mac_to_bytes
 
 from .base import BaseLayer
+from .ip import IP
 
 ETH_P_IP = 0x0800
 
+_ETH_HDR = struct.Struct("!6s6sH")
+_U16 = struct.Struct("!H")
+
 
 class Ether(BaseLayer):
+    __slots__ = ("src_mac", "dst_mac", "type")
+    _field_layout = {"dst_mac": (0, "!6s"), "src_mac": (6, "!6s"), "type": (12, "!H")}
+    _min_len = _ETH_HDR.size
+
     def __init__(self, src_mac: Optional[str] = None, dst_mac: Optional[str] = None,
-                 eth_type: int = ETH_P_IP, raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None):
+                 eth_type: int = ETH_P_IP, raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None,
+                 lazy: bool = False):
         super().__init__(payload=payload)
         if raw is not None:
-            # Parse Ethernet header (14 bytes)
-            if len(raw) < 14:
-                raise ValueError("Ether frame too short")
-            dst_b, src_b, etype = struct.unpack("!6s6sH", raw[:14])
-            self.dst_mac = bytes_to_mac(dst_b)
-            self.src_mac = bytes_to_mac(src_b)
-            self.type = etype
-            # Only handle IPv4 payload for this lab
-            rest = raw[14:]
-            if self.type == ETH_P_IP and rest:
-                from .ip import IP
-                parsed = IP(raw=rest)
-                self.payload = parsed
-            else:
-                self.payload = None
+            self._init_raw(raw, lazy)
         else:
             if src_mac is None or dst_mac is None:
                 raise ValueError("src_mac and dst_mac are required when not parsing raw bytes")
@@ -37,18 +32,38 @@ class Ether(BaseLayer):
             self.dst_mac = dst_mac
             self.type = eth_type
 
-    def build(self) -> bytes:
-        dst_b = mac_to_bytes(self.dst_mac)
-        src_b = mac_to_bytes(self.src_mac)
-        header = struct.pack("!6s6sH", dst_b, src_b, self.type)
-        payload_bytes = self.payload.build() if self.payload else b""
-        return header + payload_bytes
-
-    def show(self, indent: int = 0) -> None:
-        pad = "  " * indent
-        print(f"{pad}### Ether ###")
-        print(f"{pad}  dst_mac: {self.dst_mac}")
-        print(f"{pad}  src_mac: {self.src_mac}")
-        print(f"{pad}  type: {self.type:04x}")
-        if self.payload:
-            self.payload.show(indent + 1)        
\ No newline at end of file
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
+        # Parse Ethernet header (14 bytes)
+        if len(raw) < 14:
+            raise ValueError("Ether frame too short")
+        dst_b, src_b, etype = _ETH_HDR.unpack_from(raw)
+        self.dst_mac = bytes_to_mac(dst_b)
+        self.src_mac = bytes_to_mac(src_b)
+        self.type = etype
+        # Only handle IPv4 payload for this lab
+        rest = raw[14:]
+        if self.type == ETH_P_IP and rest:
+            self._payload = IP._parse(rest, lazy)
+        else:
+            self._payload = None
+
+    def _wire_payload(self, raw: memoryview) -> Optional[BaseLayer]:
+        if len(raw) < 14:
+            raise ValueError("Ether frame too short")
+        if _U16.unpack_from(raw, 12)[0] == ETH_P_IP and len(raw) > 14:
+            return IP._parse(raw[14:], True)
+        return None
+
+    def _build_key(self) -> tuple:
+        return (self.dst_mac, self.src_mac, self.type)
+
+    def _build(self, payload: bytes) -> bytes:
+        return _ETH_HDR.pack(mac_to_bytes(self.dst_mac), mac_to_bytes(self.src_mac), self.type) + payload
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        return [("dst_mac", self.dst_mac), ("src_mac", self.src_mac), ("type", f"{self.type:04x}")]
+
+    def _summary(self) -> str:
+        if self.type == ETH_P_IP and self.payload is not None:
+            return f"Ether {self.src_mac} > {self.dst_mac}"
+        return f"Ether {self.src_mac} > {self.dst_mac} type=0x{self.type:04x}"
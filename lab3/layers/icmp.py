@@ -1,22 +1,39 @@
 from __future__ import annotations
 
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from utils import checksum_ones_complement
 
 from .base import BaseLayer
 
+_ICMP_HDR = struct.Struct("!BBHHH")
+
+ICMP_TYPE_NAMES = {0: "echo-reply", 3: "dest-unreach", 5: "redirect", 8: "echo-request", 11: "time-exceeded"}
+
+# Errors carry the IP header and leading bytes of the packet that caused them
+ICMP_ERROR_TYPES = (3, 4, 5, 11, 12)
+# reply type -> request type (echo, timestamp, information, address mask)
+ICMP_REPLY_TO = {0: 8, 14: 13, 16: 15, 18: 17}
+_QUOTE_L4_MIN = 20  # enough for any L4 header we decode
+
 
 class ICMP(BaseLayer):
+    __slots__ = ("type", "code", "checksum", "id", "seq", "data", "src_ip", "dst_ip")
+    _parses_payload = False
+    _wired_fields = ("src_ip", "dst_ip")
+    _field_layout = {"type": (0, "!B"), "code": (1, "!B"), "id": (4, "!H"), "seq": (6, "!H")}
+    _min_len = _ICMP_HDR.size
+    _csum_offset = 2
+
     def __init__(self, type: int = 8, code: int = 0, id: int = 0, seq: int = 0,
-                 data: bytes = b"", raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None):
+                 data: bytes = b"", raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None,
+                 lazy: bool = False):
         super().__init__(payload=payload)
+        self.src_ip: Optional[str] = None  # wired when parsed under IP
+        self.dst_ip: Optional[str] = None
         if raw is not None:
-            if len(raw) < 8:  # Standard Echo header is 8 bytes including checksum
-                raise ValueError("ICMP packet too short")
-            self.type, self.code, self.checksum, self.id, self.seq = struct.unpack("!BBHHH", raw[:8])
-            self.data = raw[8:]
+            self._init_raw(raw, lazy)
         else:
             self.type = type
             self.code = code
@@ -25,22 +42,74 @@ class ICMP(BaseLayer):
             self.data = data
             self.checksum = 0
 
-    def build(self) -> bytes:
-        header_wo_csum = struct.pack("!BBHHH", self.type, self.code, 0, self.id, self.seq)
-        csum = checksum_ones_complement(header_wo_csum + self.data)
-        self.checksum = csum
-        header = struct.pack("!BBHHH", self.type, self.code, self.checksum, self.id, self.seq)
-        return header + self.data
-
-    def show(self, indent: int = 0) -> None:
-        pad = "  " * indent
-        print(f"{pad}### ICMP ###")
-        print(f"{pad}  type: {self.type}")
-        print(f"{pad}  code: {self.code}")
-        print(f"{pad}  checksum: {self.checksum:04x}")
-        print(f"{pad}  id: {self.id}")
-        print(f"{pad}  seq: {self.seq}")
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
+        if len(raw) < 8:  # Standard Echo header is 8 bytes including checksum
+            raise ValueError("ICMP packet too short")
+        self.type, self.code, self.checksum, self.id, self.seq = _ICMP_HDR.unpack_from(raw)
+        self._payload = None
+        self._set_data(raw[8:], lazy)
+
+    def _payload_bytes(self) -> bytes:
+        return self.data
+
+    def _build_key(self) -> tuple:
+        return (self.type, self.code, self.id, self.seq)
+
+    def _build(self, data: bytes) -> bytes:
+        # Header words summed directly (checksum field counts as zero)
+        header_sum = ((self.type << 8) | self.code) + self.id + self.seq
+        self.checksum = checksum_ones_complement(data, header_sum)
+        return _ICMP_HDR.pack(self.type, self.code, self.checksum, self.id, self.seq) + data
+
+    def quoted(self):
+        """The packet quoted by an ICMP error, as an IP stack, or None (also
+        when the quote does not decode). Quotes are usually cut after 8 bytes
+        of L4 header, so the quote is zero-padded to decode; fields past the
+        quoted bytes read as 0.
+        """
+        if self.type not in ICMP_ERROR_TYPES:
+            return None
+        from .ip import IP
+        data = bytes(self.data)
+        if len(data) < 20:
+            return None
+        hdr_len = (data[0] & 0x0F) * 4
+        if len(data) < hdr_len + _QUOTE_L4_MIN:
+            data += bytes(hdr_len + _QUOTE_L4_MIN - len(data))
+        try:
+            # decoded now (it is a few dozen bytes), so a malformed quote is
+            # None here instead of an error later in hashret() or answers()
+            return IP(raw=data)
+        except ValueError:
+            return None
+
+    def hashret(self) -> bytes:
+        if self.type in ICMP_REPLY_TO or self.type in ICMP_REPLY_TO.values():
+            return _ICMP_HDR.pack(0, 0, 0, self.id, self.seq)[4:]
+        return b""
+
+    def answers(self, other: BaseLayer) -> bool:
+        if not isinstance(other, ICMP):
+            return False
+        return (ICMP_REPLY_TO.get(self.type) == other.type and self.id == other.id
+                and self.seq == other.seq)
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        fields = [
+            ("type", self.type),
+            ("code", self.code),
+            ("checksum", f"{self.checksum:04x}"),
+            ("id", self.id),
+            ("seq", self.seq),
+        ]
         if self.data:
-            print(f"{pad}  data: {self.data.hex()}")
-        if self.payload:
-            self.payload.show(indent + 1) 
\ No newline at end of file
+            fields.append(("data", self.data.hex()))
+        return fields
+
+    def _summary(self) -> str:
+        name = ICMP_TYPE_NAMES.get(self.type)
+        if name is None:
+            return f"ICMP type={self.type} code={self.code}"
+        if self.type in (0, 8):
+            return f"ICMP {name} id={self.id} seq={self.seq}"
+        return f"ICMP {name} code={self.code}"
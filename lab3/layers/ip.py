@@ -2,35 +2,61 @@ from __future__ import annotations
 
 import socket
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from utils import bytes_to_ip, checksum_ones_complement, ip_to_bytes
 
 from .base import BaseLayer
+from .icmp import ICMP, ICMP_ERROR_TYPES
+from .tcp import TCP
+from .udp import UDP
 
 PROTO_ICMP = 1
 PROTO_TCP = 6
 PROTO_UDP = 17
 
+_IP_HDR = struct.Struct("!BBHHHBBH4s4s")
+_U16 = struct.Struct("!H")
+# IHL, total length, proto and the addresses: what _wire_payload() reads
+_IP_WIRE = struct.Struct("!BxH5xB2x4s4s")
+_L4 = {PROTO_ICMP: ICMP, PROTO_TCP: TCP, PROTO_UDP: UDP}
+
 
 class IP(BaseLayer):
+    __slots__ = ("version", "ihl", "tos", "ident", "flags_frag", "ttl", "proto", "src_ip", "dst_ip",
+                 "total_len", "checksum")
+    _field_layout = {"tos": (1, "!B"), "total_len": (2, "!H"), "ident": (4, "!H"), "flags_frag": (6, "!H"),
+                     "ttl": (8, "!B"), "proto": (9, "!B"), "src_ip": (12, "!4s"), "dst_ip": (16, "!4s")}
+    _min_len = _IP_HDR.size
+    _csum_offset = 10
+
     def __init__(self,
                  src_ip: Optional[str] = None,
                  dst_ip: Optional[str] = None,
                  ttl: int = 64,
                  proto: Optional[int] = None,
                  raw: Optional[bytes] = None,
-                 payload: Optional[BaseLayer] = None):
+                 payload: Optional[BaseLayer] = None,
+                 lazy: bool = False,
+                 tos: int = 0,
+                 ident: int = 0,
+                 flags_frag: int = 0):
         super().__init__(payload=payload)
-        self.version = 4
-        self.ihl = 5  # 20-byte header, no options
         if raw is not None:
-            self._parse(raw)
+            self._init_raw(raw, lazy)
         else:
+            self.version = 4
+            self.ihl = 5  # 20-byte header, no options
             self.src_ip = src_ip or "0.0.0.0"
             self.dst_ip = dst_ip or "0.0.0.0"
             self.ttl = ttl
             self.proto = proto if proto is not None else 0
+            self.tos = tos
+            self.ident = ident
+            self.flags_frag = flags_frag
+            # set by build(), or from the wire when parsed
+            self.total_len: Optional[int] = None
+            self.checksum: Optional[int] = None
 
     # Operator overloading to wire L4 IPs for checksum
     def __truediv__(self, other: BaseLayer) -> "IP":
@@ -38,48 +64,79 @@ class IP(BaseLayer):
         # If payload is TCP/UDP, set src/dst on it for pseudo-header checksums
         lname = other.__class__.__name__
         if lname in ("TCP", "UDP"):
-            try:
-                setattr(other, "src_ip", self.src_ip)
-                setattr(other, "dst_ip", self.dst_ip)
-            except Exception:
-                pass
+            other.src_ip = self.src_ip
+            other.dst_ip = self.dst_ip
         return res
 
-    def _parse(self, raw: bytes) -> None:
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
         if len(raw) < 20:
             raise ValueError("IP packet too short")
-        v_ihl, tos, total_len, ident, flags_frag, ttl, proto, chksum, src, dst = struct.unpack(
-            "!BBHHHBBH4s4s", raw[:20]
-        )
+        v_ihl, tos, total_len, ident, flags_frag, ttl, proto, chksum, src, dst = _IP_HDR.unpack_from(raw)
         self.version = v_ihl >> 4
         self.ihl = v_ihl & 0x0F
         hdr_len = self.ihl * 4
         if len(raw) < hdr_len:
             raise ValueError("IP header length exceeds provided data")
+        self.tos = tos
+        self.total_len = total_len
+        self.ident = ident
+        self.flags_frag = flags_frag
         self.ttl = ttl
         self.proto = proto
+        self.checksum = chksum
         self.src_ip = bytes_to_ip(src)
         self.dst_ip = bytes_to_ip(dst)
         payload_bytes = raw[hdr_len:total_len if total_len else None]
         # Parse next layer
-        if self.proto == PROTO_ICMP and payload_bytes:
-            from .icmp import ICMP
-            self.payload = ICMP(raw=payload_bytes)
-            # also wire IPs into L4 for convenience
-            setattr(self.payload, "src_ip", self.src_ip)
-            setattr(self.payload, "dst_ip", self.dst_ip)
-        elif self.proto == PROTO_TCP and payload_bytes:
-            from .tcp import TCP
-            self.payload = TCP(raw=payload_bytes)
-            setattr(self.payload, "src_ip", self.src_ip)
-            setattr(self.payload, "dst_ip", self.dst_ip)
-        elif self.proto == PROTO_UDP and payload_bytes:
-            from .udp import UDP
-            self.payload = UDP(raw=payload_bytes)
-            setattr(self.payload, "src_ip", self.src_ip)
-            setattr(self.payload, "dst_ip", self.dst_ip)
-        else:
-            self.payload = None
+        l4_class = _L4.get(proto)
+        if l4_class is None or not payload_bytes:
+            self._payload = None
+            return
+        self._payload = l4 = l4_class._parse(payload_bytes, lazy)
+        # also wire IPs into L4 for convenience
+        l4.src_ip = self.src_ip
+        l4.dst_ip = self.dst_ip
+
+    def _wire_payload(self, raw: memoryview) -> Optional[BaseLayer]:
+        # IHL, total length and proto pick the next layer; the addresses are
+        # wired into it as _decode() does
+        if len(raw) < 20:
+            raise ValueError("IP packet too short")
+        v_ihl, total_len, proto, src, dst = _IP_WIRE.unpack_from(raw)
+        hdr_len = (v_ihl & 0x0F) * 4
+        if len(raw) < hdr_len:
+            raise ValueError("IP header length exceeds provided data")
+        payload_bytes = raw[hdr_len:total_len if total_len else None]
+        l4_class = _L4.get(proto)
+        if l4_class is None or not payload_bytes:
+            return None
+        l4 = l4_class._parse(payload_bytes, True)
+        l4.src_ip = bytes_to_ip(src)
+        l4.dst_ip = bytes_to_ip(dst)
+        return l4
+
+    def hashret(self) -> bytes:
+        l4 = self.payload
+        if isinstance(l4, ICMP) and l4.type in ICMP_ERROR_TYPES:
+            quoted = l4.quoted()
+            if quoted is not None:
+                return quoted.hashret()  # same key as the packet that caused the error
+        self._infer_proto()
+        addrs = int.from_bytes(ip_to_bytes(self.src_ip), "big") ^ int.from_bytes(ip_to_bytes(self.dst_ip), "big")
+        return addrs.to_bytes(4, "big") + bytes((self.proto,)) + (l4.hashret() if l4 is not None else b"")
+
+    def answers(self, other: BaseLayer) -> bool:
+        if not isinstance(other, IP):
+            return False
+        l4 = self.payload
+        if isinstance(l4, ICMP) and l4.type in ICMP_ERROR_TYPES:
+            quoted = l4.quoted()
+            return (quoted is not None and quoted.src_ip == other.src_ip
+                    and quoted.dst_ip == other.dst_ip and quoted.hashret() == other.hashret())
+        other._infer_proto()
+        if self.dst_ip != other.src_ip or self.proto != other.proto:
+            return False
+        return self._payload_answers(other)
 
     def _infer_proto(self):
         """Infer protocol number from payload if not set"""
@@ -103,75 +160,50 @@ class IP(BaseLayer):
         if self.payload is not None:
             lname = self.payload.__class__.__name__
             if lname in ("TCP", "UDP"):
-                try:
-                    setattr(self.payload, "src_ip", self.src_ip)
-                    setattr(self.payload, "dst_ip", self.dst_ip)
-                except Exception:
-                    pass
-        payload_bytes = self.payload.build() if self.payload else b""
-        v_ihl = (self.version << 4) | self.ihl
-        total_len = 20 + len(payload_bytes)
-        header_wo_csum = struct.pack(
-            "!BBHHHBBH4s4s",
-            v_ihl,
-            0,  # TOS
-            total_len,
-            0,  # Identification
-            0,  # Flags/Frag
+                self.payload.src_ip = self.src_ip
+                self.payload.dst_ip = self.dst_ip
+        return super().build()
+
+    def _build_key(self) -> tuple:
+        return (self.version, self.ihl, self.tos, self.ident, self.flags_frag, self.ttl, self.proto,
+                self.src_ip, self.dst_ip)
+
+    def _build(self, payload: bytes) -> bytes:
+        self.total_len = 20 + len(payload)
+        header = bytearray(_IP_HDR.pack(
+            (self.version << 4) | self.ihl,
+            self.tos,
+            self.total_len,
+            self.ident,
+            self.flags_frag,
             self.ttl,
             self.proto,
             0,  # checksum placeholder
             ip_to_bytes(self.src_ip),
             ip_to_bytes(self.dst_ip),
-        )
-        csum = checksum_ones_complement(header_wo_csum)
-        header = struct.pack(
-            "!BBHHHBBH4s4s",
-            v_ihl,
-            0,
-            total_len,
-            0,
-            0,
-            self.ttl,
-            self.proto,
-            csum,
-            ip_to_bytes(self.src_ip),
-            ip_to_bytes(self.dst_ip),
-        )
-        return header + payload_bytes
+        ))
+        self.checksum = checksum_ones_complement(header)
+        _U16.pack_into(header, 10, self.checksum)
+        return bytes(header) + payload
 
-    def show(self, indent: int = 0) -> None:
+    def _show_fields(self) -> List[Tuple[str, object]]:
         # Infer proto before showing
         self._infer_proto()
-        
-        pad = "  " * indent
-        print(f"{pad}### IP ###")
-        print(f"{pad}  version: {self.version}")
-        print(f"{pad}  ihl: {self.ihl}")
-        print(f"{pad}  tos: 0")
-        # total_len only known on build; recompute from payload length for display
-        total_len = 20 + (len(self.payload.build()) if self.payload else 0)
-        print(f"{pad}  total_len: {total_len}")
-        print(f"{pad}  ident: 0")
-        print(f"{pad}  flags_frag: 0")
-        print(f"{pad}  ttl: {self.ttl}")
-        print(f"{pad}  proto: {self.proto}")
-        header_wo_csum = struct.pack(
-            "!BBHHHBBH4s4s",
-            (self.version << 4) | self.ihl,
-            0,
-            total_len,
-            0,
-            0,
-            self.ttl,
-            self.proto,
-            0,
-            ip_to_bytes(self.src_ip),
-            ip_to_bytes(self.dst_ip),
-        )
-        csum = checksum_ones_complement(header_wo_csum)
-        print(f"{pad}  checksum: {csum}")
-        print(f"{pad}  src_ip: {self.src_ip}")
-        print(f"{pad}  dst_ip: {self.dst_ip}")
-        if self.payload:
-            self.payload.show(indent + 1)
\ No newline at end of file
+        return [
+            ("version", self.version),
+            ("ihl", self.ihl),
+            ("tos", self.tos),
+            ("total_len", self.total_len),
+            ("ident", self.ident),
+            ("flags_frag", self.flags_frag),
+            ("ttl", self.ttl),
+            ("proto", self.proto),
+            ("checksum", self.checksum),
+            ("src_ip", self.src_ip),
+            ("dst_ip", self.dst_ip),
+        ]
+
+    def _summary(self) -> str:
+        if self.payload is None:
+            return f"IP {self.src_ip} > {self.dst_ip} proto={self.proto}"
+        return f"IP {self.src_ip} > {self.dst_ip}"
@@ -2,31 +2,40 @@ from __future__ import annotations
 
 import socket
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from utils import checksum_ones_complement, ip_to_bytes
+from utils import checksum_ones_complement, ip_to_bytes, ones_complement_sum
 
 from .base import BaseLayer
 
 PROTO_TCP = 6
 
+_TCP_HDR = struct.Struct("!HHLLBBHHH")
+_PSEUDO_HDR = struct.Struct("!4s4sBBH")
+_U16 = struct.Struct("!H")
+
+TCP_FLAG_LETTERS = "FSRPAUEC"  # bit 0 (FIN) upwards
+
 
 class TCP(BaseLayer):
+    __slots__ = ("sport", "dport", "seq", "ack", "flags", "window", "checksum", "urg_ptr",
+                 "offset", "options", "data", "src_ip", "dst_ip")
+    _parses_payload = False
+    _wired_fields = ("src_ip", "dst_ip")
+    _field_layout = {"sport": (0, "!H"), "dport": (2, "!H"), "seq": (4, "!L"), "ack": (8, "!L"),
+                     "flags": (13, "!B"), "window": (14, "!H"), "urg_ptr": (18, "!H")}
+    _min_len = _TCP_HDR.size
+    _csum_offset = 16
+
     def __init__(self, sport: int = 12345, dport: int = 80, seq: int = 0, ack: int = 0,
                  flags: int = 0x02, window: int = 8192, data: bytes = b"",
-                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None):
+                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None,
+                 lazy: bool = False):
         super().__init__(payload=payload)
         self.src_ip: Optional[str] = None  # wired when stacked over IP
         self.dst_ip: Optional[str] = None
         if raw is not None:
-            if len(raw) < 20:
-                raise ValueError("TCP segment too short")
-            (self.sport, self.dport, self.seq, self.ack, offset_flags,
-             self.flags, self.window, self.checksum, self.urg_ptr) = struct.unpack("!HHLLBBHHH", raw[:20])
-            self.offset = (offset_flags >> 4) & 0xF
-            hdr_len = self.offset * 4
-            self.options = raw[20:hdr_len] if hdr_len > 20 else b""
-            self.data = raw[hdr_len:]
+            self._init_raw(raw, lazy)
         else:
             self.sport = sport
             self.dport = dport
@@ -40,69 +49,83 @@ class TCP(BaseLayer):
             self.options = b""
             self.data = data
 
-    def _header_wo_csum(self) -> bytes:
-        offset_flags = (self.offset << 4) | 0
-        return struct.pack(
-            "!HHLLBBHHH",
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
+        if len(raw) < 20:
+            raise ValueError("TCP segment too short")
+        (self.sport, self.dport, self.seq, self.ack, offset_flags,
+         self.flags, self.window, self.checksum, self.urg_ptr) = _TCP_HDR.unpack_from(raw)
+        self.offset = (offset_flags >> 4) & 0xF
+        hdr_len = self.offset * 4
+        self.options = bytes(raw[20:hdr_len]) if hdr_len > 20 else b""
+        self._payload = None
+        self._set_data(raw[hdr_len:], lazy)
+
+    def hashret(self) -> bytes:
+        return _U16.pack(self.sport ^ self.dport)
+
+    def answers(self, other: BaseLayer) -> bool:
+        if not isinstance(other, TCP) or self.sport != other.dport or self.dport != other.sport:
+            return False
+        if self.flags & 0x10:  # ACK: must acknowledge something `other` sent
+            span = len(other.data) + (other.flags & 0x02 != 0) + (other.flags & 0x01 != 0)
+            return (self.ack - other.seq) & 0xFFFFFFFF <= span
+        return True  # bare RST or simultaneous SYN
+
+    def _payload_bytes(self) -> bytes:
+        return self.data
+
+    def _build_key(self) -> tuple:
+        return (self.sport, self.dport, self.seq, self.ack, self.offset, self.flags,
+                self.window, self.urg_ptr, self.options, self.src_ip, self.dst_ip)
+
+    def _build(self, payload_bytes: bytes) -> bytes:
+        options = self.options if self.options else b""
+        header = bytearray(_TCP_HDR.pack(
             self.sport,
             self.dport,
             self.seq,
             self.ack,
-            offset_flags,
+            self.offset << 4,
             self.flags,
             self.window,
-            0,
+            0,  # checksum placeholder
             self.urg_ptr,
-        ) + (self.options if self.options else b"")
-
-    def build(self) -> bytes:
-        payload_bytes = self.data
-        header_wo_csum = self._header_wo_csum()
-        length = len(header_wo_csum) + len(payload_bytes)
-        src_ip = getattr(self, "src_ip", None)
-        dst_ip = getattr(self, "dst_ip", None)
+        ) + options)
+        src_ip = self.src_ip
+        dst_ip = self.dst_ip
         if src_ip and dst_ip:
-            pseudo = struct.pack(
-                "!4s4sBBH",
+            pseudo = _PSEUDO_HDR.pack(
                 ip_to_bytes(src_ip),
                 ip_to_bytes(dst_ip),
                 0,
                 PROTO_TCP,
-                length,
+                len(header) + len(payload_bytes),
             )
-            csum = checksum_ones_complement(pseudo + header_wo_csum + payload_bytes)
+            partial = ones_complement_sum(pseudo + header)
         else:
-            csum = checksum_ones_complement(header_wo_csum + payload_bytes)
-        self.checksum = csum
-        # Repack with checksum
-        offset_flags = (self.offset << 4) | 0
-        header = struct.pack(
-            "!HHLLBBHHH",
-            self.sport,
-            self.dport,
-            self.seq,
-            self.ack,
-            offset_flags,
-            self.flags,
-            self.window,
-            self.checksum,
-            self.urg_ptr,
-        ) + (self.options if self.options else b"")
-        return header + payload_bytes
-
-    def show(self, indent: int = 0) -> None:
-        pad = "  " * indent
-        print(f"{pad}### TCP ###")
-        print(f"{pad}  sport: {self.sport}")
-        print(f"{pad}  dport: {self.dport}")
-        print(f"{pad}  seq: {self.seq}")
-        print(f"{pad}  ack: {self.ack}")
-        print(f"{pad}  flags: {self.flags}")
-        print(f"{pad}  window: {self.window}")
-        print(f"{pad}  checksum: {self.checksum}")
-        if getattr(self, "src_ip", None):
-            print(f"{pad}  src_ip: {self.src_ip}")
-        if getattr(self, "dst_ip", None):
-            print(f"{pad}  dst_ip: {self.dst_ip}")
+            partial = ones_complement_sum(header)
+        self.checksum = checksum_ones_complement(payload_bytes, partial)
+        _U16.pack_into(header, 16, self.checksum)
+        return bytes(header) + payload_bytes
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        fields = [
+            ("sport", self.sport),
+            ("dport", self.dport),
+            ("seq", self.seq),
+            ("ack", self.ack),
+            ("flags", self.flags),
+            ("window", self.window),
+            ("checksum", self.checksum),
+        ]
+        if self.src_ip:
+            fields.append(("src_ip", self.src_ip))
+        if self.dst_ip:
+            fields.append(("dst_ip", self.dst_ip))
         if self.data:
-            print(f"{pad}  data: {self.data.hex() if isinstance(self.data, bytes) else self.data}")
\ No newline at end of file
+            fields.append(("data", self.data.hex() if isinstance(self.data, bytes) else self.data))
+        return fields
+
+    def _summary(self) -> str:
+        flags = "".join(letter for bit, letter in enumerate(TCP_FLAG_LETTERS) if self.flags & (1 << bit))
+        return f"TCP {self.sport} > {self.dport} {flags or '.'}"
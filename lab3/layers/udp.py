@@ -2,37 +2,35 @@ from __future__ import annotations
 
 import socket
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from utils import checksum_ones_complement, ip_to_bytes
+from utils import checksum_ones_complement, ip_to_bytes, ones_complement_sum
 
 from .base import BaseLayer
+from .dns import DNS
 
 PROTO_UDP = 17
 
+_UDP_HDR = struct.Struct("!HHHH")
+_PSEUDO_HDR = struct.Struct("!4s4sBBH")
+_U16 = struct.Struct("!H")
+
 
 class UDP(BaseLayer):
+    __slots__ = ("sport", "dport", "length", "checksum", "data", "src_ip", "dst_ip")
+    _wired_fields = ("src_ip", "dst_ip")
+    _field_layout = {"sport": (0, "!H"), "dport": (2, "!H"), "length": (4, "!H")}
+    _min_len = _UDP_HDR.size
+    _csum_offset = 6
+
     def __init__(self, sport: int = 12345, dport: int = 80, data: bytes = b"",
-                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None):
+                 raw: Optional[bytes] = None, payload: Optional[BaseLayer] = None,
+                 lazy: bool = False):
         super().__init__(payload=payload)
         self.src_ip: Optional[str] = None  # wired when stacked over IP
         self.dst_ip: Optional[str] = None
         if raw is not None:
-            if len(raw) < 8:
-                raise ValueError("UDP segment too short")
-            self.sport, self.dport, self.length, self.checksum = struct.unpack("!HHHH", raw[:8])
-            body = raw[8:self.length if self.length else None]
-            # If likely DNS (ports 53), try to parse; otherwise keep raw as data
-            if self.dport == 53 or self.sport == 53:
-                try:
-                    from .dns import DNS
-                    self.payload = DNS(raw=body)
-                except Exception:
-                    self.payload = None
-                    self.data = body
-            else:
-                self.payload = None
-                self.data = body
+            self._init_raw(raw, lazy)
         else:
             self.sport = sport
             self.dport = dport
@@ -41,49 +39,75 @@ class UDP(BaseLayer):
             self.length = 8 + (len(self.data) if data else 0)
             self.checksum = 0
 
+    def _decode(self, raw: memoryview, lazy: bool) -> None:
+        if len(raw) < 8:
+            raise ValueError("UDP segment too short")
+        self.sport, self.dport, self.length, self.checksum = _UDP_HDR.unpack_from(raw)
+        body = raw[8:self.length if self.length else None]
+        self._payload = None
+        # If likely DNS (ports 53), try to parse; otherwise keep raw as data.
+        # Not deferred when lazy: whether the body parses decides what the
+        # tree looks like, and it must look the same either way.
+        if self.dport == 53 or self.sport == 53:
+            try:
+                self._payload = DNS(raw=body)
+                self.data = b""
+                return
+            except Exception:
+                self._payload = None
+        self._set_data(body, lazy)
+
+    def hashret(self) -> bytes:
+        return _U16.pack(self.sport ^ self.dport) + super().hashret()
+
+    def answers(self, other: BaseLayer) -> bool:
+        if not isinstance(other, UDP) or self.sport != other.dport or self.dport != other.sport:
+            return False
+        return self._payload_answers(other)
+
     def _payload_bytes(self) -> bytes:
         if self.payload is not None:
             return self.payload.build()
-        return self.data if hasattr(self, "data") and self.data else b""
+        return self.data if self.data else b""
+
+    def _build_key(self) -> tuple:
+        return (self.sport, self.dport, self.src_ip, self.dst_ip)
 
-    def build(self) -> bytes:
-        payload_bytes = self._payload_bytes()
+    def _build(self, payload_bytes: bytes) -> bytes:
         self.length = 8 + len(payload_bytes)
-        header_wo_csum = struct.pack("!HHHH", self.sport, self.dport, self.length, 0)
         # UDP checksum over pseudo-header + UDP header + data
-        src_ip = getattr(self, "src_ip", None)
-        dst_ip = getattr(self, "dst_ip", None)
+        header_sum = self.sport + self.dport + self.length  # checksum field counts as zero
+        src_ip = self.src_ip
+        dst_ip = self.dst_ip
         if not src_ip or not dst_ip:
             # Allow building without checksum if not wired; leave zero as many stacks do
-            pseudo = b""
-            udp_for_csum = header_wo_csum + payload_bytes
-            csum = checksum_ones_complement(udp_for_csum)
+            csum = checksum_ones_complement(payload_bytes, header_sum)
         else:
-            pseudo = struct.pack(
-                "!4s4sBBH",
+            pseudo = _PSEUDO_HDR.pack(
                 ip_to_bytes(src_ip),
                 ip_to_bytes(dst_ip),
                 0,
                 PROTO_UDP,
                 self.length,
             )
-            csum = checksum_ones_complement(pseudo + header_wo_csum + payload_bytes)
+            csum = checksum_ones_complement(payload_bytes, ones_complement_sum(pseudo, header_sum))
             if csum == 0:
                 csum = 0xFFFF  # UDP checksum of zero is transmitted as 0xFFFF
         self.checksum = csum
-        header = struct.pack("!HHHH", self.sport, self.dport, self.length, self.checksum)
-        return header + payload_bytes
-
-    def show(self, indent: int = 0) -> None:
-        pad = "  " * indent
-        print(f"{pad}### UDP ###")
-        print(f"{pad}  sport: {self.sport}")
-        print(f"{pad}  dport: {self.dport}")
-        print(f"{pad}  length: {self.length}")
-        print(f"{pad}  checksum: {self.checksum:04x}")
-        if getattr(self, "src_ip", None):
-            print(f"{pad}  src_ip: {self.src_ip}")
-        if getattr(self, "dst_ip", None):
-            print(f"{pad}  dst_ip: {self.dst_ip}")
-        if self.payload:
-            self.payload.show(indent + 1)
\ No newline at end of file
+        return _UDP_HDR.pack(self.sport, self.dport, self.length, self.checksum) + payload_bytes
+
+    def _show_fields(self) -> List[Tuple[str, object]]:
+        fields = [
+            ("sport", self.sport),
+            ("dport", self.dport),
+            ("length", self.length),
+            ("checksum", f"{self.checksum:04x}"),
+        ]
+        if self.src_ip:
+            fields.append(("src_ip", self.src_ip))
+        if self.dst_ip:
+            fields.append(("dst_ip", self.dst_ip))
+        return fields
+
+    def _summary(self) -> str:
+        return f"UDP {self.sport} > {self.dport}"
@@ -0,0 +1,466 @@
+"""A small compiler from capture filter expressions to classic BPF.
+
+    prog = compile_filter("tcp and src host 10.0.0.1 and dst port 443")
+    attach_filter(sock, prog)     # kernel drops everything else
+
+Expressions (tcpdump-like, Ethernet/IPv4 only):
+
+    primitive := ip | arp | icmp | tcp | udp
+               | [src|dst] host ADDR
+               | [src|dst] net ADDR/LEN
+               | [src|dst] port N        (TCP or UDP, first fragment only)
+    expr      := expr or expr | expr and expr | not expr | ( expr )
+
+Juxtaposition means "and", so "tcp port 80" is "tcp and port 80".
+"""
+
+import ctypes
+import socket
+import struct
+from typing import List, Optional, Tuple, Union
+
+from utils import ip_to_bytes
+
+# Classic BPF opcodes (linux/filter.h)
+BPF_LD, BPF_LDX, BPF_ALU, BPF_JMP, BPF_RET = 0x00, 0x01, 0x04, 0x05, 0x06
+BPF_W, BPF_H, BPF_B = 0x00, 0x08, 0x10
+BPF_ABS, BPF_IND, BPF_MSH = 0x20, 0x40, 0xA0
+BPF_JA, BPF_JEQ, BPF_JGT, BPF_JGE, BPF_JSET = 0x00, 0x10, 0x20, 0x30, 0x40
+BPF_AND = 0x50
+BPF_K = 0x00
+
+SO_ATTACH_FILTER = getattr(socket, "SO_ATTACH_FILTER", 26)
+SO_DETACH_FILTER = getattr(socket, "SO_DETACH_FILTER", 27)
+SNAPLEN = 0x40000
+
+ETH_P_IP, ETH_P_ARP = 0x0800, 0x0806
+PROTOS = {"icmp": 1, "tcp": 6, "udp": 17}
+
+# Offsets in an Ethernet frame carrying IPv4
+_ETH_TYPE = 12
+_IP_FRAG = 20
+_IP_PROTO = 23
+_IP_SRC, _IP_DST = 26, 30
+_IP_START = 14
+
+# (code, jt, jf, k), as in struct sock_filter
+Insn = Tuple[int, int, int, int]
+_INSN = struct.Struct("HBBI")
+
+
+class FilterError(ValueError):
+    pass
+
+
+# --- expression tree ---------------------------------------------------------
+# Leaves are tests: (loads, jump code, k) where `loads` put the value in A.
+
+def _test(loads: List[Insn], jump: int, k: int):
+    return ("test", tuple(loads), jump, k)
+
+
+def _ld(size: int, offset: int) -> Insn:
+    return (BPF_LD | size | BPF_ABS, 0, 0, offset)
+
+
+def _ethertype(value: int):
+    return _test([_ld(BPF_H, _ETH_TYPE)], BPF_JEQ, value)
+
+
+def _ip_proto(proto: int):
+    return ("and", _ethertype(ETH_P_IP), _test([_ld(BPF_B, _IP_PROTO)], BPF_JEQ, proto))
+
+
+def _either(direction: Optional[str], make):
+    if direction == "src":
+        return make("src")
+    if direction == "dst":
+        return make("dst")
+    return ("or", make("src"), make("dst"))
+
+
+def _host(direction: Optional[str], addr: str):
+    value = int.from_bytes(_resolve(addr), "big")
+    return ("and", _ethertype(ETH_P_IP), _either(direction, lambda d: _test(
+        [_ld(BPF_W, _IP_SRC if d == "src" else _IP_DST)], BPF_JEQ, value)))
+
+
+def _net(direction: Optional[str], cidr: str):
+    addr, _, length = cidr.partition("/")
+    try:
+        bits = int(length) if length else 32
+    except ValueError:
+        raise FilterError(f"bad prefix length in {cidr!r}") from None
+    if not 0 <= bits <= 32:
+        raise FilterError(f"bad prefix length in {cidr!r}")
+    mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+    value = int.from_bytes(_resolve(addr), "big") & mask
+    return ("and", _ethertype(ETH_P_IP), _either(direction, lambda d: _test(
+        [_ld(BPF_W, _IP_SRC if d == "src" else _IP_DST), (BPF_ALU | BPF_AND | BPF_K, 0, 0, mask)],
+        BPF_JEQ, value)))
+
+
+def _port(direction: Optional[str], port: int):
+    l4 = ("or", _test([_ld(BPF_B, _IP_PROTO)], BPF_JEQ, PROTOS["tcp"]),
+          _test([_ld(BPF_B, _IP_PROTO)], BPF_JEQ, PROTOS["udp"]))
+    # later fragments carry no L4 header
+    first_frag = ("not", _test([_ld(BPF_H, _IP_FRAG)], BPF_JSET, 0x1FFF))
+
+    def check(d):
+        # X = IP header length, then load the port at X + 14 (+2 for dst)
+        return _test([(BPF_LDX | BPF_B | BPF_MSH, 0, 0, _IP_START),
+                      (BPF_LD | BPF_H | BPF_IND, 0, 0, _IP_START + (0 if d == "src" else 2))],
+                     BPF_JEQ, port)
+    return ("and", _ethertype(ETH_P_IP), ("and", l4, ("and", first_frag, _either(direction, check))))
+
+
+def _resolve(addr: str) -> bytes:
+    try:
+        return ip_to_bytes(addr)
+    except OSError:
+        pass
+    try:
+        return ip_to_bytes(socket.gethostbyname(addr))
+    except OSError:
+        raise FilterError(f"unknown host {addr!r}") from None
+
+
+# --- parser ------------------------------------------------------------------
+
+class _Parser:
+    def __init__(self, expr: str):
+        self.tokens = expr.replace("(", " ( ").replace(")", " ) ").split()
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> str:
+        tok = self.peek()
+        if tok is None:
+            raise FilterError("unexpected end of filter expression")
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        if self.peek() is None:
+            return ("true",)
+        node = self.expr()
+        if self.peek() is not None:
+            raise FilterError(f"unexpected {self.peek()!r}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() in ("or", "||"):
+            self.next()
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() not in (None, ")", "or", "||"):
+            if self.peek() in ("and", "&&"):
+                self.next()
+            node = ("and", node, self.factor())
+        return node
+
+    def factor(self):
+        tok = self.next()
+        if tok in ("not", "!"):
+            return ("not", self.factor())
+        if tok == "(":
+            node = self.expr()
+            if self.next() != ")":
+                raise FilterError("missing ')'")
+            return node
+        direction = None
+        if tok in ("src", "dst"):
+            direction, tok = tok, self.next()
+        if tok == "host":
+            return _host(direction, self.next())
+        if tok == "net":
+            return _net(direction, self.next())
+        if tok == "port":
+            value = self.next()
+            if not value.isdigit() or int(value) > 0xFFFF:
+                raise FilterError(f"bad port {value!r}")
+            return _port(direction, int(value))
+        if direction is not None:
+            raise FilterError(f"expected host, net or port after {direction!r}")
+        if tok == "ip":
+            return _ethertype(ETH_P_IP)
+        if tok == "arp":
+            return _ethertype(ETH_P_ARP)
+        if tok in PROTOS:
+            return _ip_proto(PROTOS[tok])
+        raise FilterError(f"unknown filter primitive {tok!r}")
+
+
+# --- code generation ---------------------------------------------------------
+
+def _gen(node, on_true, on_false, out: list, labels: List[int]) -> None:
+    """Append code for `node` that jumps to label `on_true`/`on_false`.
+    `out` holds instructions whose jt/jf are label numbers until resolved;
+    labels[n] is the index of the instruction label n points at.
+    """
+    kind = node[0]
+    if kind == "test":
+        _, loads, jump, k = node
+        out.extend(("insn", insn) for insn in loads)
+        out.append(("jmp", BPF_JMP | jump | BPF_K, on_true, on_false, k))
+    elif kind == "true":
+        out.append(("ja", on_true))
+    elif kind == "not":
+        _gen(node[1], on_false, on_true, out, labels)
+    elif kind in ("and", "or"):
+        mid = len(labels)
+        labels.append(-1)
+        if kind == "and":
+            _gen(node[1], mid, on_false, out, labels)
+        else:
+            _gen(node[1], on_true, mid, out, labels)
+        labels[mid] = len(out)
+        _gen(node[2], on_true, on_false, out, labels)
+    else:  # pragma: no cover - parser only builds the kinds above
+        raise FilterError(f"bad node {kind!r}")
+
+
+def _meet(states):
+    """What holds on every incoming path: (A source, X source, known values)."""
+    a_src, x_src, facts = states[0]
+    for st in states[1:]:
+        if st[0] != a_src:
+            a_src = None
+        if st[1] != x_src:
+            x_src = None
+        facts = facts & st[2]
+    return a_src, x_src, facts
+
+
+def _known(facts: frozenset, src) -> Optional[int]:
+    for fsrc, value in facts:
+        if fsrc == src:
+            return value
+    return None
+
+
+def _optimize(out: list, labels: List[int]) -> Tuple[list, List[int]]:
+    """Drop reloads of values already in A/X, fold tests whose outcome is
+    known on every path (e.g. the ethertype check repeated by each
+    primitive) and remove code that became unreachable. Works on the
+    symbolic code: every jump is forward to a label, so one pass suffices.
+    A "source" names what a register holds (the load, plus X for indexed
+    loads); facts are (source, value) pairs implied by taken JEQ branches.
+    """
+    at: dict = {}
+    for label, pos in enumerate(labels):
+        at.setdefault(pos, []).append(label)
+    incoming: dict = {}
+    new: list = []
+    new_labels = list(labels)
+    jeq = BPF_JMP | BPF_JEQ | BPF_K
+
+    def reach(label, state):
+        incoming.setdefault(label, []).append(state)
+
+    def source(insn, x_src):
+        if insn[0] & 0xE0 == BPF_ABS:
+            return insn
+        return ("ind", insn, x_src) if x_src is not None else None
+
+    cur = (None, None, frozenset())
+    skip = False
+    for i, item in enumerate(out):
+        states = [] if cur is None else [cur]
+        for label in at.get(i, ()):
+            states += incoming.get(label, [])
+            new_labels[label] = len(new)
+        if skip:  # folded jump after a dropped load
+            skip = False
+            continue
+        if not states:
+            cur = None  # unreachable
+            continue
+        a_src, x_src, facts = _meet(states)
+        if item[0] == "insn":
+            insn = item[1]
+            cls = insn[0] & 0x07
+            if cls == BPF_LDX:
+                if x_src != insn:
+                    x_src = insn
+                    if isinstance(a_src, tuple) and a_src[0] == "ind":
+                        a_src = None
+                    new.append(item)
+            elif cls == BPF_LD:
+                src = source(insn, x_src)
+                nxt = out[i + 1] if i + 1 < len(out) else None
+                value = _known(facts, src) if src is not None else None
+                if (value is not None and nxt is not None and nxt[0] == "jmp" and nxt[1] == jeq
+                        and i + 1 not in at):
+                    # load + JEQ on a known value: a straight jump, A untouched
+                    target = nxt[2] if value == nxt[4] else nxt[3]
+                    reach(target, (a_src, x_src, facts))
+                    new.append(("ja", target))
+                    skip = True
+                    cur = None
+                    continue
+                if src is None or src != a_src:
+                    a_src = src
+                    new.append(item)
+            else:  # ALU on A
+                a_src = ("alu", a_src, insn) if a_src is not None else None
+                new.append(item)
+            cur = (a_src, x_src, facts)
+            continue
+        if item[0] == "ja":
+            reach(item[1], (a_src, x_src, facts))
+            new.append(item)
+        else:
+            _, code, on_true, on_false, k = item
+            value = _known(facts, a_src) if a_src is not None else None
+            if code == jeq and value is not None:
+                target = on_true if value == k else on_false
+                reach(target, (a_src, x_src, facts))
+                new.append(("ja", target))
+            else:
+                true_facts = facts | {(a_src, k)} if code == jeq and a_src is not None else facts
+                reach(on_true, (a_src, x_src, true_facts))
+                reach(on_false, (a_src, x_src, facts))
+                new.append(item)
+        cur = None  # jumps never fall through
+    return new, new_labels
+
+
+def compile_filter(expr: str, snaplen: int = SNAPLEN) -> List[Insn]:
+    """Compile `expr` into classic BPF instructions (code, jt, jf, k).
+    Matching frames are accepted up to `snaplen` bytes, others dropped.
+    """
+    tree = _Parser(expr).parse()
+    out: list = []
+    labels = [-1, -1]  # 0: accept, 1: reject
+    _gen(tree, 0, 1, out, labels)
+    labels[0] = len(out)
+    labels[1] = len(out) + 1
+    out, labels = _optimize(out, labels)
+    labels[0], labels[1] = len(out), len(out) + 1
+
+    # Jumps to the very next instruction are no-ops; drop them until none are left
+    while True:
+        nops = [i for i, item in enumerate(out) if item[0] == "ja" and labels[item[1]] == i + 1]
+        if not nops:
+            break
+        drop = nops[0]
+        del out[drop]
+        labels = [pos - 1 if pos > drop else pos for pos in labels]
+
+    prog: List[Insn] = []
+    for i, item in enumerate(out):
+        if item[0] == "insn":
+            prog.append(item[1])
+        elif item[0] == "ja":
+            prog.append((BPF_JMP | BPF_JA, 0, 0, labels[item[1]] - i - 1))
+        else:
+            _, code, on_true, on_false, k = item
+            jt, jf = labels[on_true] - i - 1, labels[on_false] - i - 1
+            if jt > 255 or jf > 255:
+                raise FilterError("filter expression too large")
+            prog.append((code, jt, jf, k))
+    prog.append((BPF_RET | BPF_K, 0, 0, snaplen))
+    prog.append((BPF_RET | BPF_K, 0, 0, 0))
+    return prog
+
+
+# --- attaching ---------------------------------------------------------------
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+
+def _setsockopt_filter(sock: socket.socket, prog: List[Insn]) -> None:
+    code = b"".join(_INSN.pack(*insn) for insn in prog)
+    buf = ctypes.create_string_buffer(code, len(code))
+    fprog = _SockFprog(len(prog), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, bytes(fprog))
+
+
+def attach_filter(sock: socket.socket, prog: Union[str, List[Insn]]) -> None:
+    """Attach a filter (expression or compiled program) to a packet socket.
+    Frames queued before the filter took effect are drained, so nothing that
+    fails the filter is read afterwards.
+    """
+    if isinstance(prog, str):
+        prog = compile_filter(prog)
+    _setsockopt_filter(sock, [(BPF_RET | BPF_K, 0, 0, 0)])  # drop all while draining
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        while True:
+            sock.recv(1)
+    except BlockingIOError:
+        pass
+    finally:
+        sock.settimeout(timeout)
+    _setsockopt_filter(sock, prog)
+
+
+def detach_filter(sock: socket.socket) -> None:
+    sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
+
+
+def dump_filter(prog: List[Insn]) -> str:
+    """One `{code, jt, jf, k}` line per instruction, like `tcpdump -dd`."""
+    return "\n".join(f"{{ 0x{code:02x}, {jt}, {jf}, 0x{k:08x} }}," for code, jt, jf, k in prog)
+
+
+# --- userspace execution -----------------------------------------------------
+
+def run_filter(prog: List[Insn], frame) -> int:
+    """Run `prog` on `frame` the way the kernel would and return the number of
+    bytes to keep (0: drop). Used where there is no socket to attach to, such
+    as the in-memory transport. Loads past the end of the frame drop it.
+    """
+    a = x = pc = 0
+    n = len(frame)
+    while True:
+        code, jt, jf, k = prog[pc]
+        pc += 1
+        cls = code & 0x07
+        if cls == BPF_RET:
+            return k
+        if cls == BPF_LD or cls == BPF_LDX:
+            mode, size = code & 0xE0, code & 0x18
+            if mode == BPF_MSH:
+                if k >= n:
+                    return 0
+                x = (frame[k] & 0x0F) * 4
+                continue
+            off = k + x if mode == BPF_IND else k
+            width = 4 if size == BPF_W else 2 if size == BPF_H else 1
+            if mode not in (BPF_ABS, BPF_IND) or off + width > n:
+                return 0
+            value = int.from_bytes(frame[off:off + width], "big")
+            if cls == BPF_LD:
+                a = value
+            else:
+                x = value
+        elif cls == BPF_ALU and code & 0xF0 == BPF_AND:
+            a &= k
+        elif cls == BPF_JMP:
+            op = code & 0xF0
+            if op == BPF_JA:
+                pc += k
+                continue
+            if op == BPF_JEQ:
+                taken = a == k
+            elif op == BPF_JGT:
+                taken = a > k
+            elif op == BPF_JGE:
+                taken = a >= k
+            elif op == BPF_JSET:
+                taken = a & k != 0
+            else:
+                raise FilterError(f"unsupported jump 0x{code:02x}")
+            pc += jt if taken else jf
+        else:
+            raise FilterError(f"unsupported instruction 0x{code:02x}")
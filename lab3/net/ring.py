@@ -0,0 +1,173 @@
+"""PACKET_MMAP (TPACKET_V3) receive ring.
+
+The kernel writes frames into a shared memory ring split into blocks; a
+block is handed to userspace once it is full or its retire timeout expires,
+so one poll() delivers a whole batch and frames are read in place:
+
+    with RingCapture("eth0", filter="udp and port 53") as ring:
+        for ts, frame in ring:          # frame: memoryview into the ring
+            handle(Ether(raw=bytes(frame)))
+        print(ring.stats())
+
+A frame view is only valid until the iterator moves past its block (the
+block then goes back to the kernel); copy it to keep it. Linux only.
+"""
+
+import mmap
+import select
+import socket
+import struct
+import time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from net.bpf import attach_filter
+
+SOL_PACKET = getattr(socket, "SOL_PACKET", 263)
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+ETH_P_ALL = 0x0003
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# struct tpacket_req3
+_REQ3 = struct.Struct("7I")
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+# (block_status, num_pkts, offset_to_first_pkt, ...)
+_BLOCK_STATUS = struct.Struct("I")
+_BLOCK_HDR = struct.Struct("III")
+_BLOCK_STATUS_OFF = 8
+# struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+_PKT_HDR = struct.Struct("IIIIIIHH")
+# struct tpacket_stats_v3
+_STATS_V3 = struct.Struct("III")
+
+
+class RingStats(NamedTuple):
+    packets: int  # frames the socket saw (accepted by its filter)
+    drops: int    # frames lost because the ring was full
+    freeze_q_cnt: int
+
+
+class RingCapture:
+    """Capture frames from a TPACKET_V3 ring on `interface` (None: all).
+    The ring is `block_nr` blocks of `block_size` bytes; a partly filled
+    block is retired after `retire_ms` so quiet links still deliver.
+    """
+
+    def __init__(self, interface: Optional[str] = None, block_size: int = 1 << 20,
+                 block_nr: int = 64, frame_size: int = 2048, retire_ms: int = 60,
+                 filter: Optional[str] = None):
+        if getattr(socket, "AF_PACKET", None) is None:
+            raise NotImplementedError("RingCapture requires Linux (AF_PACKET)")
+        if block_size % mmap.PAGESIZE or block_size % frame_size:
+            raise ValueError("block_size must be a multiple of the page and frame size")
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self._stats = [0, 0, 0]
+        self._block = 0
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            if filter:
+                attach_filter(self.sock, filter)
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            req = _REQ3.pack(block_size, block_nr, frame_size,
+                             block_size // frame_size * block_nr, retire_ms, 0, 0)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self._map = mmap.mmap(self.sock.fileno(), block_size * block_nr,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            if interface:
+                self.sock.bind((interface, ETH_P_ALL))
+        except BaseException:
+            self.close()
+            raise
+        self._view = memoryview(self._map)
+        self._poll = select.poll()
+        self._poll.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+
+    def _block_ready(self, block: int) -> bool:
+        off = block * self.block_size + _BLOCK_STATUS_OFF
+        return _BLOCK_STATUS.unpack_from(self._map, off)[0] & TP_STATUS_USER != 0
+
+    def _release(self, block: int) -> None:
+        _BLOCK_STATUS.pack_into(self._map, block * self.block_size + _BLOCK_STATUS_OFF, TP_STATUS_KERNEL)
+
+    def next_block(self, timeout: Optional[float] = None) -> Optional[List[Tuple[float, memoryview]]]:
+        """Wait up to `timeout` seconds (None: forever) for the next block and
+        return its frames as (timestamp, view) pairs, or None on timeout.
+        Call release_block() once done with the views.
+        """
+        block = self._block
+        if not self._block_ready(block):
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._block_ready(block):
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                if wait == 0.0:
+                    return None
+                self._poll.poll(None if wait is None else int(wait * 1000) or 1)
+        base = block * self.block_size
+        num, off, _ = _BLOCK_HDR.unpack_from(self._map, base + _BLOCK_STATUS_OFF + 4)
+        frames = []
+        view = self._view
+        pos = base + off
+        for _ in range(num):
+            next_off, sec, nsec, snaplen, _len, _status, mac, _net = _PKT_HDR.unpack_from(self._map, pos)
+            start = pos + mac
+            frames.append((sec + nsec * 1e-9, view[start:start + snaplen]))
+            pos += next_off
+        return frames
+
+    def release_block(self) -> None:
+        """Return the current block to the kernel and move to the next."""
+        self._release(self._block)
+        self._block = (self._block + 1) % self.block_nr
+
+    def batches(self, timeout: Optional[float] = None) -> Iterator[List[Tuple[float, memoryview]]]:
+        """Yield one list of frames per block; each block is released when the
+        next is requested. Stops when no block arrives within `timeout`.
+        """
+        while True:
+            frames = self.next_block(timeout)
+            if frames is None:
+                return
+            try:
+                yield frames
+            finally:
+                self.release_block()
+
+    def __iter__(self) -> Iterator[Tuple[float, memoryview]]:
+        for frames in self.batches():
+            yield from frames
+
+    def stats(self) -> RingStats:
+        """Cumulative counters (the kernel resets them on every read)."""
+        raw = self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS_V3.size)
+        for i, value in enumerate(_STATS_V3.unpack(raw)):
+            self._stats[i] += value
+        return RingStats(*self._stats)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # frame views still referenced; unmapped when they go away
+            self._map = None
+        self.sock.close()
+
+    def __enter__(self) -> "RingCapture":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,3 +1,8 @@
+import atexit
+import socket
+import threading
+from typing import Dict, Optional, Tuple
+
 def create_raw_socket(layer):
     if layer == 2:  # Layer 2 (Ethernet)
         sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
@@ -17,4 +22,68 @@ def bind_socket(sock, interface):
     sock.bind((interface, 0))  # Bind to the specified interface
 
 def close_socket(sock):
-    sock.close()
\ No newline at end of file
+    sock.close()
+
+
+class SocketPool:
+    """Keeps one raw socket per (family, interface) open across sends.
+    Layer-3 sockets are AF_INET/IPPROTO_RAW (the packet carries its own IP
+    header); layer-2 sockets are AF_PACKET bound to their interface. Lookups
+    take a lock only to create a socket; sending on a shared socket is safe
+    from several threads since each send is a single syscall. With
+    `blocking=False` the sockets are non-blocking (for event loops).
+    """
+
+    def __init__(self, blocking: bool = True):
+        self._socks: Dict[Tuple[int, Optional[str]], socket.socket] = {}
+        self._lock = threading.Lock()
+        self.blocking = blocking
+
+    def get(self, layer: int, interface: Optional[str] = None) -> socket.socket:
+        """Return the pooled socket for `layer` (2 or 3), opening it on first use."""
+        key = (layer, interface if layer == 2 else None)
+        sock = self._socks.get(key)
+        if sock is not None:
+            return sock
+        with self._lock:
+            sock = self._socks.get(key)
+            if sock is None:
+                if layer == 2 and getattr(socket, "AF_PACKET", None) is None:
+                    raise NotImplementedError("Layer-2 send requires Linux (AF_PACKET)")
+                sock = create_raw_socket(layer)
+                try:
+                    if layer == 2:
+                        bind_socket(sock, interface)
+                    sock.setblocking(self.blocking)
+                except OSError:
+                    sock.close()
+                    raise
+                self._socks[key] = sock
+        return sock
+
+    def discard(self, layer: int, interface: Optional[str] = None) -> None:
+        """Close and forget one socket (e.g. after the interface went away)."""
+        with self._lock:
+            sock = self._socks.pop((layer, interface if layer == 2 else None), None)
+        if sock is not None:
+            sock.close()
+
+    def close(self) -> None:
+        with self._lock:
+            socks, self._socks = list(self._socks.values()), {}
+        for sock in socks:
+            sock.close()
+
+    def __len__(self) -> int:
+        return len(self._socks)
+
+    def __enter__(self) -> "SocketPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# Shared by api.send/sendp unless a caller passes its own pool
+default_pool = SocketPool()
+atexit.register(default_pool.close)
@@ -0,0 +1,547 @@
+"""Transports: how lab3.api puts packets on a link and reads frames back.
+
+    api.set_transport(RawTransport())              # default: raw sockets
+    api.set_transport(MemoryTransport(SimHost("10.0.0.2", udp={53: dns_answer})))
+    api.set_transport(TapTransport("tap0", ip="10.9.0.2"))
+
+A transport sends IP packets (layer 3) and Ethernet frames (layer 2), and
+opens receivers that yield the frames arriving on an interface, optionally
+narrowed by a capture filter (net.bpf). send/sendp/sr/sr_many/sniff and the
+async variants all go through the current transport, so the same scenario
+runs against the real network, an in-process simulated link, or a TAP
+device. For a veth pair, use RawTransport and name the veth end as the
+interface.
+"""
+
+import asyncio
+import atexit
+import fcntl
+import os
+import select
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from layers import ICMP, IP, TCP, UDP, Ether
+from net.bpf import Insn, attach_filter, compile_filter, run_filter
+from net.sockets import SocketPool, default_pool
+from utils import bytes_to_ip, bytes_to_mac, ip_to_bytes, mac_to_bytes, stats
+
+Buffer = Union[bytes, bytearray, memoryview]
+# One buffer, or several gathered into one packet
+Buffers = Union[Buffer, Sequence[Buffer]]
+
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+LISTEN_RCVBUF = 8 << 20
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33)  # Linux value; not exported by Python
+RECEIVER_QUEUE = 65536
+
+
+def _join(data: Buffers) -> bytes:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data)
+    return b"".join(data)
+
+
+def _compile(filter: Optional[Union[str, List[Insn]]]) -> Optional[List[Insn]]:
+    return compile_filter(filter) if isinstance(filter, str) else filter
+
+
+class Receiver:
+    """Frames arriving on one interface. recv(timeout) returns the next frame,
+    or None once `timeout` seconds pass (0: don't wait, None: wait forever).
+    fileno() turns readable while frames are pending, for select() and
+    event loops.
+    """
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def fileno(self) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Receiver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Transport:
+    """Base class; see the module docstring."""
+
+    def send(self, data: Buffers, dst: str) -> None:
+        """Send a built IP packet to `dst`."""
+        raise NotImplementedError
+
+    def sendp(self, frame: Buffers, interface: Optional[str]) -> None:
+        """Send a built Ethernet frame on `interface`."""
+        raise NotImplementedError
+
+    async def async_send(self, data: Buffers, dst: str) -> None:
+        self.send(data, dst)
+
+    def open(self, interface: Optional[str] = None,
+             filter: Optional[Union[str, List[Insn]]] = None, outgoing: bool = True) -> Receiver:
+        """Start receiving the frames seen on `interface` (None: all). Like
+        tcpdump, that includes frames this host sends where the link shows
+        them (raw sockets); `outgoing=False` skips those, for callers that
+        only want replies.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+# --- raw sockets -------------------------------------------------------------
+
+class SocketReceiver(Receiver):
+    """AF_PACKET socket. Frames this host sent (PACKET_OUTGOING) are
+    returned too, unless `outgoing` is False.
+    """
+
+    def __init__(self, interface: Optional[str] = None, filter: Optional[Union[str, List[Insn]]] = None,
+                 outgoing: bool = True):
+        self.outgoing = outgoing
+        af_packet = getattr(socket, "AF_PACKET", None)
+        if af_packet is None:
+            raise NotImplementedError("Receiving requires Linux (AF_PACKET)")
+        self.sock = socket.socket(af_packet, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            # Bursts of replies overflow the default buffer; FORCE ignores rmem_max (root)
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, LISTEN_RCVBUF)
+            except OSError:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, LISTEN_RCVBUF)
+            if interface:
+                self.sock.bind((interface, 0))
+            if filter:
+                attach_filter(self.sock, filter)
+        except BaseException:
+            self.sock.close()
+            raise
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sock = self.sock
+        while True:
+            if deadline is None:
+                sock.settimeout(None)
+            else:
+                sock.settimeout(max(deadline - time.monotonic(), 0.0))
+            try:
+                frame, addr = sock.recvfrom(65535)
+            except (socket.timeout, BlockingIOError):
+                return None
+            if frame and (self.outgoing or addr[2] != socket.PACKET_OUTGOING):
+                return frame
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+async def _sock_call(loop: asyncio.AbstractEventLoop, sock: socket.socket, func, *args):
+    """Call a non-blocking socket send, waiting for writability while it would block."""
+    while True:
+        try:
+            return func(*args)
+        except BlockingIOError:
+            pass
+        ready = loop.create_future()
+        loop.add_writer(sock, ready.set_result, None)
+        try:
+            await ready
+        finally:
+            loop.remove_writer(sock)
+
+
+class RawTransport(Transport):
+    """The real network: pooled raw sockets for sending (net.sockets) and
+    AF_PACKET sockets for receiving.
+    """
+
+    def __init__(self, pool: Optional[SocketPool] = None):
+        self.pool = pool if pool is not None else default_pool
+        self._async_pool: Optional[SocketPool] = None
+
+    def send(self, data: Buffers, dst: str) -> None:
+        sock = self.pool.get(3)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            sock.sendto(data, (dst, 0))
+        else:
+            sock.sendmsg(data, (), 0, (dst, 0))
+
+    def sendp(self, frame: Buffers, interface: Optional[str]) -> None:
+        sock = self.pool.get(2, interface)
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            sock.send(frame)
+        else:
+            sock.sendmsg(frame)
+
+    async def async_send(self, data: Buffers, dst: str) -> None:
+        if self._async_pool is None:
+            self._async_pool = SocketPool(blocking=False)
+            atexit.register(self._async_pool.close)
+        sock = self._async_pool.get(3)
+        await _sock_call(asyncio.get_running_loop(), sock, sock.sendto, _join(data), (dst, 0))
+
+    def open(self, interface: Optional[str] = None,
+             filter: Optional[Union[str, List[Insn]]] = None, outgoing: bool = True) -> Receiver:
+        return SocketReceiver(interface, filter, outgoing)
+
+    def close(self) -> None:
+        self.pool.close()
+        if self._async_pool is not None:
+            self._async_pool.close()
+
+
+# --- queued delivery (in-memory and TAP) -------------------------------------
+
+class QueueReceiver(Receiver):
+    """Frames pushed by a transport, filtered in userspace (net.bpf.run_filter).
+    A pipe holds one byte while frames are queued, so fileno() works with
+    select() and loop.add_reader(). Frames beyond `maxlen` are dropped and
+    counted in `drops`, like a full socket buffer.
+    """
+
+    def __init__(self, owner: "_QueueTransport", filter: Optional[List[Insn]], maxlen: int):
+        self._owner = owner
+        self._prog = filter
+        self._maxlen = maxlen
+        self._frames: Deque[bytes] = deque()
+        self._lock = threading.Lock()
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        self.drops = 0
+
+    def push(self, frame: bytes) -> None:
+        if self._prog is not None:
+            keep = run_filter(self._prog, frame)
+            if not keep:
+                if stats.ENABLED:
+                    stats.incr("filter.dropped")
+                return
+            frame = frame[:keep]
+        with self._lock:
+            if len(self._frames) >= self._maxlen:
+                self.drops += 1
+                if stats.ENABLED:
+                    stats.incr("rx.queue_full")
+                return
+            self._frames.append(frame)
+            if len(self._frames) == 1:
+                os.write(self._wfd, b"\x00")
+
+    def _pop(self) -> Optional[bytes]:
+        with self._lock:
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            if not self._frames:
+                os.read(self._rfd, 1)
+            return frame
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self._pop()
+            if frame is not None:
+                return frame
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                return None
+            select.select([self._rfd], [], [], wait)
+
+    def fileno(self) -> int:
+        return self._rfd
+
+    def close(self) -> None:
+        if self._rfd < 0:
+            return
+        self._owner._detach(self)
+        os.close(self._rfd)
+        os.close(self._wfd)
+        self._rfd = self._wfd = -1
+
+
+class _QueueTransport(Transport):
+    """Transports that hand incoming frames to their receivers themselves."""
+
+    def __init__(self, interface: str):
+        self.interface = interface
+        self._receivers: List[QueueReceiver] = []
+        self._rx_lock = threading.Lock()
+        self.tx_packets = 0
+        self.rx_packets = 0
+
+    def open(self, interface: Optional[str] = None,
+             filter: Optional[Union[str, List[Insn]]] = None, outgoing: bool = True,
+             maxlen: int = RECEIVER_QUEUE) -> Receiver:
+        # Sent frames are never handed back to receivers here, so `outgoing`
+        # changes nothing
+        if interface not in (None, self.interface):
+            raise OSError(f"no interface {interface!r} on this transport (have {self.interface!r})")
+        rx = QueueReceiver(self, _compile(filter), maxlen)
+        with self._rx_lock:
+            self._receivers = self._receivers + [rx]
+        return rx
+
+    def _detach(self, rx: QueueReceiver) -> None:
+        with self._rx_lock:
+            self._receivers = [r for r in self._receivers if r is not rx]
+
+    def _deliver(self, frame: bytes) -> None:
+        self.rx_packets += 1
+        for rx in self._receivers:  # copy-on-write list, no lock needed
+            rx.push(frame)
+
+
+# --- in-memory link ----------------------------------------------------------
+
+# A UDP service: (payload, client ip, client port) -> reply payload or None
+UDPHandler = Callable[[bytes, str, int], Optional[bytes]]
+# A TCP service: (segment data, client ip, client port) -> reply data
+TCPHandler = Callable[[bytes, str, int], bytes]
+
+
+def _mac_for(ip: str) -> str:
+    # locally administered, stable per address
+    return bytes_to_mac(b"\x02\x00" + ip_to_bytes(ip))
+
+
+class SimHost:
+    """A stub host on a MemoryTransport link. It answers ICMP echo; UDP to a
+    port in `udp` goes to its handler, other UDP gets ICMP port unreachable;
+    TCP ports in `tcp` accept connections (SYN/ACK, then ACK data, answer
+    with the handler's reply if one is given, FIN/ACK on FIN), other ports
+    reset. With `close_after_reply` the host closes first, as an HTTP server
+    does for "Connection: close": a FIN follows each reply, and the client's
+    FIN is then only acknowledged. Sequence numbers are derived from the
+    client's segment; the only TCP state kept is which connections the host
+    has closed.
+    """
+
+    def __init__(self, ip: str, mac: Optional[str] = None,
+                 udp: Optional[Dict[int, UDPHandler]] = None,
+                 tcp: Optional[Union[Iterable[int], Dict[int, Optional[TCPHandler]]]] = None,
+                 ttl: int = 64, close_after_reply: bool = False):
+        self.ip = ip
+        self.mac = mac or _mac_for(ip)
+        self.udp = dict(udp or {})
+        self.tcp = dict(tcp) if isinstance(tcp, dict) else dict.fromkeys(tcp or (), None)
+        self.ttl = ttl
+        self.close_after_reply = close_after_reply
+        # (client ip, client port, port) of connections we sent a FIN on
+        self._closed: Set[Tuple[str, int, int]] = set()
+
+    def _isn(self, pkt: IP, tcp: TCP) -> int:
+        return zlib.crc32(ip_to_bytes(pkt.src_ip) + struct.pack("!HH", tcp.sport, tcp.dport))
+
+    def _reply(self, pkt: IP, l4) -> IP:
+        return IP(src_ip=self.ip, dst_ip=pkt.src_ip, ttl=self.ttl) / l4
+
+    def _unreachable(self, pkt: IP, raw: bytes, code: int) -> IP:
+        quote = raw[:pkt.ihl * 4 + 8]
+        return self._reply(pkt, ICMP(type=3, code=code, data=quote))
+
+    def handle(self, pkt: IP, raw: bytes) -> List[IP]:
+        """Replies to one IP packet addressed to this host."""
+        l4 = pkt.payload
+        if isinstance(l4, ICMP):
+            if l4.type == 8:
+                return [self._reply(pkt, ICMP(type=0, id=l4.id, seq=l4.seq, data=bytes(l4.data)))]
+            return []
+        if isinstance(l4, UDP):
+            handler = self.udp.get(l4.dport)
+            if handler is None:
+                return [self._unreachable(pkt, raw, 3)]
+            start = pkt.ihl * 4 + 8
+            answer = handler(raw[start:pkt.total_len], pkt.src_ip, l4.sport)
+            if answer is None:
+                return []
+            return [self._reply(pkt, UDP(sport=l4.dport, dport=l4.sport, data=answer))]
+        if isinstance(l4, TCP):
+            return self._handle_tcp(pkt, l4)
+        return [self._unreachable(pkt, raw, 2)]  # protocol unreachable
+
+    def _handle_tcp(self, pkt: IP, seg: TCP) -> List[IP]:
+        SYN, FIN, RST, PSH, ACK = 0x02, 0x01, 0x04, 0x08, 0x10
+        if seg.flags & RST:
+            return []
+        data = bytes(seg.data)
+        end = (seg.seq + len(data) + (1 if seg.flags & SYN else 0) + (1 if seg.flags & FIN else 0)) & 0xFFFFFFFF
+
+        def reply(flags: int, seq: int, ack: int, payload: bytes = b"") -> IP:
+            return self._reply(pkt, TCP(sport=seg.dport, dport=seg.sport, seq=seq & 0xFFFFFFFF,
+                                        ack=ack, flags=flags, window=65535, data=payload))
+
+        if seg.dport not in self.tcp:
+            if seg.flags & ACK:
+                return [reply(RST, seg.ack, 0)]
+            return [reply(RST | ACK, 0, end)]
+        conn = (pkt.src_ip, seg.sport, seg.dport)
+        if seg.flags & SYN:
+            self._closed.discard(conn)
+            return [reply(SYN | ACK, self._isn(pkt, seg), end)]
+        out = []
+        seq = seg.ack
+        closing = False
+        if data:
+            handler = self.tcp[seg.dport]
+            answer = handler(data, pkt.src_ip, seg.sport) if handler is not None else b""
+            if answer:
+                out.append(reply(PSH | ACK, seq, end, answer))
+                seq += len(answer)
+                closing = self.close_after_reply
+            else:
+                out.append(reply(ACK, seq, end))
+        if closing:
+            out.append(reply(FIN | ACK, seq, end))
+            if not seg.flags & FIN:
+                self._closed.add(conn)  # the client's FIN is still to come
+        elif seg.flags & FIN:
+            if conn in self._closed:
+                self._closed.discard(conn)
+                out.append(reply(ACK, seq, end))  # ours went out with the reply
+            else:
+                out.append(reply(FIN | ACK, seq, end))
+        return out
+
+
+class MemoryTransport(_QueueTransport):
+    """An in-process link between us and a set of SimHosts. Packets sent at
+    layer 3 (or frames at layer 2) are handed to the host owning their
+    destination address and its replies are queued, already framed, for
+    every open receiver. Delivery is synchronous and lossless, so runs are
+    deterministic and measure only the library's own cost.
+    """
+
+    def __init__(self, *hosts: SimHost, mac: str = "02:00:00:00:00:01", interface: str = "sim0"):
+        super().__init__(interface)
+        self.mac = mac
+        self.hosts: Dict[str, SimHost] = {}
+        for host in hosts:
+            self.add_host(host)
+
+    def add_host(self, host: SimHost) -> None:
+        self.hosts[host.ip] = host
+
+    def send(self, data: Buffers, dst: str) -> None:
+        self.tx_packets += 1
+        self._route(_join(data))
+
+    def sendp(self, frame: Buffers, interface: Optional[str]) -> None:
+        if interface not in (None, self.interface):
+            raise OSError(f"no interface {interface!r} on this transport (have {self.interface!r})")
+        self.tx_packets += 1
+        frame = _join(frame)
+        if len(frame) >= 34 and struct.unpack_from("!H", frame, 12)[0] == ETH_P_IP:
+            self._route(frame[14:])
+
+    def _route(self, raw: bytes) -> None:
+        if len(raw) < 20:
+            return
+        host = self.hosts.get(bytes_to_ip(raw[16:20]))
+        if host is None:
+            return
+        try:
+            pkt = IP(raw=raw)
+        except Exception:
+            return
+        for reply in host.handle(pkt, raw):
+            self._deliver((Ether(src_mac=host.mac, dst_mac=self.mac) / reply).build())
+
+
+# --- TAP device --------------------------------------------------------------
+
+TUNSETIFF = 0x400454CA
+IFF_TAP = 0x0002
+IFF_NO_PI = 0x1000
+SIOCGIFHWADDR = 0x8927
+
+
+class TapTransport(_QueueTransport):
+    """A TAP device, with us as the host on its far side: frames we send
+    enter the kernel as if they arrived on `name`, and frames the kernel
+    sends out of `name` are read by a background thread and queued for
+    receivers. With `ip` set we answer ARP for that address so the kernel
+    can reach us. The device must be up and addressed, e.g.:
+
+        ip addr add 10.9.0.1/24 dev tap0 && ip link set tap0 up
+    """
+
+    def __init__(self, name: str = "tap0", ip: Optional[str] = None,
+                 mac: str = "02:00:00:00:00:02"):
+        super().__init__(name)
+        self.ip = ip
+        self.mac = mac
+        self._fd = os.open("/dev/net/tun", os.O_RDWR)
+        try:
+            fcntl.ioctl(self._fd, TUNSETIFF, struct.pack("16sH", name.encode(), IFF_TAP | IFF_NO_PI))
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                ifr = fcntl.ioctl(s, SIOCGIFHWADDR, struct.pack("256s", name.encode()))
+            self.peer_mac = bytes_to_mac(ifr[18:24])  # the kernel side of the device
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._stop_r, self._stop_w = os.pipe()
+        self._reader = threading.Thread(target=self._read_loop, name=f"tap-{name}", daemon=True)
+        self._reader.start()
+
+    def send(self, data: Buffers, dst: str) -> None:
+        self.sendp([mac_to_bytes(self.peer_mac) + mac_to_bytes(self.mac) + b"\x08\x00", _join(data)], None)
+
+    def sendp(self, frame: Buffers, interface: Optional[str]) -> None:
+        if interface not in (None, self.interface):
+            raise OSError(f"no interface {interface!r} on this transport (have {self.interface!r})")
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            os.write(self._fd, frame)
+        else:
+            os.writev(self._fd, frame)
+        self.tx_packets += 1
+
+    def _read_loop(self) -> None:
+        while True:
+            ready, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in ready:
+                return
+            try:
+                frame = os.read(self._fd, 65535)
+            except OSError:
+                return
+            if self.ip is not None and self._answer_arp(frame):
+                continue
+            self._deliver(frame)
+
+    def _answer_arp(self, frame: bytes) -> bool:
+        # ARP request (op 1) for our address -> reply (op 2)
+        if len(frame) < 42 or struct.unpack_from("!H", frame, 12)[0] != ETH_P_ARP:
+            return False
+        if struct.unpack_from("!H", frame, 20)[0] != 1 or frame[38:42] != ip_to_bytes(self.ip):
+            return False
+        mine, theirs = mac_to_bytes(self.mac), frame[22:28]
+        arp = struct.pack("!HHBBH6s4s6s4s", 1, ETH_P_IP, 6, 4, 2, mine, frame[38:42], theirs, frame[28:32])
+        os.write(self._fd, theirs + mine + struct.pack("!H", ETH_P_ARP) + arp)
+        return True
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        os.write(self._stop_w, b"\x00")
+        self._reader.join()
+        for fd in (self._fd, self._stop_r, self._stop_w):
+            os.close(fd)
+        self._fd = -1
@@ -0,0 +1,321 @@
+"""Reading and writing capture files (classic pcap and pcapng).
+
+    pkts = rdpcap("trace.pcapng")             # list of Ether stacks
+    wrpcap("out.pcap", pkts)
+
+    with PcapReader("big.pcap") as rd:        # zero-copy streaming
+        for ts, frame in rd:                  # frame: memoryview into the file
+            ip = Ether(raw=frame).getlayer(IP)
+
+    with PcapWriter("cap.pcap") as wr:        # buffered, flushed in bulk
+        for pkt in sniff_iter(...):
+            wr.write(pkt)
+
+Readers mmap the file; a record view stays valid until the reader is
+closed. Both byte orders and micro/nanosecond classic pcap are read; for
+pcapng, Enhanced and Simple Packet Blocks are read (per-interface link
+type and timestamp resolution) and other blocks are skipped.
+rd.records(LINKTYPE_ETHERNET) raises PcapError at a frame of any other link
+type, so raw-IP, Linux SLL or loopback captures are refused rather than
+misread as Ethernet.
+"""
+
+import mmap
+import os
+import struct
+import time
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from layers import Ether
+from layers.base import BaseLayer
+
+LINKTYPE_ETHERNET = 1
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BOM = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+IDB_TSRESOL = 9
+
+_PCAP_HDR = "IHHiIII"   # magic, major, minor, thiszone, sigfigs, snaplen, linktype
+_PCAP_REC = "IIII"      # ts_sec, ts_frac, incl_len, orig_len
+
+Record = Tuple[float, memoryview]
+Writable = Union[BaseLayer, bytes, bytearray, memoryview, Tuple[float, Union[BaseLayer, bytes, bytearray, memoryview]]]
+
+
+class PcapError(ValueError):
+    pass
+
+
+class PcapReader:
+    """Iterate over (timestamp, frame view) records of a pcap or pcapng file."""
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.name = os.fspath(path)
+        self._file = open(path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < 4:
+                raise PcapError(f"{path}: not a capture file")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.close()
+            raise
+        self._view = memoryview(self._map)
+        magic = self._view[:4].tobytes()
+        if magic == PCAPNG_SHB.to_bytes(4, "little"):
+            self.format = "pcapng"
+            self._records = self._pcapng_records
+            self.linktype = None  # per interface, see interfaces
+        else:
+            self.format = "pcap"
+            self._records = self._pcap_records
+            self._init_pcap(path)
+        self.interfaces: List[Tuple[int, float]] = []  # pcapng: (linktype, seconds per tick)
+
+    def _init_pcap(self, path) -> None:
+        for order in "<>":
+            magic = struct.unpack_from(order + "I", self._map, 0)[0]
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                break
+        else:
+            raise PcapError(f"{path}: unknown capture file magic")
+        if len(self._map) < struct.calcsize(_PCAP_HDR):
+            raise PcapError(f"{path}: truncated pcap header")
+        hdr = struct.unpack_from(order + _PCAP_HDR, self._map, 0)
+        self.byteorder = order
+        self.nanosecond = magic == PCAP_MAGIC_NS
+        self.snaplen = hdr[5]
+        self.linktype = hdr[6] & 0x0FFFFFFF
+
+    def _pcap_records(self) -> Iterator[Record]:
+        rec = struct.Struct(self.byteorder + _PCAP_REC)
+        scale = 1e-9 if self.nanosecond else 1e-6
+        buf, view = self._map, self._view
+        pos = struct.calcsize(_PCAP_HDR)
+        end = len(buf)
+        while pos + rec.size <= end:
+            sec, frac, incl, _orig = rec.unpack_from(buf, pos)
+            pos += rec.size
+            if pos + incl > end:
+                break  # truncated last record
+            yield sec + frac * scale, view[pos:pos + incl]
+            pos += incl
+
+    def _pcapng_records(self, require: Optional[int] = None) -> Iterator[Record]:
+        buf, view = self._map, self._view
+        end = len(buf)
+        pos = 0
+        order = "<"
+        while pos + 12 <= end:
+            btype = struct.unpack_from(order + "I", buf, pos)[0]
+            if btype == PCAPNG_SHB:
+                # a new section: byte order and interfaces start over
+                bom = struct.unpack_from("<I", buf, pos + 8)[0]
+                order = "<" if bom == PCAPNG_BOM else ">"
+                if struct.unpack_from(order + "I", buf, pos + 8)[0] != PCAPNG_BOM:
+                    raise PcapError("bad pcapng byte-order magic")
+                self.interfaces = []
+            blen = struct.unpack_from(order + "I", buf, pos + 4)[0]
+            if blen < 12 or pos + blen > end:
+                break  # truncated block
+            body = pos + 8
+            if btype == PCAPNG_EPB:
+                iface, ts_hi, ts_lo, cap, _orig = struct.unpack_from(order + "IIIII", buf, body)
+                tick = self.interfaces[iface][1] if iface < len(self.interfaces) else 1e-6
+                if require is not None:
+                    self._check_interface(iface, require)
+                data = body + 20
+                yield ((ts_hi << 32) | ts_lo) * tick, view[data:data + cap]
+            elif btype == PCAPNG_SPB:
+                if require is not None:
+                    self._check_interface(0, require)  # SPBs belong to the first interface
+                orig = struct.unpack_from(order + "I", buf, body)[0]
+                cap = min(orig, blen - 16)
+                yield 0.0, view[body + 4:body + 4 + cap]
+            elif btype == PCAPNG_IDB:
+                linktype = struct.unpack_from(order + "H", buf, body)[0]
+                self.interfaces.append((linktype, self._tsresol(order, body + 8, pos + blen - 4)))
+            pos += blen
+
+    def _tsresol(self, order: str, pos: int, end: int) -> float:
+        """Seconds per timestamp tick from an IDB's options (default: microseconds)."""
+        buf = self._map
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(order + "HH", buf, pos)
+            if code == 0:
+                break
+            if code == IDB_TSRESOL and length >= 1:
+                v = buf[pos + 4]
+                return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+            pos += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+    def _check_interface(self, iface: int, linktype: int) -> None:
+        if iface >= len(self.interfaces):
+            raise PcapError(f"{self.name}: record on undeclared interface {iface}")
+        if self.interfaces[iface][0] != linktype:
+            raise PcapError(f"{self.name}: interface {iface} has link type {self.interfaces[iface][0]}, "
+                            f"not {linktype}")
+
+    def records(self, linktype: Optional[int] = None) -> Iterator[Record]:
+        """Iterate over the records; with `linktype`, raise PcapError at the
+        first record of another link type (for classic pcap, right away).
+        """
+        if linktype is None:
+            return self._records()
+        if self.format == "pcap":
+            if self.linktype != linktype:
+                raise PcapError(f"{self.name}: link type {self.linktype}, not {linktype}")
+            return self._pcap_records()
+        return self._pcapng_records(linktype)
+
+    def __iter__(self) -> Iterator[Record]:
+        return self._records()
+
+    def close(self) -> None:
+        view = getattr(self, "_view", None)
+        if view is not None:
+            view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # record views still referenced; unmapped when they go away
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> "PcapReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PcapWriter:
+    """Write frames to a capture file through an in-memory buffer that is
+    flushed with one write() per `buffer_size` bytes. `pcapng=True` writes a
+    pcapng section with one interface; otherwise classic pcap (`nanosecond`
+    picks the timestamp precision). `append=True` continues an existing
+    classic pcap file with a matching header.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], linktype: int = LINKTYPE_ETHERNET,
+                 snaplen: int = 65535, nanosecond: bool = False, pcapng: bool = False,
+                 append: bool = False, buffer_size: int = 1 << 20):
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.nanosecond = nanosecond
+        self.pcapng = pcapng
+        self.buffer_size = buffer_size
+        self._buf = bytearray()
+        self._rec = struct.Struct("<IIII")
+        self._epb = struct.Struct("<IIIIIII")
+
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            if pcapng:
+                raise PcapError("appending is only supported for classic pcap")
+            with PcapReader(path) as rd:
+                if rd.format != "pcap" or rd.linktype != linktype or rd.byteorder != "<":
+                    raise PcapError(f"{path}: existing header does not match")
+                self.nanosecond = rd.nanosecond
+        self._file: BinaryIO = open(path, "ab" if exists else "wb")
+        if not exists:
+            self._write_header()
+
+    def _write_header(self) -> None:
+        if self.pcapng:
+            # SHB (no options, unknown section length) + one IDB
+            self._buf += struct.pack("<IIIHHqI", PCAPNG_SHB, 28, PCAPNG_BOM, 1, 0, -1, 28)
+            if self.nanosecond:
+                self._buf += struct.pack("<IIHHIHHB3xHHI", PCAPNG_IDB, 32, self.linktype, 0,
+                                         self.snaplen, IDB_TSRESOL, 1, 9, 0, 0, 32)
+            else:
+                self._buf += struct.pack("<IIHHII", PCAPNG_IDB, 20, self.linktype, 0, self.snaplen, 20)
+        else:
+            magic = PCAP_MAGIC_NS if self.nanosecond else PCAP_MAGIC_US
+            self._buf += struct.pack("<" + _PCAP_HDR, magic, 2, 4, 0, 0, self.snaplen, self.linktype)
+
+    def write(self, pkt: Writable, ts: Optional[float] = None) -> None:
+        """Append one frame: a layer stack, raw bytes, or a (timestamp, frame)
+        pair. Without a timestamp the current time is used.
+        """
+        if isinstance(pkt, tuple):
+            ts, pkt = pkt
+        data = pkt.build() if isinstance(pkt, BaseLayer) else pkt
+        if ts is None:
+            ts = time.time()
+        orig = len(data)
+        if orig > self.snaplen:
+            data = data[:self.snaplen]
+        incl = len(data)
+        buf = self._buf
+        if self.pcapng:
+            ticks = int(round(ts * (1e9 if self.nanosecond else 1e6)))
+            pad = -incl % 4
+            blen = 32 + incl + pad
+            buf += self._epb.pack(PCAPNG_EPB, blen, 0, ticks >> 32, ticks & 0xFFFFFFFF, incl, orig)
+            buf += data
+            buf += b"\x00" * pad + blen.to_bytes(4, "little")
+        else:
+            sec = int(ts)
+            frac = int(round((ts - sec) * (1e9 if self.nanosecond else 1e6)))
+            if frac >= (1_000_000_000 if self.nanosecond else 1_000_000):
+                sec, frac = sec + 1, 0
+            buf += self._rec.pack(sec, frac, incl, orig)
+            buf += data
+        if len(buf) >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, pkts: Iterable[Writable]) -> None:
+        for pkt in pkts:
+            self.write(pkt)
+
+    def flush(self) -> None:
+        if self._buf:
+            self._file.write(self._buf)
+            self._buf.clear()
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "PcapWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def rdpcap(path: Union[str, os.PathLike], count: int = -1, lazy: bool = False) -> List[Ether]:
+    """Read up to `count` frames (-1: all) into Ether stacks.
+    The packets own their bytes, so they outlive the file mapping. Frames of
+    any link type but Ethernet raise PcapError.
+    """
+    pkts: List[Ether] = []
+    if count == 0:
+        return pkts
+    with PcapReader(path) as rd:
+        for _, frame in rd.records(LINKTYPE_ETHERNET):
+            # eager decoding copies what it keeps; lazy decoding keeps a view
+            pkts.append(Ether(raw=bytes(frame) if lazy else frame, lazy=lazy))
+            del frame
+            if len(pkts) == count:
+                break  # without reading (and checking) one record too many
+    return pkts
+
+
+def wrpcap(path: Union[str, os.PathLike], pkts: Iterable[Writable], linktype: int = LINKTYPE_ETHERNET,
+           pcapng: bool = False, nanosecond: bool = False) -> None:
+    """Write `pkts` (layer stacks, bytes, or (timestamp, frame) pairs) to `path`."""
+    with PcapWriter(path, linktype=linktype, pcapng=pcapng, nanosecond=nanosecond) as wr:
+        wr.write_many(pkts)
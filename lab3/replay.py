@@ -0,0 +1,152 @@
+"""Replay a capture file onto an interface through api.sendp.
+
+    report = replay("trace.pcap", "veth0")              # original timing
+    report = replay("trace.pcap", "veth0", speed=4)     # 4x faster
+    report = replay("trace.pcap", "veth0", pps=10000)   # fixed packet rate
+    report = replay("trace.pcap", "veth0", mbps=100)    # fixed bit rate
+    report = replay("trace.pcap", "veth0", topspeed=True)
+    print(report)
+
+Every frame gets an absolute send time on the monotonic clock, computed
+from the start of the replay, so delays do not accumulate the way repeated
+sleep() calls do. The wait sleeps until shortly before the deadline and
+spins for the rest. The report gives the achieved rate and how far sends
+landed from their deadlines.
+
+Usage (from lab3/):  python replay.py trace.pcap veth0 [--speed X | --pps N | --mbps M | --topspeed]
+"""
+
+import argparse
+import time
+from typing import Iterable, NamedTuple, Optional, Tuple, Union
+
+from api import Sender, default_sender
+from pcap import LINKTYPE_ETHERNET, PcapError, PcapReader
+
+# Sleep until this long before a deadline, then spin: sleep() overshoots by
+# up to a scheduler tick, spinning is exact but burns CPU
+SPIN = 0.002
+TOPSPEED_BATCH = 256
+
+
+class ReplayReport(NamedTuple):
+    packets: int
+    bytes: int
+    failed: int
+    duration: float      # seconds from the first send to the last
+    pps: float
+    mbps: float
+    mean_error: float    # mean |send time - deadline|, seconds
+    max_error: float     # worst lateness (or earliness), seconds
+
+    def __str__(self) -> str:
+        return (f"{self.packets} packets ({self.failed} failed), {self.bytes} bytes in {self.duration:.3f}s: "
+                f"{self.pps:.0f} pps, {self.mbps:.2f} Mbps; timing error mean {self.mean_error * 1e6:.1f} us, "
+                f"max {self.max_error * 1e6:.1f} us")
+
+
+def _wait_until(deadline: float) -> float:
+    now = time.monotonic()
+    if deadline - now > SPIN:
+        time.sleep(deadline - now - SPIN)
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            return now
+
+
+def replay(source: Union[str, Iterable[Tuple[float, bytes]]], interface: str, speed: float = 1.0,
+           pps: Optional[float] = None, mbps: Optional[float] = None, topspeed: bool = False,
+           sender: Optional[Sender] = None) -> ReplayReport:
+    """Send the frames of `source` (a capture file path, or (timestamp, frame)
+    pairs) on `interface`. By default the original inter-packet gaps are
+    kept, divided by `speed`; `pps` or `mbps` instead pace frames at a fixed
+    rate, and `topspeed` sends as fast as possible in batches. Capture
+    files must hold Ethernet frames only (PcapError otherwise).
+    """
+    if (pps is not None) + (mbps is not None) + bool(topspeed) > 1:
+        raise ValueError("choose at most one of pps, mbps and topspeed")
+    if speed <= 0 or (pps is not None and pps <= 0) or (mbps is not None and mbps <= 0):
+        raise ValueError("speed, pps and mbps must be positive")
+    sender = sender if sender is not None else default_sender
+    reader = None
+    if isinstance(source, str):
+        reader = PcapReader(source)
+        try:
+            # classic pcap fails here; pcapng at the first record of a
+            # non-Ethernet interface, before it is sent
+            records: Iterable[Tuple[float, bytes]] = reader.records(LINKTYPE_ETHERNET)
+        except PcapError:
+            reader.close()
+            raise
+    else:
+        records = source
+
+    packets = nbytes = failed = 0
+    err_sum = err_max = 0.0
+    start = first_ts = None
+    last = 0.0
+    try:
+        if topspeed:
+            batch = []
+            start = time.monotonic()
+            for _, frame in records:
+                batch.append(frame)
+                nbytes += len(frame)
+                if len(batch) == TOPSPEED_BATCH:
+                    failed += sum(e is not None for e in sender.sendp_many(batch, interface, verbose=False))
+                    packets += len(batch)
+                    batch = []
+            if batch:
+                failed += sum(e is not None for e in sender.sendp_many(batch, interface, verbose=False))
+                packets += len(batch)
+            last = time.monotonic()
+        else:
+            for ts, frame in records:
+                if start is None:
+                    start, first_ts = time.monotonic(), ts
+                if pps is not None:
+                    deadline = start + packets / pps
+                elif mbps is not None:
+                    deadline = start + nbytes * 8 / (mbps * 1e6)
+                else:
+                    deadline = start + (ts - first_ts) / speed
+                now = _wait_until(deadline)
+                try:
+                    sender.sendp(frame, interface, verbose=False)
+                except OSError:
+                    failed += 1
+                last = time.monotonic()
+                err = abs(now - deadline)
+                err_sum += err
+                if err > err_max:
+                    err_max = err
+                packets += 1
+                nbytes += len(frame)
+    finally:
+        if reader is not None:
+            reader.close()
+
+    duration = last - start if start is not None else 0.0
+    rate = packets / duration if duration > 0 else 0.0
+    return ReplayReport(packets, nbytes, failed, duration, rate,
+                        nbytes * 8 / duration / 1e6 if duration > 0 else 0.0,
+                        err_sum / packets if packets and not topspeed else 0.0, err_max)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a pcap/pcapng file onto an interface")
+    parser.add_argument("file")
+    parser.add_argument("interface")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--speed", type=float, default=1.0, help="multiplier for the original timing")
+    group.add_argument("--pps", type=float, help="fixed packets per second")
+    group.add_argument("--mbps", type=float, help="fixed megabits per second")
+    group.add_argument("--topspeed", action="store_true", help="send as fast as possible")
+    args = parser.parse_args()
+    print(replay(args.file, args.interface, speed=args.speed, pps=args.pps, mbps=args.mbps,
+                 topspeed=args.topspeed))
+
+
+if __name__ == "__main__":
+    main()
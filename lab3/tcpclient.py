@@ -0,0 +1,731 @@
+"""A userspace TCP client built on layers.TCP and the api transports.
+
+    with TCPConnection("10.9.0.2", "10.9.0.1", 8000) as conn:
+        conn.sendall(b"GET /big.bin HTTP/1.0\\r\\n\\r\\n")
+        reply = conn.read_all()
+
+    status, headers, body = http_get("http://10.9.0.1:8000/big.bin", src_ip="10.9.0.2")
+
+The engine runs in the caller's thread: connect/sendall/recv/close process
+incoming segments and timers until they can return. It covers the client
+side of RFC 9293:
+
+    handshake      MSS and window-scale options (RFC 7323)
+    sending        sliding window bounded by the peer's window and a
+                   NewReno congestion window: slow start, congestion
+                   avoidance, fast retransmit on three duplicate ACKs
+    retransmission timeout from the smoothed RTT (RFC 6298), Karn's rule,
+                   exponential backoff, zero-window probes (for as
+                   long as the peer answers them, RFC 9293 3.8.6.1)
+    receiving      out-of-order reassembly, delayed ACKs (every second
+                   full segment or after 40 ms; segments that arrive
+                   together share one ACK), immediate duplicate ACKs while
+                   there is a hole
+    teardown       FIN from either side; RST raises ConnectionResetError
+
+Not implemented: SACK, timestamps, urgent data, listening, TIME_WAIT (close()
+returns once both FINs are acknowledged).
+
+Pure ACKs, which are most of what a download sends, are rewritten in place
+in a PacketTemplate rather than rebuilt.
+
+The kernel must not own the client address, or it resets the connection
+as soon as the SYN/ACK arrives. Either use a TAP device, with the address
+on our side of the link (TapTransport answers ARP for it):
+
+    ip tuntap add tap0 mode tap && ip addr add 10.9.0.1/24 dev tap0 && ip link set tap0 up
+    api.set_transport(TapTransport("tap0", ip="10.9.0.2"))
+
+or keep raw sockets on a veth end that has no address of its own (route
+the subnet to it and add static neighbour entries on both sides), and pass
+it as `interface`. Failing both, drop the kernel's resets as test_all.py
+does:
+
+    iptables -A OUTPUT -p tcp --tcp-flags RST RST -j DROP
+
+Usage (from lab3/):  python tcpclient.py URL --src-ip IP [--tap DEV | --interface IF] [-o FILE]
+"""
+
+import argparse
+import bisect
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from api import get_transport
+from layers import IP, TCP
+from net.transport import TapTransport, Transport
+from template import PacketTemplate
+
+FIN, SYN, RST, PSH, ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+CLOSED = "CLOSED"
+SYN_SENT = "SYN_SENT"
+ESTABLISHED = "ESTABLISHED"
+FIN_WAIT_1 = "FIN_WAIT_1"
+FIN_WAIT_2 = "FIN_WAIT_2"
+CLOSING = "CLOSING"
+TIME_WAIT = "TIME_WAIT"
+CLOSE_WAIT = "CLOSE_WAIT"
+LAST_ACK = "LAST_ACK"
+
+INITIAL_RTO = 1.0
+MIN_RTO = 0.2
+MAX_RTO = 60.0
+MAX_RETRIES = 8      # consecutive unanswered timeouts before giving up
+DELAYED_ACK = 0.04
+INITIAL_CWND = 10    # segments (RFC 6928)
+RX_BATCH = 64        # frames handled between timer checks
+
+_SEQ_MASK = 0xFFFFFFFF
+_DF = 0x4000
+
+
+def _unwrap(wire: int, ref: int) -> int:
+    """Absolute sequence number nearest `ref` whose low 32 bits are `wire`."""
+    return ref + ((wire - ref + 0x80000000) & _SEQ_MASK) - 0x80000000
+
+
+def _parse_options(options: bytes) -> Dict[int, bytes]:
+    found = {}
+    i = 0
+    while i < len(options):
+        kind = options[i]
+        if kind == 0:  # end of list
+            break
+        if kind == 1:  # NOP
+            i += 1
+            continue
+        if i + 1 >= len(options) or options[i + 1] < 2:
+            break
+        length = options[i + 1]
+        found[kind] = options[i + 2:i + length]
+        i += length
+    return found
+
+
+class TCPConnection:
+    """One client connection from `src_ip`:`sport` to `dst_ip`:`dport`.
+    `rcvbuf` bounds received data not yet read and sets the window scale
+    we offer; `interface` narrows the receiver (RawTransport). Sends and
+    receives through `transport`, by default api.get_transport().
+    """
+
+    def __init__(self, src_ip: str, dst_ip: str, dport: int, sport: Optional[int] = None,
+                 interface: Optional[str] = None, mss: int = 1460, rcvbuf: int = 4 << 20,
+                 transport: Optional[Transport] = None):
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.dport = dport
+        self.sport = sport if sport is not None else random.randint(49152, 65535)
+        self.interface = interface
+        self.transport = transport if transport is not None else get_transport()
+        self.state = CLOSED
+
+        # Sequence numbers are kept unwrapped (absolute) and masked on the wire
+        self.iss = random.getrandbits(32)
+        self.snd_una = self.snd_nxt = self.iss
+        self.snd_wnd = 0
+        self.snd_wscale = 0
+        self.snd_mss = 536  # until the peer's SYN says otherwise
+        self._sbuf = bytearray()  # unacknowledged and unsent data
+        self._sbuf_seq = self.iss + 1  # sequence number of _sbuf[0]
+        self._fin_queued = False
+        self._fin_seq: Optional[int] = None
+        self.cwnd = 0
+        self.ssthresh = 1 << 30
+        self._dupacks = 0
+        self._recover: Optional[int] = None  # snd_nxt when fast recovery began
+
+        self.rcv_mss = mss
+        self.rcvbuf = rcvbuf
+        self.rcv_wscale = 0
+        while self.rcv_wscale < 14 and rcvbuf >> self.rcv_wscale > 0xFFFF:
+            self.rcv_wscale += 1
+        self.irs = 0
+        self.rcv_nxt = 0
+        self._rcv_edge = 0  # rcv_nxt + the window last advertised
+        self._rbuf = bytearray()  # in-order data not yet read
+        # Segments beyond a hole, as sorted non-overlapping intervals
+        self._ooo_starts: List[int] = []
+        self._ooo_chunks: List[bytes] = []
+        self._fin_at: Optional[int] = None
+        self.eof = False
+        self._ack_pending = 0  # bytes received since our last ACK
+        self._ack_due = False  # ACK at the end of the current batch of frames
+
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+        self._retries = 0
+        self._probe_seq: Optional[int] = None  # byte sent as a zero-window probe
+        self._rtt_seq: Optional[int] = None  # segment being timed, and when it was sent
+        self._rtt_sent = 0.0
+        self._rto_at: Optional[float] = None
+        self._delack_at: Optional[float] = None
+
+        self.retransmits = 0
+        self._error: Optional[Exception] = None
+        self._rx = None
+        self._ack_tpl = PacketTemplate(IP(src_ip=src_ip, dst_ip=dst_ip, flags_frag=_DF)
+                                       / TCP(sport=self.sport, dport=dport, flags=ACK, window=0))
+
+    def __repr__(self) -> str:
+        return f"<TCPConnection {self.src_ip}:{self.sport} > {self.dst_ip}:{self.dport} {self.state}>"
+
+    # --- user calls --------------------------------------------------------
+
+    def connect(self, timeout: Optional[float] = 10.0) -> None:
+        if self.state != CLOSED:
+            raise OSError(f"connect() in state {self.state}")
+        self._rx = self.transport.open(
+            self.interface,
+            f"tcp and src host {self.dst_ip} and src port {self.dport} and dst port {self.sport}")
+        self.state = SYN_SENT
+        self.snd_nxt = self.iss + 1
+        self._send_syn()
+        if not self._wait(lambda: self.state != SYN_SENT, timeout):
+            self._abort()
+            raise TimeoutError(f"connect to {self.dst_ip}:{self.dport} timed out")
+
+    def sendall(self, data: bytes, timeout: Optional[float] = None) -> None:
+        """Queue `data` and return once all of it has been sent (not
+        necessarily acknowledged).
+        """
+        if self.state not in (ESTABLISHED, CLOSE_WAIT) or self._fin_queued:
+            self._check()
+            raise OSError(f"sendall() in state {self.state}")
+        self._sbuf += data
+        self._output()
+        if not self._wait(lambda: self.snd_nxt >= self._sbuf_seq + len(self._sbuf), timeout):
+            raise TimeoutError("sendall timed out")
+
+    def recv(self, max_bytes: int = 65536, timeout: Optional[float] = None) -> bytes:
+        """Up to `max_bytes` of received data; b"" once the peer has closed."""
+        if not self._rbuf and not self.eof:
+            if self.state == CLOSED:
+                self._check()
+                raise OSError("recv() on a closed connection")
+            if not self._wait(lambda: bool(self._rbuf) or self.eof, timeout):
+                raise TimeoutError("recv timed out")
+        if len(self._rbuf) <= max_bytes:
+            data = bytes(self._rbuf)
+            self._rbuf.clear()
+        else:
+            with memoryview(self._rbuf) as view:
+                data = bytes(view[:max_bytes])
+            del self._rbuf[:max_bytes]
+        self._window_update()
+        return data
+
+    def read_all(self, timeout: Optional[float] = None) -> bytes:
+        """Everything until the peer closes its side."""
+        chunks = []
+        while True:
+            data = self.recv(self.rcvbuf, timeout)
+            if not data:
+                return b"".join(chunks)
+            chunks.append(data)
+
+    def shutdown(self) -> None:
+        """Half-close: send our FIN after any queued data; recv() still works."""
+        if self.state in (CLOSED, SYN_SENT):
+            self._check()
+            raise OSError(f"shutdown() in state {self.state}")
+        if not self._fin_queued:
+            self._fin_queued = True
+            self._output()
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Send our FIN after any queued data and wait until both directions
+        are closed (or `timeout`, after which the connection is reset).
+        """
+        if self.state in (CLOSED, SYN_SENT):
+            self._abort()
+            return
+        self.shutdown()
+        if not self._wait(lambda: self.state in (CLOSED, TIME_WAIT), timeout):
+            self._send_segment(self.snd_nxt, RST | ACK)
+            self._abort()
+            return
+        self._abort()
+
+    def __enter__(self) -> "TCPConnection":
+        if self.state == CLOSED:
+            self.connect()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._error is None:
+            self.close()
+        else:
+            self._abort()
+
+    # --- event loop --------------------------------------------------------
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _wait(self, done: Callable[[], bool], timeout: Optional[float]) -> bool:
+        """Handle frames and timers until done() (True) or `timeout` (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        rx = self._rx
+        while True:
+            self._check()
+            if done():
+                return True
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return False
+            wake = deadline
+            for at in (self._rto_at, self._delack_at):
+                if at is not None and (wake is None or at < wake):
+                    wake = at
+            frame = rx.recv(None if wake is None else max(wake - now, 0.0))
+            handled = 0
+            while frame is not None:
+                self._input(frame)
+                handled += 1
+                if handled == RX_BATCH or self.state == CLOSED:
+                    break
+                frame = rx.recv(0)
+            if self._ack_due and self.state != CLOSED:
+                self._send_ack()
+            self._timers(time.monotonic())
+
+    def _timers(self, now: float) -> None:
+        if self._delack_at is not None and now >= self._delack_at:
+            self._send_ack()
+        if self._rto_at is not None and now >= self._rto_at:
+            self._on_rto()
+
+    def _abort(self, error: Optional[Exception] = None) -> None:
+        self.state = CLOSED
+        self._rto_at = self._delack_at = None
+        if error is not None and self._error is None:
+            self._error = error
+        if self._rx is not None:
+            self._rx.close()
+            self._rx = None
+
+    # --- output ------------------------------------------------------------
+
+    def _window_field(self) -> int:
+        """Receive window for the next segment; the right edge never moves left."""
+        edge = self.rcv_nxt + max(self.rcvbuf - len(self._rbuf), 0)
+        if edge < self._rcv_edge:
+            edge = self._rcv_edge
+        shift = self.rcv_wscale
+        field = min((edge - self.rcv_nxt + (1 << shift) - 1) >> shift, 0xFFFF)
+        self._rcv_edge = self.rcv_nxt + (field << shift)
+        return field
+
+    def _sent_ack(self) -> None:
+        self._ack_pending = 0
+        self._ack_due = False
+        self._delack_at = None
+
+    def _send_ack(self) -> None:
+        tpl = self._ack_tpl
+        tpl["tcp.seq"] = self.snd_nxt & _SEQ_MASK
+        tpl["tcp.ack"] = self.rcv_nxt & _SEQ_MASK
+        tpl["tcp.window"] = self._window_field()
+        self.transport.send(tpl.l3, self.dst_ip)
+        self._sent_ack()
+
+    def _send_segment(self, seq: int, flags: int, data: bytes = b"", options: bytes = b"") -> None:
+        if flags & SYN:
+            window = min(self.rcvbuf, 0xFFFF)  # never scaled in a SYN
+        else:
+            window = self._window_field()
+        tcp = TCP(sport=self.sport, dport=self.dport, seq=seq & _SEQ_MASK,
+                  ack=self.rcv_nxt & _SEQ_MASK if flags & ACK else 0, flags=flags, window=window, data=data)
+        if options:
+            tcp.options = options
+            tcp.offset = 5 + len(options) // 4
+        pkt = IP(src_ip=self.src_ip, dst_ip=self.dst_ip, flags_frag=_DF) / tcp
+        self.transport.send(pkt.build(), self.dst_ip)
+        if flags & ACK:
+            self._sent_ack()
+
+    def _send_syn(self) -> None:
+        # MSS, then NOP + window scale: 8 bytes, already 32-bit aligned
+        options = bytes([2, 4]) + self.rcv_mss.to_bytes(2, "big") + bytes([1, 3, 3, self.rcv_wscale])
+        self._send_segment(self.iss, SYN, options=options)
+        if self._rto_at is None:
+            self._rto_at = time.monotonic() + self.rto
+        if self._retries == 0:
+            self._rtt_seq, self._rtt_sent = self.iss, time.monotonic()
+
+    def _output(self) -> None:
+        """Send queued data (and a queued FIN) as far as the windows allow."""
+        if self.state not in (ESTABLISHED, CLOSE_WAIT):
+            return
+        end = self._sbuf_seq + len(self._sbuf)
+        limit = self.snd_una + min(self.snd_wnd, self.cwnd)
+        mss = self.snd_mss
+        while self.snd_nxt < end:
+            size = min(mss, end - self.snd_nxt, limit - self.snd_nxt)
+            if size <= 0:
+                break
+            # Sender-side silly window avoidance: hold a runt while data is in flight
+            if size < mss and size < end - self.snd_nxt and self.snd_nxt > self.snd_una:
+                break
+            start = self.snd_nxt - self._sbuf_seq
+            last = self.snd_nxt + size == end
+            self._send_segment(self.snd_nxt, ACK | PSH if last else ACK, bytes(self._sbuf[start:start + size]))
+            if self._rtt_seq is None:
+                self._rtt_seq, self._rtt_sent = self.snd_nxt, time.monotonic()
+            self.snd_nxt += size
+        if self._fin_queued and self._fin_seq is None and self.snd_nxt == end:
+            self._fin_seq = end
+            self._send_segment(end, FIN | ACK)
+            self.snd_nxt = end + 1
+            self.state = FIN_WAIT_1 if self.state == ESTABLISHED else LAST_ACK
+        if self._rto_at is None and (self.snd_nxt > self.snd_una or self.snd_nxt < end):
+            # data in flight, or a zero window to probe
+            self._rto_at = time.monotonic() + self.rto
+
+    def _retransmit(self) -> None:
+        """Resend the oldest unacknowledged segment."""
+        self.retransmits += 1
+        self._rtt_seq = None  # Karn: no RTT samples from retransmitted data
+        seq = self.snd_una
+        if self.state == SYN_SENT:
+            self._send_syn()
+        elif self._fin_seq is not None and seq == self._fin_seq:
+            self._send_segment(seq, FIN | ACK)
+        else:
+            start = seq - self._sbuf_seq
+            size = min(self.snd_mss, len(self._sbuf) - start)
+            self._send_segment(seq, ACK | PSH, bytes(self._sbuf[start:start + size]))
+
+    def _send_probe(self) -> None:
+        """Zero-window probe: the first byte past the window."""
+        start = self._probe_seq - self._sbuf_seq
+        self._send_segment(self._probe_seq, ACK, bytes(self._sbuf[start:start + 1]))
+
+    def _on_rto(self) -> None:
+        # _retries counts timeouts without any answer: an ACK to a probe resets
+        # it, so a peer that keeps its window closed is probed indefinitely
+        self._retries += 1
+        if self._retries > MAX_RETRIES:
+            self._abort(TimeoutError(f"connection to {self.dst_ip}:{self.dport} timed out"))
+            return
+        self.rto = min(self.rto * 2, MAX_RTO)
+        self._rto_at = time.monotonic() + self.rto
+        if self._probe_seq == self.snd_una and self.snd_nxt == self.snd_una + 1:
+            self._send_probe()  # not a congestion signal: the window is still closed
+        elif self.snd_nxt > self.snd_una:
+            if self.state != SYN_SENT:
+                self.ssthresh = max((self.snd_nxt - self.snd_una) // 2, 2 * self.snd_mss)
+                self.cwnd = self.snd_mss
+                self._recover = None
+                self._dupacks = 0
+            self._retransmit()
+        elif self.snd_nxt < self._sbuf_seq + len(self._sbuf):
+            self._probe_seq = self.snd_nxt
+            self._send_probe()
+            self.snd_nxt += 1
+        else:
+            self._rto_at = None
+
+    # --- input -------------------------------------------------------------
+
+    def _input(self, frame: bytes) -> None:
+        try:
+            ip = IP(raw=memoryview(frame)[14:])
+        except ValueError:
+            return
+        seg = ip.payload
+        if not isinstance(seg, TCP) or ip.src_ip != self.dst_ip:
+            return
+        if self.state == SYN_SENT:
+            self._input_syn_sent(seg)
+        elif self.state != CLOSED:
+            self._input_synchronized(seg)
+
+    def _input_syn_sent(self, seg: TCP) -> None:
+        flags = seg.flags
+        if flags & ACK and seg.ack != (self.iss + 1) & _SEQ_MASK:
+            if not flags & RST:
+                self._send_segment(seg.ack, RST)
+            return
+        if flags & RST:
+            if flags & ACK:
+                self._abort(ConnectionRefusedError(f"{self.dst_ip}:{self.dport} refused the connection"))
+            return
+        if not (flags & SYN and flags & ACK):
+            return  # simultaneous open is not supported
+        options = _parse_options(seg.options)
+        if 2 in options and len(options[2]) == 2:
+            self.snd_mss = min(int.from_bytes(options[2], "big"), self.rcv_mss)
+        if 3 in options and len(options[3]) == 1:
+            self.snd_wscale = min(options[3][0], 14)
+        else:
+            self.rcv_wscale = 0  # scaling only applies if both sides offer it
+        self.irs = seg.seq
+        self.rcv_nxt = seg.seq + 1
+        self._rcv_edge = self.rcv_nxt
+        self.snd_una = self.iss + 1
+        self.snd_wnd = seg.window  # the window in a SYN is never scaled
+        self.cwnd = INITIAL_CWND * self.snd_mss
+        self._sample_rtt(self.snd_una)
+        self._retries = 0
+        self._rto_at = None
+        self.state = ESTABLISHED
+        self._send_ack()
+
+    def _input_synchronized(self, seg: TCP) -> None:
+        flags = seg.flags
+        seq = _unwrap(seg.seq, self.rcv_nxt)
+        if flags & RST:
+            if self.rcv_nxt <= seq <= self._rcv_edge:
+                self._abort(ConnectionResetError(f"{self.dst_ip}:{self.dport} reset the connection"))
+            return
+        if flags & SYN:
+            if seq == self.irs:  # SYN/ACK again: our handshake ACK was lost
+                self._send_ack()
+            return
+        if not flags & ACK:
+            return
+        data = seg.data
+        self._input_ack(seg, bool(data) or bool(flags & FIN))
+        if self.state == CLOSED:
+            return
+        if data or flags & FIN:
+            self._input_data(seq, data, bool(flags & FIN))
+
+    def _sample_rtt(self, ack: int) -> None:
+        if self._rtt_seq is None or ack <= self._rtt_seq:
+            return
+        rtt = time.monotonic() - self._rtt_sent
+        self._rtt_seq = None
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + max(4 * self.rttvar, 0.001), MIN_RTO), MAX_RTO)
+
+    def _input_ack(self, seg: TCP, carries_data: bool) -> None:
+        ack = _unwrap(seg.ack, self.snd_una)
+        if ack > self.snd_nxt:
+            self._send_ack()  # acknowledges something we never sent
+            return
+        if ack < self.snd_una:
+            return  # old duplicate
+        window = seg.window << self.snd_wscale
+        mss = self.snd_mss
+        if ack > self.snd_una:
+            acked = ack - self.snd_una
+            drop = min(ack, self._sbuf_seq + len(self._sbuf)) - self._sbuf_seq
+            if drop > 0:
+                del self._sbuf[:drop]
+                self._sbuf_seq += drop
+            self.snd_una = ack
+            self._sample_rtt(ack)
+            self._retries = 0
+            self._probe_seq = None
+            if self._recover is not None:
+                if ack >= self._recover:  # recovery complete
+                    self.cwnd = self.ssthresh
+                    self._recover = None
+                else:  # NewReno partial ACK: the next hole is lost too
+                    self._retransmit()
+                    self.cwnd = max(self.cwnd - acked + mss, mss)
+            elif self.cwnd < self.ssthresh:
+                self.cwnd += min(acked, 2 * mss)
+            else:
+                self.cwnd += max(mss * min(acked, 2 * mss) // self.cwnd, 1)
+            self._dupacks = 0
+            self._rto_at = time.monotonic() + self.rto if self.snd_nxt > self.snd_una else None
+            if self._fin_seq is not None and ack > self._fin_seq:
+                if self.state == FIN_WAIT_1:
+                    self.state = FIN_WAIT_2
+                elif self.state == CLOSING:
+                    self.state = TIME_WAIT
+                elif self.state == LAST_ACK:
+                    self._abort()
+                    return
+        elif self._probe_seq is not None and not window:
+            self._retries = 0  # a probe was answered, the window is still closed
+        elif (not carries_data and window == self.snd_wnd and self.snd_nxt > self.snd_una):
+            self._dupacks += 1
+            if self._dupacks == 3 and self._recover is None:
+                self.ssthresh = max((self.snd_nxt - self.snd_una) // 2, 2 * mss)
+                self._recover = self.snd_nxt
+                self._retransmit()
+                self.cwnd = self.ssthresh + 3 * mss
+            elif self._dupacks > 3:
+                self.cwnd += mss  # each dup ACK means a segment left the network
+        self.snd_wnd = window
+        self._output()
+
+    def _hold(self, seq: int, data: bytes) -> None:
+        """Keep an out-of-order segment, minus the bytes already held, so
+        retransmissions do not pile up copies.
+        """
+        starts, chunks = self._ooo_starts, self._ooo_chunks
+        end = seq + len(data)
+        i = bisect.bisect_right(starts, seq) - 1
+        if i >= 0:
+            prev_end = starts[i] + len(chunks[i])
+            if prev_end >= end:
+                return
+            if prev_end > seq:
+                data = data[prev_end - seq:]
+                seq = prev_end
+        i += 1
+        while data and i < len(starts) and starts[i] < end:
+            if starts[i] > seq:  # the gap before interval i
+                n = starts[i] - seq
+                starts.insert(i, seq)
+                chunks.insert(i, data[:n])
+                data = data[n:]
+                seq += n
+                i += 1
+            cut = starts[i] + len(chunks[i]) - seq  # the part interval i already has
+            data = data[cut:]
+            seq += cut
+            i += 1
+        if data:
+            starts.insert(i, seq)
+            chunks.insert(i, data)
+
+    def _input_data(self, seq: int, data: bytes, fin: bool) -> None:
+        rcv_nxt = self.rcv_nxt
+        quick = False
+        if fin:
+            self._fin_at = seq + len(data)
+        if data:
+            if seq < rcv_nxt:  # partly or wholly old: keep the new part
+                quick = True
+                data = data[rcv_nxt - seq:]
+                seq = rcv_nxt
+            if seq + len(data) > self._rcv_edge:  # beyond the window we offered
+                quick = True
+                data = data[:max(self._rcv_edge - seq, 0)]
+        if data:
+            if seq == rcv_nxt:
+                self._rbuf += data
+                rcv_nxt += len(data)
+                self._ack_pending += len(data)
+                starts, chunks = self._ooo_starts, self._ooo_chunks
+                if starts:
+                    quick = True  # a hole was filled (or shrunk): tell the sender now
+                    n = 0
+                    while n < len(starts) and starts[n] <= rcv_nxt:
+                        end = starts[n] + len(chunks[n])
+                        if end > rcv_nxt:
+                            self._rbuf += chunks[n][rcv_nxt - starts[n]:]
+                            rcv_nxt = end
+                        n += 1
+                    del starts[:n]
+                    del chunks[:n]
+            else:
+                self._hold(seq, data)
+                quick = True  # duplicate ACK so the sender can fast-retransmit
+        self.rcv_nxt = rcv_nxt
+        if self._fin_at is not None and rcv_nxt == self._fin_at:
+            self._fin_at = None
+            self.rcv_nxt += 1
+            self.eof = True
+            quick = True
+            if self.state == ESTABLISHED:
+                self.state = CLOSE_WAIT
+            elif self.state == FIN_WAIT_1:
+                self.state = CLOSING
+            elif self.state == FIN_WAIT_2:
+                self.state = TIME_WAIT
+        if quick:
+            self._send_ack()
+        elif self._ack_pending >= 2 * self.rcv_mss:
+            # One ACK for all the full segments in this batch, like GRO
+            self._ack_due = True
+        elif self._delack_at is None:
+            self._delack_at = time.monotonic() + DELAYED_ACK
+
+    def _window_update(self) -> None:
+        """After the application reads: advertise the freed space once it is
+        worth a segment's while (receiver-side silly window avoidance).
+        """
+        if self.state in (CLOSED, SYN_SENT):
+            return
+        free_edge = self.rcv_nxt + self.rcvbuf - len(self._rbuf)
+        if free_edge - self._rcv_edge >= min(self.rcvbuf // 2, 2 * self.rcv_mss):
+            self._send_ack()
+
+
+# --- HTTP --------------------------------------------------------------------
+
+def http_get(url: str, src_ip: str, dst_ip: Optional[str] = None, timeout: float = 30.0,
+             **options) -> Tuple[int, Dict[str, str], bytes]:
+    """GET `url` over a TCPConnection; returns (status, headers, body).
+    The host part must be an IPv4 address unless `dst_ip` is given. Sends
+    "Connection: close" and reads to EOF (no chunked decoding). `options`
+    go to TCPConnection (sport, interface, mss, rcvbuf, transport).
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "http":
+        raise ValueError(f"only http:// URLs are supported, not {url!r}")
+    dst_ip = dst_ip or parts.hostname
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: lab3-tcpclient\r\n"
+               f"Connection: close\r\n\r\n").encode()
+    conn = TCPConnection(src_ip, dst_ip, parts.port or 80, **options)
+    conn.connect(timeout)
+    try:
+        conn.sendall(request, timeout)
+        reply = conn.read_all(timeout)
+        conn.close(timeout)
+    except BaseException:
+        conn._abort()
+        raise
+    head, _, body = reply.partition(b"\r\n\r\n")
+    lines = head.decode("iso-8859-1").split("\r\n")
+    status_line = lines[0].split(" ", 2)
+    if len(status_line) < 2 or not status_line[0].startswith("HTTP/"):
+        raise ValueError(f"not an HTTP response: {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return int(status_line[1]), headers, body
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fetch a URL with the userspace TCP client")
+    parser.add_argument("url")
+    parser.add_argument("--src-ip", required=True, help="client address (not owned by the kernel)")
+    parser.add_argument("--tap", help="run over this TAP device instead of raw sockets")
+    parser.add_argument("--interface", help="receive on this interface only (raw sockets)")
+    parser.add_argument("--mss", type=int, default=1460)
+    parser.add_argument("--rcvbuf", type=int, default=4 << 20, help="receive buffer in bytes (default 4 MiB)")
+    parser.add_argument("-o", "--output", help="write the body to this file")
+    args = parser.parse_args(argv)
+
+    transport = TapTransport(args.tap, ip=args.src_ip) if args.tap else None
+    try:
+        start = time.monotonic()
+        status, headers, body = http_get(args.url, args.src_ip, interface=args.interface, mss=args.mss,
+                                         rcvbuf=args.rcvbuf, transport=transport)
+        elapsed = time.monotonic() - start
+    finally:
+        if transport is not None:
+            transport.close()
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(body)
+    print(f"HTTP {status}: {len(body)} bytes in {elapsed:.3f}s "
+          f"({len(body) * 8 / elapsed / 1e6:.1f} Mbps)", file=sys.stderr)
+    return 0 if 200 <= status < 300 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
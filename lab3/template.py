@@ -0,0 +1,142 @@
+"""Packet templates: serialize a layer stack once, then rewrite fields in place.
+
+    tpl = PacketTemplate(Ether(...) / IP(...) / ICMP(id=1, seq=0))
+    for seq in range(10000):
+        tpl["icmp.seq"] = seq      # a few byte writes + RFC 1624 checksum fix-ups
+        sock.send(tpl.frame)
+
+Field names are "<layer>.<field>" for every entry of a layer's `_field_layout`
+(e.g. "ip.ttl", "ip.dst_ip", "udp.sport", "tcp.seq", "dns.id"). Length fields
+("ip.total_len", "udp.length") can be read but not set: the frame never
+changes size. Neither can the fields that pick the next layer ("ether.type",
+"ip.proto"): the checksum fix-ups are laid out for the stack as built.
+"""
+
+import struct
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from layers import IP, TCP, UDP
+from layers.base import BaseLayer
+from utils import checksum_update_bytes, ip_to_bytes, mac_to_bytes
+
+_U16 = struct.Struct("!H")
+# Follow from the frame size, which a template never changes
+_LENGTH_FIELDS = frozenset(("ip.total_len", "udp.length"))
+# Select the layer stack the checksum offsets were computed for
+_STACK_FIELDS = frozenset(("ether.type", "ip.proto"))
+_READ_ONLY = _LENGTH_FIELDS | _STACK_FIELDS
+
+
+class _Field(NamedTuple):
+    offset: int                     # absolute offset in the frame
+    codec: struct.Struct
+    # (checksum offset, parity base, is UDP) for each checksum covering the field
+    checksums: Tuple[Tuple[int, int, bool], ...]
+
+
+class PacketTemplate:
+    """Preallocated serialization of a layer stack with named, in-place field updates.
+    Only fixed-size header fields can change; lengths and layer types stay as first built.
+    """
+
+    def __init__(self, pkt: BaseLayer):
+        self.buf = bytearray(pkt.build())
+        self._fields: Dict[str, _Field] = {}
+        self._layer_offsets: Dict[str, int] = {}
+
+        # Walk the built stack: each layer's header length is its cached output
+        # minus the payload bytes it wrapped.
+        layers: List[Tuple[BaseLayer, int, int]] = []
+        start = 0
+        layer = pkt
+        while layer is not None and layer._built is not None:
+            _, payload, out = layer._built
+            layers.append((layer, start, len(out) - len(payload)))
+            start += len(out) - len(payload)
+            layer = layer.payload
+        total = len(self.buf)
+
+        for i, (layer, start, hdr_len) in enumerate(layers):
+            lname = layer.__class__.__name__.lower()
+            self._layer_offsets.setdefault(lname, start)
+            for fname, (off, fmt) in layer._field_layout.items():
+                pos = start + off
+                checksums = []
+                for other, ostart, ohdr_len in layers[:i + 1]:
+                    if other._csum_offset is None:
+                        continue
+                    # IP checksums its header only; L4 checksums run to the end
+                    end = ostart + ohdr_len if isinstance(other, IP) else total
+                    if pos < end:
+                        checksums.append((ostart + other._csum_offset, ostart, isinstance(other, UDP)))
+                if isinstance(layer, IP) and fname in ("src_ip", "dst_ip") and i + 1 < len(layers):
+                    l4, l4_start, _ = layers[i + 1]
+                    if isinstance(l4, (TCP, UDP)):
+                        # addresses sit word-aligned in the L4 pseudo-header
+                        checksums.append((l4_start + l4._csum_offset, pos, isinstance(l4, UDP)))
+                self._fields.setdefault(f"{lname}.{fname}",
+                                        _Field(pos, struct.Struct(fmt), tuple(checksums)))
+
+    @property
+    def frame(self) -> bytearray:
+        """The whole serialized packet (updated in place, do not resize)."""
+        return self.buf
+
+    @property
+    def l3(self) -> memoryview:
+        """View from the IP header on, for raw IP sockets (see api.send)."""
+        return memoryview(self.buf)[self._layer_offsets.get("ip", 0):]
+
+    @property
+    def fields(self) -> List[str]:
+        """Names of the fields that can be set."""
+        return [name for name in self._fields if name not in _READ_ONLY]
+
+    def offset(self, name: str) -> int:
+        """Absolute byte offset of field `name` in `frame`."""
+        return self._fields[name].offset
+
+    def __getitem__(self, name: str):
+        field = self._fields[name]
+        value = field.codec.unpack_from(self.buf, field.offset)[0]
+        if field.codec.size == 4 and isinstance(value, bytes):
+            return ".".join(str(b) for b in value)
+        if field.codec.size == 6:
+            return ":".join(f"{b:02x}" for b in value)
+        return value
+
+    def __setitem__(self, name: str, value: Union[int, str, bytes]) -> None:
+        if name in _LENGTH_FIELDS:
+            raise KeyError(f"{name} cannot be set: lengths stay as first built")
+        if name in _STACK_FIELDS:
+            raise KeyError(f"{name} cannot be set: the layer stack stays as first built")
+        field = self._fields[name]
+        if isinstance(value, str):
+            value = mac_to_bytes(value) if field.codec.size == 6 else ip_to_bytes(value)
+        buf = self.buf
+        pos = field.offset
+        end = pos + field.codec.size
+        old = buf[pos:end]  # slices are copies
+        field.codec.pack_into(buf, pos, value)
+        new = buf[pos:end]
+        if old == new:
+            return
+        for csum_pos, base, is_udp in field.checksums:
+            csum = _U16.unpack_from(buf, csum_pos)[0]
+            if is_udp and csum == 0:
+                continue  # UDP checksum disabled on the wire
+            csum = checksum_update_bytes(csum, old, new, pos - base)
+            if is_udp and csum == 0:
+                csum = 0xFFFF
+            _U16.pack_into(buf, csum_pos, csum)
+
+    def update(self, **values) -> None:
+        """Set several fields at once: tpl.update(icmp_seq=5, ip_ttl=3)."""
+        for key, value in values.items():
+            self[key.replace("_", ".", 1)] = value
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.buf)
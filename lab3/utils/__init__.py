@@ -2,10 +2,14 @@
 
 # Re-export helpers for convenient imports
 from .helpers import (bytes_to_ip, bytes_to_mac, checksum_ones_complement,
-                      ip_to_bytes, mac_to_bytes)
+                      checksum_update, checksum_update_bytes, ip_to_bytes,
+                      mac_to_bytes, ones_complement_sum)
 
 __all__ = [
     "checksum_ones_complement",
+    "checksum_update",
+    "checksum_update_bytes",
+    "ones_complement_sum",
     "ip_to_bytes",
     "bytes_to_ip",
     "mac_to_bytes",
@@ -1,42 +1,89 @@
 import socket
+from functools import lru_cache
 from typing import Optional
 
 
-def checksum_ones_complement(data: bytes) -> int:
-    """Compute the Internet checksum (one's complement sum of 16-bit words).
-    Pads odd-length data with one zero byte as per RFC 1071.
+def ones_complement_sum(data: bytes, initial: int = 0) -> int:
+    """Return the folded 16-bit one's complement sum of `data` plus `initial`.
+    The buffer is read as one big-endian integer and reduced modulo 0xFFFF in C,
+    which equals the word-by-word end-around-carry sum (2**16 == 1 mod 0xFFFF).
+    Partial sums of even-length chunks can be chained through `initial`.
     """
+    value = int.from_bytes(data, "big")
     if len(data) % 2 == 1:
-        data += b"\x00"
-    total = 0
-    for i in range(0, len(data), 2):
-        total += (data[i] << 8) + data[i + 1]
-        total = (total & 0xFFFF) + (total >> 16)  # fold carry early
-    # final fold and one's complement
+        value <<= 8  # pad odd-length data with one zero byte (RFC 1071)
+    total = value % 0xFFFF + initial % 0xFFFF
+    total = (total & 0xFFFF) + (total >> 16)
+    if total == 0 and (value or initial):
+        return 0xFFFF  # a non-zero sum that folds to zero is one's complement -0
+    return total
+
+
+def checksum_ones_complement(data: bytes, initial: int = 0) -> int:
+    """Compute the Internet checksum (one's complement sum of 16-bit words).
+    Pads odd-length data with one zero byte as per RFC 1071. `initial` is an
+    already folded partial sum (e.g. of a pseudo-header) to include.
+    """
+    return (~ones_complement_sum(data, initial)) & 0xFFFF
+
+
+def checksum_update(csum: int, old: int, new: int) -> int:
+    """Incrementally update checksum `csum` after a 16-bit word changed from
+    `old` to `new` (RFC 1624, eqn. 3: HC' = ~(~HC + ~m + m')).
+    """
+    total = (~csum & 0xFFFF) + (~old & 0xFFFF) + (new & 0xFFFF)
+    total = (total & 0xFFFF) + (total >> 16)
     total = (total & 0xFFFF) + (total >> 16)
     return (~total) & 0xFFFF
 
 
+def checksum_update_bytes(csum: int, old: bytes, new: bytes, offset: int = 0) -> int:
+    """Incrementally update checksum `csum` after the field at byte `offset` of
+    the checksummed data changed from `old` to `new` (same length). Only the
+    parity of `offset` matters: it decides whether the field starts on the high
+    or the low byte of a 16-bit word.
+    """
+    if len(old) != len(new):
+        raise ValueError("old and new field values must have the same length")
+    if offset % 2 == 1:
+        old = b"\x00" + old
+        new = b"\x00" + new
+    old_sum = ones_complement_sum(old)
+    new_sum = ones_complement_sum(new)
+    total = (~csum & 0xFFFF) + (0xFFFF - old_sum) + new_sum
+    total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+@lru_cache(maxsize=4096)
 def ip_to_bytes(ip: str) -> bytes:
-    """Convert dotted-quad IPv4 to 4 bytes (network byte order)."""
+    """Convert dotted-quad IPv4 to 4 bytes (network byte order).
+    Cached: build() converts the same few addresses over and over.
+    """
     return socket.inet_aton(ip)
 
 
+@lru_cache(maxsize=4096)
 def bytes_to_ip(b: bytes) -> str:
-    """Convert 4-byte IPv4 into dotted-quad string."""
+    """Convert 4-byte IPv4 into dotted-quad string.
+    Cached: captures repeat the same addresses, so parsed packets share strings.
+    """
     return socket.inet_ntoa(b)
 
 
+@lru_cache(maxsize=4096)
 def mac_to_bytes(mac: str) -> bytes:
-    """Convert colon-separated MAC (aa:bb:cc:dd:ee:ff) to 6 bytes."""
+    """Convert colon-separated MAC (aa:bb:cc:dd:ee:ff) to 6 bytes (cached like ip_to_bytes)."""
     parts = mac.split(":")
     if len(parts) != 6:
         raise ValueError(f"Invalid MAC: {mac}")
     return bytes(int(p, 16) for p in parts)
 
 
+@lru_cache(maxsize=4096)
 def bytes_to_mac(b: bytes) -> str:
-    """Convert 6 bytes into colon-separated lower-hex MAC string."""
+    """Convert 6 bytes into colon-separated lower-hex MAC string (cached like bytes_to_ip)."""
     if len(b) != 6:
         raise ValueError("MAC must be 6 bytes")
     return ":".join(f"{x:02x}" for x in b)
\ No newline at end of file
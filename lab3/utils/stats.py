@@ -0,0 +1,169 @@
+"""Opt-in counters and latency histograms for the send/receive paths.
+
+    from utils import stats
+    stats.enable()
+    api.sr(pkt)
+    print(stats.report())            # or stats.snapshot() for the numbers
+    stop = stats.dump_every(10.0)    # print a report every 10 s until stop()
+
+Instrumented code checks `stats.ENABLED` before reading the clock, so with
+stats off (the default) a stage costs one flag test. Names are dotted:
+
+    build, send.syscall, recv.syscall, parse, match   stage latency (histograms)
+    sr.rtt                                            send to matching reply
+    tx.packets, tx.errors, rx.frames                  traffic
+    sr.timeouts                                       probes left unanswered
+    reject.<reason>                                   frames skipped while
+                                                      matching replies: not_ip,
+                                                      hashret, answers, error
+    parse_error.<Layer>                               decode failures, counted
+                                                      at the layer that failed
+    filter.dropped, rx.queue_full                     frames dropped by a
+                                                      userspace BPF filter or
+                                                      a full receive queue
+
+"parse" is Ether decoding up to the IP header; on lazily decoded frames the
+rest is decoded inside "match". sr()'s "recv.syscall" includes the wait.
+
+Updates are not locked; under concurrent threads counts are approximate.
+"""
+
+import math
+import sys
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, TextIO
+
+ENABLED = False
+
+# Histogram buckets are powers of two in nanoseconds: bucket i holds
+# durations in [2**(i-1), 2**i) ns, up to ~9 s in the last bucket.
+_BUCKETS = 34
+
+
+class Histogram:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e9).bit_length(), _BUCKETS - 1)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (seconds) of the bucket holding the q-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(2 ** i / 1e9, self.max)
+        return self.max
+
+
+class HistogramSummary(NamedTuple):
+    count: int
+    mean: float  # seconds
+    min: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+class Snapshot(NamedTuple):
+    counters: Dict[str, int]
+    histograms: Dict[str, HistogramSummary]
+    elapsed: float  # seconds since enable() or the last reset()
+
+
+_counters: Dict[str, int] = {}
+_histograms: Dict[str, Histogram] = {}
+_since = time.monotonic()
+
+
+def enable() -> None:
+    global ENABLED
+    ENABLED = True
+
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+
+
+def reset() -> None:
+    global _counters, _histograms, _since
+    _counters, _histograms = {}, {}
+    _since = time.monotonic()
+
+
+def incr(name: str, n: int = 1) -> None:
+    _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name: str, seconds: float) -> None:
+    hist = _histograms.get(name)
+    if hist is None:
+        hist = _histograms[name] = Histogram()
+    hist.record(seconds)
+
+
+def snapshot() -> Snapshot:
+    hists = {}
+    for name, h in list(_histograms.items()):
+        if h.count:
+            hists[name] = HistogramSummary(h.count, h.total / h.count, h.min, h.percentile(50),
+                                           h.percentile(90), h.percentile(99), h.max)
+    return Snapshot(dict(_counters), hists, time.monotonic() - _since)
+
+
+def _us(seconds: float) -> str:
+    return f"{seconds * 1e6:.1f}"
+
+
+def report(snap: Optional[Snapshot] = None) -> str:
+    """The snapshot as a table: counters, then latencies in microseconds."""
+    snap = snap if snap is not None else snapshot()
+    lines = [f"stats over {snap.elapsed:.1f}s"]
+    for name in sorted(snap.counters):
+        lines.append(f"  {name:<28} {snap.counters[name]:>12}")
+    if snap.histograms:
+        lines.append(f"  {'latency (us)':<28} {'count':>12} {'mean':>9} {'min':>9} {'p50':>9} "
+                     f"{'p90':>9} {'p99':>9} {'max':>9}")
+        for name in sorted(snap.histograms):
+            h = snap.histograms[name]
+            lines.append(f"  {name:<28} {h.count:>12} {_us(h.mean):>9} {_us(h.min):>9} {_us(h.p50):>9} "
+                         f"{_us(h.p90):>9} {_us(h.p99):>9} {_us(h.max):>9}")
+    return "\n".join(lines)
+
+
+def dump_every(interval: float, file: Optional[TextIO] = None,
+               clear: bool = False) -> Callable[[], None]:
+    """Enable stats and print a report every `interval` seconds from a daemon
+    thread (to stderr by default); `clear` resets the counters after each
+    report. Returns a function that stops the thread.
+    """
+    enable()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            print(report(), file=file or sys.stderr, flush=True)
+            if clear:
+                reset()
+
+    threading.Thread(target=loop, name="stats-dump", daemon=True).start()
+    return stop.set